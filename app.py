@@ -1,10 +1,21 @@
 import streamlit as st
+import io
 import json
+import logging
 import os
 import secrets
 from datetime import date
-import smtplib
-from email.mime.text import MIMEText
+from functools import partial
+
+from aqeq import metrics
+from aqeq.cache import RecordCache, SharedCache
+from aqeq.items import ANSWER_LABELS, AQ_ITEMS, AQ_SUBSCALES, EQ_ITEMS, SEX_OPTIONS
+from aqeq.norms import ALL, age_band
+from aqeq.outbox import DeliveryWorker, Outbox, SMTPConfig, parse_flag
+from aqeq.paths import DATA_DIR, default_store
+from aqeq.reports import VIEW_VERSION, render_html, result_view, view_key, write_archive
+from aqeq.scoring import answers_from_payload, compute_derived, derived_is_current, summarize_responses
+from aqeq.storage import decode_json, encode_json, open_store, save_new
 
 # =========================================================
 # CONFIG GÉNÉRALE
@@ -16,9 +27,17 @@ st.set_page_config(
     layout="wide",
 )
 
-DATA_DIR = "data_aq_eq"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+logger = logging.getLogger("aqeq.app")
+
+# Instrumentation (voir aqeq.metrics) : durées et compteurs exportés au
+# format Prometheus dans METRICS_FILE ; AQEQ_PROFILE=cprofile (ou
+# pyinstrument) écrit un profil par réexécution dans PROFILE_DIR.
+METRICS_FILE = os.environ.get("AQEQ_METRICS_FILE", os.path.join(DATA_DIR, "_metrics.prom"))
+PROFILE_DIR = os.path.join(DATA_DIR, "_profiles")
+metrics.start_rerun(PROFILE_DIR)
+
 
 # =========================================================
 # OUTILS FICHIERS + EMAIL
@@ -29,41 +48,134 @@ def generate_code(n_chars: int = 8) -> str:
     return secrets.token_hex(n_chars // 2).upper()
 
 
-def save_response(patient_code: str, payload: dict):
-    path = os.path.join(DATA_DIR, f"{patient_code}.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+# Stockage des réponses : fichiers JSON dans DATA_DIR par défaut, ou base
+# SQLite indexée avec AQEQ_STORE="sqlite:data_aq_eq.db". AQEQ_GROUP_COMMIT=1
+# regroupe les synchronisations disque lors des pics d'envois simultanés.
+STORE_URL = default_store()
+GROUP_COMMIT = os.environ.get("AQEQ_GROUP_COMMIT", "") == "1"
+
+
+# Réponses déjà relues et cotées, partagées par les sessions du processus
+# (AQEQ_RESPONSE_CACHE entrées au plus, 0 pour désactiver). Avec plusieurs
+# processus (python -m aqeq.serve), AQEQ_SHARED_CACHE désigne en plus un
+# cache SQLite commun à tous.
+RESPONSE_CACHE_SIZE = int(os.environ.get("AQEQ_RESPONSE_CACHE", "1024"))
+SHARED_CACHE_PATH = os.environ.get("AQEQ_SHARED_CACHE", "")
+
+# Pages de résultats praticien déjà construites (voir aqeq.reports.result_view),
+# adressées par contenu : AQEQ_VIEW_CACHE entrées au plus, 0 pour désactiver.
+VIEW_CACHE_SIZE = int(os.environ.get("AQEQ_VIEW_CACHE", "256"))
+
+
+@st.cache_resource
+def get_store(url: str = STORE_URL):
+    return open_store(url, group_commit=GROUP_COMMIT)
+
+
+@st.cache_resource
+def get_response_cache() -> RecordCache:
+    shared = None
+    if SHARED_CACHE_PATH:
+        shared = SharedCache(
+            SHARED_CACHE_PATH,
+            name="responses_shared",
+            dumps=encode_json,
+            loads=lambda text: decode_json(json.loads(text)),
+        )
+    return RecordCache(RESPONSE_CACHE_SIZE, name="responses", shared=shared)
+
+
+@st.cache_resource
+def get_view_cache() -> RecordCache:
+    shared = None
+    if SHARED_CACHE_PATH:
+        shared = SharedCache(SHARED_CACHE_PATH, maxsize=10_000, name="views_shared", table="view_entries")
+    return RecordCache(VIEW_CACHE_SIZE, name="views", shared=shared)
 
 
 def load_response(patient_code: str):
-    path = os.path.join(DATA_DIR, f"{patient_code}.json")
-    if not os.path.exists(path):
-        return None
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """
+    Réponse enregistrée, avec sa section "derived" à jour. Servie par le
+    cache tant que la version de l'enregistrement n'a pas changé ; le
+    payload renvoyé est une copie superficielle, à ne pas modifier en
+    profondeur.
+    """
+    metrics.inc("loads_total")
+    store = get_store()
+    cache = get_response_cache()
+    with metrics.span("load_response"):
+        # Version relevée avant la lecture (voir RecordCache.put).
+        version = store.version(patient_code)
+        if version is None:
+            return None
+        data = cache.get(patient_code, version)
+        if data is None:
+            data = store.load(patient_code)
+            if data is None:
+                return None
+            data = {**data, "derived": get_derived(data)}
+            cache.put(patient_code, version, data)
+    return dict(data)
+
+
+OUTBOX_DIR = os.path.join(DATA_DIR, "_outbox")
+
+
+@st.cache_resource
+def get_email_worker(
+    sender: str,
+    password: str,
+    recipient: str,
+    host: str,
+    port: int,
+    use_ssl: bool,
+    digest: bool,
+) -> DeliveryWorker:
+    """Un seul thread d'envoi (et une seule connexion SMTP) par processus."""
+    config = SMTPConfig(
+        sender=sender,
+        password=password,
+        recipient=recipient,
+        host=host,
+        port=port,
+        use_ssl=use_ssl,
+    )
+    worker = DeliveryWorker(Outbox(OUTBOX_DIR), config, digest=digest)
+    worker.start()
+    return worker
 
 
 def send_email_notification(patient_code: str, payload: dict):
     """
-    Envoie un mail via Gmail en utilisant les secrets :
+    Dépose une notification dans l'outbox ; l'envoi effectif se fait en
+    arrière-plan via Gmail en utilisant les secrets :
       - EMAIL_SENDER
       - EMAIL_APP_PASSWORD
       - PRACTITIONER_EMAIL
 
+    Secrets optionnels : EMAIL_SMTP_HOST, EMAIL_SMTP_PORT, EMAIL_SMTP_SSL
+    (serveur SMTP, par défaut smtp.gmail.com:465 en SSL) et EMAIL_DIGEST
+    (regrouper plusieurs questionnaires dans un même email).
+
     Si ces secrets ne sont pas définis ou si l'envoi échoue,
     l'app continue de fonctionner sans planter.
     """
     required_keys = ["EMAIL_SENDER", "EMAIL_APP_PASSWORD", "PRACTITIONER_EMAIL"]
     for key in required_keys:
         if key not in st.secrets:
+            metrics.inc("emails_skipped_total")
             st.sidebar.warning(
                 f"⚠️ Secret manquant : {key}. Aucun email n'a été envoyé."
             )
             return
 
-    sender = st.secrets["EMAIL_SENDER"]
-    password = st.secrets["EMAIL_APP_PASSWORD"]
-    recipient = st.secrets["PRACTITIONER_EMAIL"]
+    try:
+        use_ssl = parse_flag(st.secrets.get("EMAIL_SMTP_SSL"), default=True)
+        digest = parse_flag(st.secrets.get("EMAIL_DIGEST"), default=False)
+    except ValueError as e:
+        metrics.inc("emails_skipped_total")
+        st.sidebar.warning(f"⚠️ Secret email invalide ({e}). Aucun email n'a été envoyé.")
+        return
 
     subject = f"Nouveau questionnaire AQ/EQ – code patient {patient_code}"
     body_lines = [
@@ -79,326 +191,329 @@ def send_email_notification(patient_code: str, payload: dict):
         "Les réponses détaillées sont disponibles dans l’espace praticien.",
     ]
 
-    msg = MIMEText("\n".join(body_lines), _charset="utf-8")
-    msg["Subject"] = subject
-    msg["From"] = sender
-    msg["To"] = recipient
-
+    # La réponse est déjà enregistrée : une outbox inutilisable (disque
+    # plein, droits) ne doit pas faire échouer l'envoi du questionnaire.
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=5) as server:
-            server.login(sender, password)
-            server.send_message(msg)
-    except Exception:
-        # Si besoin de debug, on peut afficher l'erreur dans la sidebar.
-        # st.sidebar.error(f"Erreur envoi email : {e}")
-        return
+        with metrics.span("send_email_notification"):
+            worker = get_email_worker(
+                sender=st.secrets["EMAIL_SENDER"],
+                password=st.secrets["EMAIL_APP_PASSWORD"],
+                recipient=st.secrets["PRACTITIONER_EMAIL"],
+                host=st.secrets.get("EMAIL_SMTP_HOST", "smtp.gmail.com"),
+                port=int(st.secrets.get("EMAIL_SMTP_PORT", 465)),
+                use_ssl=use_ssl,
+                digest=digest,
+            )
+            worker.outbox.put(subject, "\n".join(body_lines))
+            worker.notify()
+    except OSError:
+        logger.exception("Notification du code %s non déposée dans l'outbox", patient_code)
+        metrics.inc("email_enqueue_errors_total")
+        st.warning("⚠️ Vos réponses sont bien enregistrées, mais la notification au praticien n'a pas pu être préparée.")
 
 
 # =========================================================
-# QUESTIONS AQ & EQ
+# SCORES DÉRIVÉS + RÉSUMÉS (TABLEAU DE BORD PRATICIEN)
 # =========================================================
 
-AQ_ITEMS = {
-    1: "Je préfère réaliser des activités avec d’autres personnes plutôt que seul(e).",
-    2: "Je préfère tout faire continuellement de la même manière.",
-    3: "Quand j’essaye d’imaginer quelque chose, il est très facile de m’en représenter une image mentalement.",
-    4: "Je suis fréquemment tellement absorbé(e) par une chose que je perds tout le reste de vue.",
-    5: "Mon attention est souvent attirée par des bruits discrets que les autres ne remarquent pas.",
-    6: "Je fais habituellement attention aux numéros de plaques d’immatriculation ou à d’autres types d’informations de ce genre.",
-    7: "Les gens me disent souvent que ce que j’ai dit était impoli, même quand je pense moi que c’était poli.",
-    8: "Quand je lis une histoire, je peux facilement imaginer à quoi les personnages pourraient ressembler.",
-    9: "Je suis fasciné(e) par les dates.",
-    10: "Au sein d’un groupe, je peux facilement suivre les conversations de plusieurs personnes à la fois.",
-    11: "Je trouve les situations de la vie en société faciles.",
-    12: "J’ai tendance à remarquer certains détails que les autres ne voient pas.",
-    13: "Je préfèrerais aller dans une bibliothèque plutôt qu’à une fête.",
-    14: "Je trouve facile d’inventer des histoires.",
-    15: "Je suis plus facilement attiré(e) par les gens que par les objets.",
-    16: "J’ai tendance à avoir des centres d’intérêt très importants. Je me tracasse lorsque je ne peux m’y consacrer.",
-    17: "J’apprécie le bavardage en société.",
-    18: "Quand je parle, il n’est pas toujours facile pour les autres de placer un mot.",
-    19: "Je suis fasciné(e) par les chiffres.",
-    20: "Quand je lis une histoire, je trouve qu’il est difficile de me représenter les intentions des personnages.",
-    21: "Je n’aime pas particulièrement lire des romans.",
-    22: "Je trouve qu’il est difficile de se faire de nouveaux amis.",
-    23: "Je remarque sans cesse des schémas réguliers dans les choses qui m’entourent.",
-    24: "Je préfèrerais aller au théâtre qu’au musée.",
-    25: "Cela ne me dérange pas si mes habitudes quotidiennes sont perturbées.",
-    26: "Je remarque souvent que je ne sais pas comment entretenir une conversation.",
-    27: "Je trouve qu’il est facile de « lire entre les lignes » lorsque quelqu’un me parle.",
-    28: "Je me concentre habituellement plus sur l’ensemble d’une image que sur les petits détails de celle-ci.",
-    29: "Je ne suis pas très doué(e) pour me souvenir des numéros de téléphone.",
-    30: "Je ne remarque habituellement pas les petits changements dans une situation ou dans l’apparence de quelqu’un.",
-    31: "Je sais m’en rendre compte quand mon interlocuteur s’ennuie.",
-    32: "Je trouve qu’il est facile de faire plus d’une chose à la fois.",
-    33: "Quand je parle au téléphone, je ne suis pas sûr(e) de savoir quand c’est à mon tour de parler.",
-    34: "J’aime faire les choses de manière spontanée.",
-    35: "Je suis souvent le(la) dernier(ère) à comprendre le sens d’une blague.",
-    36: "Je trouve qu’il est facile de décoder ce que les autres pensent ou ressentent juste en regardant leur visage.",
-    37: "Si je suis interrompu(e), je peux facilement revenir à ce que j’étais en train de faire.",
-    38: "Je suis doué(e) pour le bavardage en société.",
-    39: "Les gens me disent souvent que je répète continuellement les mêmes choses.",
-    40: "Quand j’étais enfant, j’aimais habituellement jouer à des jeux de rôle avec les autres.",
-    41: "J’aime collectionner des informations sur des catégories de choses (types de voitures, d’oiseaux, de trains, de plantes, ...).",
-    42: "Je trouve qu’il est difficile de s’imaginer dans la peau d’un autre.",
-    43: "J’aime planifier avec soin toute activité à laquelle je participe.",
-    44: "J’aime les événements sociaux.",
-    45: "Je trouve qu’il est difficile de décoder les intentions des autres.",
-    46: "Les nouvelles situations me rendent anxieux(se).",
-    47: "J’aime rencontrer de nouvelles personnes.",
-    48: "Je suis une personne qui a le sens de la diplomatie.",
-    49: "Je ne suis pas très doué(e) pour me souvenir des dates de naissance des gens.",
-    50: "Je trouve qu’il est très facile de jouer à des jeux de rôle avec des enfants.",
-}
+def get_derived(data: dict) -> dict:
+    """
+    Section "derived" d'un payload chargé, recalculée en mémoire si elle
+    est absente ou d'une autre version des règles (le cache des réponses
+    garde le résultat). La lecture n'écrit jamais : pendant un déploiement
+    progressif, des workers de versions différentes réécriraient sans fin
+    les mêmes réponses. Les sections périmées sont réenregistrées par
+    `python -m aqeq rescore`.
+    """
+    derived = data.get("derived")
+    if derived_is_current(derived):
+        metrics.inc("cache_hits_total", cache="derived")
+        return derived
 
-EQ_ITEMS = {
-    1: "Je peux facilement dire quand quelqu’un veut entamer une conversation.",
-    2: "Je préfère les animaux aux êtres humains.",
-    3: "J’essaie d’être à la mode.",
-    4: "Je trouve difficile d’expliquer aux autres des choses que j’ai comprises facilement et que eux n’ont pas comprises du premier coup.",
-    5: "Je rêve la plupart des nuits.",
-    6: "J’aime prendre soin des autres.",
-    7: "J’essaie de résoudre mes problèmes moi-même plutôt que d’en discuter avec d’autres.",
-    8: "Je trouve difficile de savoir ce qu’il faut faire dans les relations sociales.",
-    9: "C’est le matin que je suis le(la) plus efficace.",
-    10: "On me dit souvent que je vais trop loin quand j’expose mon point de vue dans une discussion.",
-    11: "Cela ne m’ennuie pas trop d’être en retard à un rendez-vous fixé à un ami.",
-    12: "Les relations sociales sont si difficiles que j’essaie de ne pas m’en soucier.",
-    13: "Je ne ferais jamais rien d’illégal même si ce n’est pas très grave.",
-    14: "J’ai souvent du mal à juger si quelque chose est grossier ou familier.",
-    15: "Dans une conversation, j’ai tendance à me centrer sur mes propres pensées plutôt que sur celles de mon interlocuteur.",
-    16: "Je préfère les farces aux jeux de mots.",
-    17: "Je vis au jour le jour.",
-    18: "Quand j’étais enfant, j’aimais couper des vers de terre pour voir ce qui se passe.",
-    19: "Je détecte rapidement si quelqu’un dit une chose qui en signifie une autre.",
-    20: "J’ai de solides convictions sur la moralité.",
-    21: "Je ne comprends pas comment des choses vexent tant certaines personnes.",
-    22: "Il est pour moi facile de me mettre à la place de quelqu’un d’autre.",
-    23: "Je pense que les bonnes manières sont la meilleure chose que des parents peuvent apprendre à leurs enfants.",
-    24: "J’aime agir sur un coup de tête.",
-    25: "Je prédis assez bien le ressenti des autres.",
-    26: "Dans un groupe, je repère facilement quand quelqu’un se sent gêné ou mal à l’aise.",
-    27: "Si j’offense quelqu’un en parlant, j’estime que c’est son problème et pas le mien.",
-    28: "Si quelqu’un me demandait mon avis sur sa coupe de cheveux, je répondrais honnêtement même si elle ne me plaît pas.",
-    29: "Je ne comprends pas toujours pourquoi une personne peut être offensée par une remarque.",
-    30: "On me dit souvent que je suis imprévisible.",
-    31: "En groupe, j’aime être le centre d’intérêt.",
-    32: "Voir quelqu’un pleurer ne me touche pas vraiment.",
-    33: "J’adore parler politique.",
-    34: "Je ne mâche pas mes mots, ce qui est souvent pris pour de la grossièreté même si ce n’est pas mon intention.",
-    35: "En général, je comprends facilement les situations sociales.",
-    36: "On me dit généralement que je comprends bien les sentiments et les pensées des autres.",
-    37: "Quand je discute avec quelqu’un, j’essaie de parler de ses expériences plutôt que des miennes.",
-    38: "Ça me bouleverse de voir un animal souffrant.",
-    39: "Je suis capable de prendre des décisions sans être influencé(e) par les sentiments des autres.",
-    40: "Je ne peux pas me détendre sans avoir fait tout ce que j’avais planifié pour la journée.",
-    41: "Je remarque facilement si quelqu’un est intéressé ou ennuyé par ce que je dis.",
-    42: "Lorsque je regarde le journal télévisé, je suis triste de voir des personnes qui souffrent.",
-    43: "Mes amis me parlent généralement de leurs problèmes car ils disent que je suis très compréhensif(ve).",
-    44: "Je peux sentir quand je dérange les autres, même s’ils ne me le disent pas.",
-    45: "Je commence souvent de nouveaux passe-temps qui m’ennuient vite et je passe à autre chose.",
-    46: "Des fois, on me dit que j’exagère quand je charrie les gens.",
-    47: "Je serais bien trop anxieux(se) de monter sur un manège de montagnes russes.",
-    48: "On me dit souvent que je suis insensible même si je ne vois pas toujours pourquoi.",
-    49: "Si je vois qu’il y a un nouveau venu dans un groupe de personnes, je crois que c’est à elles d’essayer de l’intégrer.",
-    50: "D’habitude, je ne m’implique pas émotionnellement lorsque je regarde un film.",
-    51: "J’aime être très organisé(e) dans ma vie de tous les jours, et je fais souvent des listes de ce que j’ai à faire.",
-    52: "Je peux me mettre à l’écoute du ressenti des autres rapidement et intuitivement.",
-    53: "Je n’aime pas prendre de risques.",
-    54: "Je peux facilement comprendre ce que quelqu’un veut dire.",
-    55: "Je peux deviner si quelqu’un masque ses émotions.",
-    56: "Je pèse toujours le pour et le contre avant de prendre une décision.",
-    57: "Je n’essaie pas de déchiffrer de façon consciente les règles en jeu dans les situations sociales.",
-    58: "Je suis bon(ne) pour prédire ce que quelqu’un va faire.",
-    59: "J’ai tendance à m’impliquer émotionnellement dans les problèmes de mes amis.",
-    60: "Habituellement, je comprends le point de vue des autres même si je ne le partage pas.",
-}
+    metrics.inc("cache_misses_total", cache="derived")
+    aq_answers, eq_answers, prereq_flags = answers_from_payload(data)
+    with metrics.span("scoring"):
+        return compute_derived(aq_answers, eq_answers, prereq_flags)
 
-ANSWER_LABELS = {
-    1: "Tout à fait d’accord",
-    2: "Plutôt d’accord",
-    3: "Plutôt pas d’accord",
-    4: "Pas du tout d’accord",
-}
 
-# =========================================================
-# COTATION AQ
-# =========================================================
+def get_result_view(data: dict) -> dict:
+    """
+    Page de résultats praticien d'un payload (voir aqeq.reports.result_view),
+    construite une fois par contenu et version des règles, puis servie par
+    le cache des vues.
+    """
+    key = view_key(data)
+    cache = get_view_cache()
+    view = cache.get(key, VIEW_VERSION)
+    if view is None:
+        with metrics.span("render_view"):
+            view = result_view(data)
+        cache.put(key, VIEW_VERSION, view)
+    return view
+
+
+@st.cache_resource
+def sync_summary_index(url: str = STORE_URL, batch_size: int = 1000) -> int:
+    """
+    Ajoute à l'index les réponses enregistrées avant son introduction.
+    Exécuté une fois par processus ; renvoie le nombre de résumés ajoutés.
+    """
+    store = get_store(url)
+    indexed = store.index.codes() & store.norms.codes() & store.timeline.codes()
+    missing = [code for code in store.codes() if code not in indexed]
+    added = 0
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        try:
+            payloads = [p for p in (store.load(code) for code in batch) if p is not None]
+            summaries = summarize_responses(payloads)
+        except Exception:
+            # Un enregistrement mal formé ne doit pas bloquer les autres :
+            # on reprend le paquet code par code.
+            summaries = [s for s in (_summary_or_none(store, code) for code in batch) if s is not None]
+        store.index_summaries(summaries)
+        added += len(summaries)
+    return added
+
+
+def _summary_or_none(store, code: str):
+    """Résumé d'un code, ou None (journalisé, compté) s'il est illisible."""
+    try:
+        payload = store.load(code)
+        return None if payload is None else summarize_responses([payload])[0]
+    except Exception:
+        logger.warning("Réponse %s illisible, non indexée (voir python -m aqeq check)", code, exc_info=True)
+        metrics.inc("index_sync_errors_total")
+        return None
 
-AQ_AGREE_ITEMS = {
-    2, 4, 5, 6, 7, 9, 12, 13,
-    16, 18, 19, 20, 21, 22, 23,
-    26, 33, 35, 39, 41, 42, 43,
-    45, 46,
-}
+
+def render_norms(data: dict, aq_score: int, eq_score: int):
+    """Situe les scores du patient dans la population enregistrée."""
+    sync_summary_index()
+    norms = get_store().norms
+    sex = data.get("sex", "") or ""
+    band = age_band(data.get("dob"), data.get("test_date"))
+    rows = []
+    for label, g_sex, g_band in (
+        (f"{sex or 'sexe non renseigné'}, {band}", sex, band),
+        ("Toute la population", ALL, ALL),
+    ):
+        for scale, name, score in (("aq", "AQ", aq_score), ("eq", "EQ", eq_score)):
+            stats = norms.stats(scale, g_sex, g_band)
+            if stats is None:
+                continue
+            rows.append({
+                "Groupe de référence": label,
+                "Échelle": name,
+                "n": stats["n"],
+                "Moyenne": round(stats["mean"], 1),
+                "Écart-type": round(stats["sd"], 1),
+                "Percentile": round(norms.percentile(scale, score, g_sex, g_band)),
+            })
+    if rows:
+        st.markdown("### Comparaison à la population enregistrée")
+        st.table(rows)
 
 
-def is_aq_autistic(item: int, resp: int) -> bool:
-    if resp is None:
-        return False
-    if item in AQ_AGREE_ITEMS:
-        return resp in (1, 2)
-    return resp in (3, 4)
+def _signed(value: int) -> str:
+    return f"{value:+d}" if value else "0"
 
 
-def score_aq_officiel(aq_answers: dict) -> int:
-    return sum(1 for i, r in aq_answers.items() if is_aq_autistic(i, r))
+def render_timeline(data: dict):
+    """
+    Passations successives du même répondant (même code praticien et même
+    identifiant), avec les écarts calculés à l'enregistrement.
+    """
+    sync_summary_index()
+    sittings = get_store().timeline.history(data.get("practitioner_code", ""), data.get("patient_id", ""))
+    if len(sittings) < 2:
+        return
+    st.markdown("### Passations successives")
+    rows = []
+    for sitting in sittings:
+        scores, delta = sitting["scores"] or {}, sitting["delta"]
+        row = {
+            "Date": sitting["test_date"],
+            "Code patient": sitting["patient_code"],
+            "AQ": scores.get("aq_score", ""),
+            "Δ AQ": _signed(delta["aq_score"]) if delta else "",
+            "EQ": scores.get("eq_score", ""),
+            "Δ EQ": _signed(delta["eq_score"]) if delta else "",
+            "Δ CLASS": _signed(delta["class_total"]) if delta else "",
+        }
+        for name in AQ_SUBSCALES:
+            row[f"Δ {name.split('.')[0]}"] = _signed(delta["aq_subscales"][name]) if delta else ""
+        rows.append(row)
+    st.table(rows)
+
+    current = next((s for s in sittings if s["patient_code"] == data.get("patient_code")), None)
+    delta = current and current["delta"]
+    if delta:
+        since = f" ({delta['days']} jours)" if delta["days"] is not None else ""
+        with st.expander(f"Réponses modifiées depuis {delta['previous']}{since}"):
+            points = delta["aq_points"]
+            st.markdown(
+                f"- Items AQ désormais cotés : {', '.join(map(str, points['gained'])) or 'aucun'}\n"
+                f"- Items AQ qui ne sont plus cotés : {', '.join(map(str, points['lost'])) or 'aucun'}"
+            )
+            changes = [
+                {
+                    "Échelle": scale,
+                    "Item": i,
+                    "Avant": ANSWER_LABELS.get(old, str(old)),
+                    "Après": ANSWER_LABELS.get(new, str(new)),
+                }
+                for scale, key in (("AQ", "aq_items"), ("EQ", "eq_items"))
+                for i, old, new in delta[key]
+            ]
+            if changes:
+                st.dataframe(changes, use_container_width=True)
 
 
-AQ_SUBSCALES = {
-    "A. Compétences sociales": [1, 11, 13, 15, 22, 36, 44, 45, 47, 48],
-    "B. Flexibilité / Attention switching": [2, 4, 10, 16, 25, 32, 34, 37, 43, 46],
-    "B’. Attention aux détails": [5, 6, 9, 12, 19, 23, 28, 29, 30, 49],
-    "C. Communication": [7, 17, 18, 26, 27, 31, 33, 35, 38, 39],
-    "D. Imagination": [3, 8, 14, 20, 21, 24, 40, 41, 42, 50],
-}
+# =========================================================
+# COMPOSANTS D'INTERFACE
+# =========================================================
+# Streamlit réexécute ce script à chaque interaction : tout ce qui est
+# statique (libellés des questions, options de réponse) est préparé une
+# seule fois par processus. Les tables de cotation vivent dans aqeq.items /
+# aqeq.scoring, importés une seule fois par processus elles aussi.
 
+ANSWER_OPTIONS = tuple(ANSWER_LABELS)
 
-def score_aq_subscales(aq_answers):
-    subs = {}
-    for name, items in AQ_SUBSCALES.items():
-        subs[name] = sum(
-            1 for i in items if is_aq_autistic(i, aq_answers.get(i))
-        )
-    return subs
 
+def format_answer(resp: int) -> str:
+    return ANSWER_LABELS[resp]
 
-# =========================================================
-# DSM / CLASS CLINIC
-# =========================================================
 
-CLASS_A_ITEMS = AQ_SUBSCALES["A. Compétences sociales"]
-CLASS_B_ITEMS = AQ_SUBSCALES["B. Flexibilité / Attention switching"] + AQ_SUBSCALES["B’. Attention aux détails"]
-CLASS_C_ITEMS = AQ_SUBSCALES["C. Communication"]
-CLASS_D_ITEMS = AQ_SUBSCALES["D. Imagination"]
-
-
-def build_dsm_blocks(aq_answers):
-    blocks = {"A": [], "B": [], "C": [], "D": []}
-    for item in sorted(CLASS_A_ITEMS):
-        if is_aq_autistic(item, aq_answers.get(item)):
-            blocks["A"].append(f"{AQ_ITEMS[item]} (AQ{item})")
-    for item in sorted(CLASS_B_ITEMS):
-        if is_aq_autistic(item, aq_answers.get(item)):
-            blocks["B"].append(f"{AQ_ITEMS[item]} (AQ{item})")
-    for item in sorted(CLASS_C_ITEMS):
-        if is_aq_autistic(item, aq_answers.get(item)):
-            blocks["C"].append(f"{AQ_ITEMS[item]} (AQ{item})")
-    for item in sorted(CLASS_D_ITEMS):
-        if is_aq_autistic(item, aq_answers.get(item)):
-            blocks["D"].append(f"{AQ_ITEMS[item]} (AQ{item})")
-    return blocks
-
-
-def compute_class_clinic_counts(aq_answers):
-    sections = {
-        "A": {"label": "Social", "items": CLASS_A_ITEMS, "required": 3},
-        "B": {"label": "Obsessions / intérêts restreints", "items": CLASS_B_ITEMS, "required": 3},
-        "C": {"label": "Communication", "items": CLASS_C_ITEMS, "required": 3},
-        "D": {"label": "Imagination", "items": CLASS_D_ITEMS, "required": 1},
-    }
-
-    out = {}
-    total_obs = 0
-
-    for key, sec in sections.items():
-        obs = sum(
-            1 for item in sec["items"]
-            if is_aq_autistic(item, aq_answers.get(item))
+@st.cache_resource
+def question_specs(prefix: str) -> tuple:
+    """(clé du widget, numéro d'item, libellé affiché) pour chaque item."""
+    items = AQ_ITEMS if prefix == "AQ" else EQ_ITEMS
+    return tuple((f"{prefix}_{i}", i, f"{i}. {label}") for i, label in items.items())
+
+
+def render_questions(prefix: str, defaults: dict) -> dict:
+    """
+    Affiche les boutons radio d'un questionnaire, pré-remplis avec
+    `defaults` ({item: réponse}) ; renvoie {item: réponse}.
+    """
+    answers = {}
+    for key, i, label in question_specs(prefix):
+        answers[i] = st.radio(
+            label,
+            options=ANSWER_OPTIONS,
+            index=ANSWER_OPTIONS.index(defaults.get(i, ANSWER_OPTIONS[0])),
+            format_func=format_answer,
+            horizontal=True,
+            key=key,
         )
-        total_obs += obs
-        out[key] = {
-            "label": sec["label"],
-            "required": sec["required"],
-            "observed": obs,
-            "max_items": len(sec["items"]),
-        }
+    return answers
 
-    out["TOTAL"] = {
-        "label": "Total A+B+C+D",
-        "required": 10,
-        "observed": total_obs,
-        "max_items": 18,
-    }
 
-    return out
+# =========================================================
+# BROUILLONS (passation en plusieurs pages)
+# =========================================================
+# La passation se fait page par page. À chaque changement de page, seules
+# les réponses modifiées depuis la dernière sauvegarde sont ajoutées au
+# journal du brouillon ; le code de reprise permet de continuer plus tard.
+
+RESPONDENT_STEPS = [
+    ("info", "Informations générales"),
+    ("aq_answers", "Questionnaire AQ (50 items)"),
+    ("eq_answers", "Questionnaire EQ (60 items)"),
+    ("prereq", "Pré-requis (DSM / CLASS CLINIC)"),
+]
+
+PREREQ_QUESTIONS = {
+    "E": "Ces difficultés (sociales, communication, intérêts spécifiques) sont présentes depuis toujours (depuis l’enfance).",
+    "F": "Ces difficultés ont déjà eu un impact important sur votre vie (isolement, souffrance, difficultés importantes).",
+    "G": "Il n’y a pas eu de retard majeur du langage dans l’enfance.",
+    "H": "Vous n’avez pas eu de trouble spécifique majeur des apprentissages (lecture, écriture, calcul).",
+    "I": "Vous n’avez jamais présenté de symptômes psychotiques.",
+}
 
 
-def build_class_clinic_summary(section_counts, prereq_flags):
-    core_ok = all(
-        section_counts[s]["observed"] >= section_counts[s]["required"]
-        for s in ["A", "B", "C", "D"]
-    )
-    prereq_ok = all(prereq_flags.values())
+def empty_draft() -> dict:
+    return {"step": 0, **{section: {} for section, _ in RESPONDENT_STEPS}}
 
-    msg = []
 
-    msg.append(f"A: Social – {section_counts['A']['observed']} symptômes (≥ {section_counts['A']['required']}).")
-    msg.append(f"B: Intérêts restreints – {section_counts['B']['observed']} symptômes (≥ {section_counts['B']['required']}).")
-    msg.append(f"C: Communication – {section_counts['C']['observed']} symptômes (≥ {section_counts['C']['required']}).")
-    msg.append(f"D: Imagination – {section_counts['D']['observed']} symptômes (≥ {section_counts['D']['required']}).")
-    msg.append(f"Total A+B+C+D : {section_counts['TOTAL']['observed']} symptômes (seuil = 10).")
+def draft_from_store(stored: dict) -> dict:
+    """Brouillon relu du stockage (clés JSON → numéros d'items entiers)."""
+    draft = empty_draft()
+    draft["step"] = int(stored.get("step", 0))
+    draft["info"].update(stored.get("info", {}))
+    draft["prereq"].update(stored.get("prereq", {}))
+    for section in ("aq_answers", "eq_answers"):
+        draft[section].update({int(k): int(v) for k, v in stored.get(section, {}).items()})
+    return draft
 
-    if core_ok and prereq_ok:
-        msg.append(
-            "➡️ Ensemble des critères principaux + prérequis cochés : profil compatible avec un fonctionnement du spectre autistique "
-            "(à confirmer cliniquement, ce résultat n'étant pas un diagnostic)."
-        )
-    elif core_ok and not prereq_ok:
-        msg.append(
-            "➡️ Critères A–D atteints, mais prérequis non tous remplis (selon les réponses du patient). "
-            "Interprétation clinique prudente."
-        )
-    elif not core_ok and prereq_ok:
-        msg.append(
-            "➡️ Pré-requis cochés mais critères A–D partiellement atteints : traits ou particularités possibles, "
-            "sans réunir tous les critères."
-        )
-    else:
-        msg.append(
-            "➡️ Ni les critères ni les prérequis ne sont réunis : particularités possibles "
-            "mais non compatibles avec le tableau complet."
-        )
 
-    return "\n\n".join(msg)
+def autosave_draft(section: str, values: dict, next_step: int):
+    """Enregistre le delta de la page courante dans le brouillon."""
+    draft = st.session_state["resp_draft"]
+    delta = {k: v for k, v in values.items() if draft[section].get(k) != v}
+    if not delta and next_step == draft["step"]:
+        return
+    token = st.session_state.get("resp_token")
+    if token is None:
+        token = generate_code(12)
+        st.session_state["resp_token"] = token
+    with metrics.span("autosave_draft"):
+        get_store().append_draft(token, {section: delta, "step": next_step})
+    draft[section].update(delta)
+    draft["step"] = next_step
 
 
-# =========================================================
-# COTATION EQ
-# =========================================================
+DASHBOARD_PAGE_SIZE = 25
 
-EQ_EMPATHY_ITEMS = {
-    1, 4, 6, 8, 10, 11, 12, 14, 15, 18,
-    19, 21, 22, 25, 26, 27, 28, 29, 32, 34,
-    35, 36, 37, 38, 39, 41, 42, 43, 44, 46,
-    48, 49, 50, 52, 54, 55, 57, 58, 59, 60,
-}
 
-EQ_POSITIVE_AGREE = {
-    1, 6, 19, 22, 25, 26,
-    35, 36, 37, 38,
-    41, 42, 43, 44,
-    52, 54, 55,
-    57, 58, 59, 60,
-}
+@st.fragment
+def render_dashboard_page(code: str):
+    """
+    Une page du tableau de bord. Fragment : changer de page ne réexécute
+    que cette fonction, pas tout le script.
+    """
+    index = get_store().index
+    cursors = st.session_state.setdefault("dash_cursors", [None])
 
+    with metrics.span("dashboard_page"):
+        rows, next_cursor = index.page(code, after=cursors[-1], limit=DASHBOARD_PAGE_SIZE)
+        total = index.count(code)
 
-def score_eq_officiel(eq_answers: dict) -> int:
-    score = 0
-    for item, resp in eq_answers.items():
-        if resp is None or item not in EQ_EMPATHY_ITEMS:
-            continue
-        if item in EQ_POSITIVE_AGREE:
-            if resp == 1:
-                score += 2
-            elif resp == 2:
-                score += 1
-        else:
-            if resp == 4:
-                score += 2
-            elif resp == 3:
-                score += 1
-    return score
+    if not rows:
+        st.info("Aucune réponse enregistrée pour ce code praticien.")
+    else:
+        first = (len(cursors) - 1) * DASHBOARD_PAGE_SIZE + 1
+        st.caption(f"Réponses {first}–{first + len(rows) - 1} sur {total}")
+        st.dataframe(
+            [
+                {
+                    "Code patient": r["patient_code"],
+                    "Identifiant": r["patient_id"],
+                    "Date de passation": r["test_date"],
+                    "Sexe": r["sex"],
+                    "Score AQ": r["aq_score"],
+                    "Score EQ": r["eq_score"],
+                    "CLASS A–D": "✅ atteints" if r["class_core_ok"] else "❌ non atteints",
+                    "Pré-requis": "✅ Oui" if r["prereq_ok"] else "❌ Non",
+                }
+                for r in rows
+            ],
+            use_container_width=True,
+        )
+
+    # Les curseurs sont modifiés dans les callbacks : ils s'exécutent avant
+    # la réexécution du fragment déclenchée par le clic.
+    c1, c2 = st.columns(2)
+    with c1:
+        st.button("◀ Page précédente", disabled=len(cursors) <= 1, on_click=cursors.pop)
+    with c2:
+        st.button(
+            "Page suivante ▶",
+            disabled=next_cursor is None,
+            on_click=cursors.append,
+            args=(next_cursor,),
+        )
 
 
 # =========================================================
@@ -409,7 +524,11 @@ st.title("🧩 AQ + EQ en ligne")
 
 mode = st.sidebar.radio(
     "Mode d’utilisation",
-    ("Je suis un répondant (patient / participant)", "Je suis le praticien"),
+    (
+        "Je suis un répondant (patient / participant)",
+        "Je suis le praticien",
+        "Tableau de bord praticien",
+    ),
 )
 
 # =========================
@@ -420,112 +539,167 @@ if mode.startswith("Je suis un répondant"):
 
     st.header("Passation des questionnaires AQ + EQ")
 
-    with st.form("form_repondant"):
-
-        st.subheader("Informations générales")
-
-        patient_id = st.text_input("Identifiant (initiales ou code fourni)", "")
-        sex = st.selectbox("Sexe", ["", "Féminin", "Masculin", "Autre"])
-        dob = st.date_input(
-            "Date de naissance",
-            value=date(2000, 1, 1),
-        )
-        test_date = st.date_input(
-            "Date de passation",
-            value=date.today(),
-        )
-        practitioner_code = st.text_input(
-            "Code praticien (fourni par votre psychologue / praticien)",
-            "",
-        )
-
-        st.markdown("---")
-        st.subheader("Questionnaire AQ (50 items)")
-
-        aq_answers = {}
-        for i, label in AQ_ITEMS.items():
-            aq_answers[i] = st.radio(
-                f"{i}. {label}",
-                options=list(ANSWER_LABELS.keys()),
-                format_func=lambda x, _labels=ANSWER_LABELS: _labels[x],
-                horizontal=True,
-                key=f"AQ_{i}",
-            )
-
-        st.markdown("---")
-        st.subheader("Questionnaire EQ (60 items)")
-
-        eq_answers = {}
-        for i, label in EQ_ITEMS.items():
-            eq_answers[i] = st.radio(
-                f"{i}. {label}",
-                options=list(ANSWER_LABELS.keys()),
-                format_func=lambda x, _labels=ANSWER_LABELS: _labels[x],
-                horizontal=True,
-                key=f"EQ_{i}",
-            )
-
-        st.markdown("---")
-        st.subheader("Pré-requis (DSM / CLASS CLINIC)")
-
-        def radio_oui_non(label, key):
-            rep = st.radio(label, ["Oui", "Non"], key=key, horizontal=True)
-            return rep == "Oui"
-
-        prereq_E = radio_oui_non(
-            "Ces difficultés (sociales, communication, intérêts spécifiques) sont présentes depuis toujours (depuis l’enfance).",
-            "prereq_E",
-        )
-        prereq_F = radio_oui_non(
-            "Ces difficultés ont déjà eu un impact important sur votre vie (isolement, souffrance, difficultés importantes).",
-            "prereq_F",
-        )
-        prereq_G = radio_oui_non(
-            "Il n’y a pas eu de retard majeur du langage dans l’enfance.",
-            "prereq_G",
-        )
-        prereq_H = radio_oui_non(
-            "Vous n’avez pas eu de trouble spécifique majeur des apprentissages (lecture, écriture, calcul).",
-            "prereq_H",
-        )
-        prereq_I = radio_oui_non(
-            "Vous n’avez jamais présenté de symptômes psychotiques.",
-            "prereq_I",
+    if "resp_draft" not in st.session_state:
+        st.session_state["resp_draft"] = empty_draft()
+
+    with st.expander("Reprendre un questionnaire déjà commencé"):
+        with st.form("form_reprise"):
+            resume_token = st.text_input("Code de reprise", "")
+            resume = st.form_submit_button("Reprendre")
+        if resume:
+            resume_token = resume_token.strip().upper()
+            stored = get_store().load_draft(resume_token)
+            if stored is None:
+                st.error("Aucun questionnaire en cours pour ce code de reprise.")
+            else:
+                st.session_state["resp_draft"] = draft_from_store(stored)
+                st.session_state["resp_token"] = resume_token
+                st.rerun()
+
+    draft = st.session_state["resp_draft"]
+    step = draft["step"]
+    section, title = RESPONDENT_STEPS[step]
+    last_step = step == len(RESPONDENT_STEPS) - 1
+
+    st.progress((step + 1) / len(RESPONDENT_STEPS), text=f"Étape {step + 1} / {len(RESPONDENT_STEPS)}")
+    if st.session_state.get("resp_token"):
+        st.caption(
+            f"Vos réponses sont enregistrées au fur et à mesure. Code de reprise : "
+            f"**{st.session_state['resp_token']}**"
         )
 
-        submitted = st.form_submit_button("Envoyer mes réponses")
+    widgets = metrics.Timer("widgets", page=section)
+    with st.form(f"form_repondant_{section}"):
+
+        st.subheader(title)
+
+        if section == "info":
+            info = draft["info"]
+            values = {
+                "patient_id": st.text_input(
+                    "Identifiant (initiales ou code fourni)",
+                    info.get("patient_id", ""),
+                ),
+                "sex": st.selectbox(
+                    "Sexe",
+                    SEX_OPTIONS,
+                    index=SEX_OPTIONS.index(info.get("sex", "")),
+                ),
+                "dob": st.date_input(
+                    "Date de naissance",
+                    value=date.fromisoformat(info.get("dob", "2000-01-01")),
+                ).isoformat(),
+                "test_date": st.date_input(
+                    "Date de passation",
+                    value=date.fromisoformat(info.get("test_date", date.today().isoformat())),
+                ).isoformat(),
+                "practitioner_code": st.text_input(
+                    "Code praticien (fourni par votre psychologue / praticien)",
+                    info.get("practitioner_code", ""),
+                ),
+            }
+        elif section == "aq_answers":
+            values = render_questions("AQ", draft["aq_answers"])
+        elif section == "eq_answers":
+            values = render_questions("EQ", draft["eq_answers"])
+        else:
+            values = {
+                key: st.radio(
+                    label,
+                    ["Oui", "Non"],
+                    index=0 if draft["prereq"].get(key, True) else 1,
+                    key=f"prereq_{key}",
+                    horizontal=True,
+                ) == "Oui"
+                for key, label in PREREQ_QUESTIONS.items()
+            }
 
-    if submitted:
-        patient_code = generate_code(8)
-
-        prereq_flags = {
-            "E": prereq_E,
-            "F": prereq_F,
-            "G": prereq_G,
-            "H": prereq_H,
-            "I": prereq_I,
-        }
+        c1, c2 = st.columns(2)
+        with c1:
+            back = st.form_submit_button("◀ Précédent", disabled=step == 0)
+        with c2:
+            forward = st.form_submit_button("Envoyer mes réponses" if last_step else "Suivant ▶")
+    widgets.stop()
+
+    if back or (forward and not last_step):
+        autosave_draft(section, values, step - 1 if back else step + 1)
+        st.rerun()
+
+    if forward and last_step:
+        draft[section].update(values)
+        aq_answers = dict(sorted(draft["aq_answers"].items()))
+        eq_answers = dict(sorted(draft["eq_answers"].items()))
+        prereq_flags = dict(draft["prereq"])
+        with metrics.span("scoring"):
+            derived = compute_derived(aq_answers, eq_answers, prereq_flags)
 
         payload = {
-            "patient_code": patient_code,
-            "patient_id": patient_id,
-            "sex": sex,
-            "dob": dob.isoformat(),
-            "test_date": test_date.isoformat(),
-            "practitioner_code": practitioner_code,
+            **{k: draft["info"].get(k, "") for k in ("patient_id", "sex", "dob", "test_date", "practitioner_code")},
             "aq_answers": aq_answers,
             "eq_answers": eq_answers,
             "prereq": prereq_flags,
+            "derived": derived,
         }
 
-        save_response(patient_code, payload)
+        # Code neuf, sans jamais écraser la réponse d'un autre répondant.
+        with metrics.span("save_response"):
+            payload = save_new(get_store(), payload)
+        metrics.inc("submissions_total")
+        patient_code = payload["patient_code"]
         send_email_notification(patient_code, payload)
 
+        # Questionnaire terminé : le brouillon n'a plus lieu d'être et la
+        # prochaine passation repart de zéro.
+        token = st.session_state.pop("resp_token", None)
+        if token is not None:
+            get_store().delete_draft(token)
+        st.session_state["resp_draft"] = empty_draft()
+
         st.success("Merci, vos réponses ont été enregistrées.")
         st.info(
             f"Communiquez **ce code** à votre praticien : **{patient_code}**."
         )
 
+# =========================
+# TABLEAU DE BORD PRATICIEN
+# =========================
+
+elif mode == "Tableau de bord praticien":
+    st.header("Tableau de bord praticien")
+
+    with st.form("form_tableau_de_bord"):
+        dash_code = st.text_input("Code praticien", st.session_state.get("dash_code", ""))
+        dash_submitted = st.form_submit_button("Afficher les réponses")
+
+    if dash_submitted:
+        # Nouvelle recherche : on repart de la première page.
+        st.session_state["dash_code"] = dash_code.strip()
+        st.session_state["dash_cursors"] = [None]
+
+    if st.session_state.get("dash_code"):
+        sync_summary_index()
+        render_dashboard_page(st.session_state["dash_code"])
+
+        # Rapports de tous les patients du praticien, en une archive.
+        dash_code = st.session_state["dash_code"]
+        if st.button("Préparer l'archive des rapports (HTML)"):
+            buf = io.BytesIO()
+            store = get_store()
+            codes = store.index.practitioner_codes(dash_code)
+            with st.spinner("Rendu des rapports…"):
+                # Store de l'app (déjà ouvert, partagé) : rendu dans ce processus.
+                write_archive(buf, codes, store, "html")
+            st.session_state["dash_archive"] = (dash_code, buf.getvalue())
+        archive = st.session_state.get("dash_archive")
+        if archive is not None and archive[0] == dash_code:
+            st.download_button(
+                "Télécharger l'archive",
+                archive[1],
+                file_name=f"rapports_{dash_code}.zip",
+                mime="application/zip",
+                on_click="ignore",
+            )
+
 # =========================
 # MODE PRATICIEN
 # =========================
@@ -542,6 +716,7 @@ else:
         if data is None:
             st.error("Aucune donnée trouvée pour ce code patient.")
         else:
+            view = metrics.Timer("practitioner_view")
             st.subheader("Données générales du patient")
             col1, col2 = st.columns(2)
             with col1:
@@ -553,23 +728,10 @@ else:
                 st.write(f"**Date de passation** : {data.get('test_date', '')}")
                 st.write(f"**Code praticien enregistré** : {data.get('practitioner_code', '')}")
 
-            aq_answers = {int(k): int(v) for k, v in data["aq_answers"].items()}
-            eq_answers = {int(k): int(v) for k, v in data["eq_answers"].items()}
-
-            prereq_data = data.get("prereq", {})
-            prereq_flags = {
-                "E": bool(prereq_data.get("E", False)),
-                "F": bool(prereq_data.get("F", False)),
-                "G": bool(prereq_data.get("G", False)),
-                "H": bool(prereq_data.get("H", False)),
-                "I": bool(prereq_data.get("I", False)),
-            }
-
-            aq_score = score_aq_officiel(aq_answers)
-            eq_score = score_eq_officiel(eq_answers)
-            aq_subscores = score_aq_subscales(aq_answers)
-            dsm_blocks = build_dsm_blocks(aq_answers)
-            class_counts = compute_class_clinic_counts(aq_answers)
+            derived = get_derived(data)
+            aq_score = derived["aq_score"]
+            eq_score = derived["eq_score"]
+            result = get_result_view(data)
 
             st.markdown("---")
             st.subheader("Synthèse des scores")
@@ -580,88 +742,40 @@ else:
             with c2:
                 st.metric("Score EQ (0–80)", eq_score)
 
-            st.markdown("### Sous-échelles AQ")
-            rows = []
-            for name, items in AQ_SUBSCALES.items():
-                rows.append({
-                    "Sous-échelle": name,
-                    "Score": aq_subscores[name],
-                    "Max": len(items),
-                })
-            st.table(rows)
-
-            st.markdown("### Analyse qualitative – blocs DSM / CLASS CLINIC")
-
-            st.markdown("#### A. Trouble qualitatif de l’interaction sociale")
-            if dsm_blocks["A"]:
-                for phrase in dsm_blocks["A"]:
-                    st.markdown(f"- {phrase}")
-            else:
-                st.markdown("_Aucun item significatif._")
+            render_norms(data, aq_score, eq_score)
+            render_timeline(data)
 
-            st.markdown("#### B. Intérêts restreints et répétitifs")
-            if dsm_blocks["B"]:
-                for phrase in dsm_blocks["B"]:
-                    st.markdown(f"- {phrase}")
-            else:
-                st.markdown("_Aucun item significatif._")
-
-            st.markdown("#### C. Communication")
-            if dsm_blocks["C"]:
-                for phrase in dsm_blocks["C"]:
-                    st.markdown(f"- {phrase}")
-            else:
-                st.markdown("_Aucun item significatif._")
+            st.markdown("### Sous-échelles AQ")
+            st.table(result["subscales"])
 
-            st.markdown("#### D. Imagination")
-            if dsm_blocks["D"]:
-                for phrase in dsm_blocks["D"]:
-                    st.markdown(f"- {phrase}")
-            else:
-                st.markdown("_Aucun item significatif._")
+            st.markdown(result["analysis"])
 
             st.markdown("### Grille CLASS CLINIC – synthèse")
+            st.table(result["class_rows"])
 
-            tbl = []
-            for key in ["A", "B", "C", "D"]:
-                c = class_counts[key]
-                tbl.append({
-                    "Section": key,
-                    "Domaine": c["label"],
-                    "Nb requis": c["required"],
-                    "Nb observés": c["observed"],
-                    "Nb items possibles": c["max_items"],
-                })
-            tot = class_counts["TOTAL"]
-            tbl.append({
-                "Section": "Total",
-                "Domaine": tot["label"],
-                "Nb requis": tot["required"],
-                "Nb observés": tot["observed"],
-                "Nb items possibles": tot["max_items"],
-            })
-            st.table(tbl)
-
-            st.markdown("### Pré-requis (réponses du patient)")
-
-            def fmt(b): return "✅ Oui" if b else "❌ Non"
-
-            st.markdown(f"- **E** : présent depuis l’enfance – {fmt(prereq_flags['E'])}")
-            st.markdown(f"- **F** : impact significatif – {fmt(prereq_flags['F'])}")
-            st.markdown(f"- **G** : pas de retard langage – {fmt(prereq_flags['G'])}")
-            st.markdown(f"- **H** : pas de trouble apprentissage majeur – {fmt(prereq_flags['H'])}")
-            st.markdown(f"- **I** : pas de traits psychotiques – {fmt(prereq_flags['I'])}")
-
-            st.markdown("### Synthèse clinique automatique")
-
-            summary = build_class_clinic_summary(class_counts, prereq_flags)
-            st.markdown(summary.replace("\n\n", "\n\n---\n\n"))
+            st.markdown(result["prereq"])
+            st.markdown(result["summary"])
 
             st.markdown("---")
             st.subheader("Réponses AQ détaillées")
-            table_aq = [{"Item": i, "Réponse": ANSWER_LABELS[aq_answers[i]]} for i in sorted(aq_answers)]
-            st.dataframe(table_aq, use_container_width=True)
+            st.dataframe(result["aq_answers"], use_container_width=True)
 
             st.subheader("Réponses EQ détaillées")
-            table_eq = [{"Item": i, "Réponse": ANSWER_LABELS[eq_answers[i]]} for i in sorted(eq_answers)]
-            st.dataframe(table_eq, use_container_width=True)
+            st.dataframe(result["eq_answers"], use_container_width=True)
+
+            # Rapport rendu seulement au clic (hors du cache des vues).
+            st.download_button(
+                "Télécharger le rapport (HTML)",
+                partial(render_html, data),
+                file_name=f"rapport_{data.get('patient_code', '')}.html",
+                mime="text/html",
+                on_click="ignore",
+            )
+            view.stop()
+
+# =========================================================
+# FIN DE RÉEXÉCUTION
+# =========================================================
+
+metrics.end_rerun()
+metrics.dump_if_due(METRICS_FILE)
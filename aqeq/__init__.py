@@ -0,0 +1,49 @@
+"""
+Briques réutilisables de l'application AQ + EQ (sans Streamlit).
+
+Les sous-modules sont chargés à la demande : `import aqeq` ne coûte rien,
+et `aqeq.score_batch` n'importe que aqeq.scoring (NumPy n'est chargé qu'au
+premier calcul).
+"""
+
+import importlib
+
+# Nom exporté → sous-module qui le définit.
+_EXPORTS = {
+    "ANSWER_LABELS": "aqeq.items",
+    "AQ_ITEMS": "aqeq.items",
+    "AQ_SUBSCALES": "aqeq.items",
+    "CLASS_SECTIONS": "aqeq.items",
+    "CodeExistsError": "aqeq.storage",
+    "EQ_ITEMS": "aqeq.items",
+    "available_instruments": "aqeq.instrument",
+    "load_instrument": "aqeq.instrument",
+    "SCORING_RULES_VERSION": "aqeq.scoring",
+    "answers_matrix": "aqeq.scoring",
+    "build_class_clinic_summary": "aqeq.scoring",
+    "build_dsm_blocks": "aqeq.scoring",
+    "compute_class_clinic_counts": "aqeq.scoring",
+    "compute_derived": "aqeq.scoring",
+    "derived_texts": "aqeq.scoring",
+    "score_aq_officiel": "aqeq.scoring",
+    "score_aq_subscales": "aqeq.scoring",
+    "score_batch": "aqeq.scoring",
+    "score_eq_officiel": "aqeq.scoring",
+    "open_store": "aqeq.storage",
+    "save_new": "aqeq.storage",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'aqeq' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
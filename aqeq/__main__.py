@@ -0,0 +1,5 @@
+import sys
+
+from aqeq.cli import main
+
+sys.exit(main())
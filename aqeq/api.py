@@ -0,0 +1,254 @@
+"""
+API HTTP asynchrone (FastAPI) pour intégrer le questionnaire à d'autres
+portails, sans session Streamlit :
+
+    POST /responses          valider, coter et enregistrer une réponse
+    GET  /responses/{code}   scores dérivés et blocs DSM d'une réponse
+    POST /score:batch        cotation par lot, sans enregistrement
+    GET  /metrics            mesures au format Prometheus (aqeq.metrics)
+
+    pip install -r requirements-api.txt
+    python -m aqeq.api --store sqlite:data_aq_eq.db --port 8000
+
+La cotation (aqeq.scoring) et les stores (aqeq.storage) sont ceux de l'app.
+Les appels bloquants (disque, NumPy) passent dans le pool de threads
+d'anyio : la boucle d'événements reste libre pour les autres clients, et
+les enregistrements concurrents sont regroupés (group commit).
+
+Tests en mémoire, sans serveur :
+
+    from fastapi.testclient import TestClient
+    client = TestClient(create_app("sqlite:/tmp/test.db"))
+"""
+
+import argparse
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Literal, Optional
+
+from aqeq import metrics
+from aqeq.items import AQ_N_ITEMS, EQ_N_ITEMS, PREREQ_KEYS, SEX_OPTIONS
+from aqeq.paths import default_store
+
+try:
+    from fastapi import FastAPI, HTTPException
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import PlainTextResponse
+    from pydantic import BaseModel, Field, field_validator, model_validator
+except ImportError as exc:  # pragma: no cover - dépendance optionnelle
+    raise ImportError("L'API nécessite FastAPI (pip install fastapi uvicorn).") from exc
+
+# Nombre maximal de réponses par appel à /score:batch.
+MAX_BATCH = 10000
+
+
+# =========================================================
+# SCHÉMAS
+# =========================================================
+
+def _check_answers(answers: dict, n_items: int, scale: str) -> dict:
+    missing = [i for i in range(1, n_items + 1) if i not in answers]
+    if missing:
+        raise ValueError(f"{scale} : items sans réponse {missing[:10]}")
+    extra = sorted(set(answers) - set(range(1, n_items + 1)))
+    if extra:
+        raise ValueError(f"{scale} : items inconnus {extra[:10]}")
+    bad = [i for i, r in answers.items() if r not in (1, 2, 3, 4)]
+    if bad:
+        raise ValueError(f"{scale} : réponses hors de 1–4 pour les items {bad[:10]}")
+    return dict(sorted(answers.items()))
+
+
+class Answers(BaseModel):
+    """Réponses complètes : 1 = tout à fait d'accord … 4 = pas du tout d'accord."""
+
+    aq_answers: dict[int, int]
+    eq_answers: dict[int, int]
+    prereq: dict[str, bool] = Field(default_factory=dict, validate_default=True)
+
+    @field_validator("aq_answers")
+    @classmethod
+    def _aq(cls, value):
+        return _check_answers(value, AQ_N_ITEMS, "AQ")
+
+    @field_validator("eq_answers")
+    @classmethod
+    def _eq(cls, value):
+        return _check_answers(value, EQ_N_ITEMS, "EQ")
+
+    @field_validator("prereq")
+    @classmethod
+    def _prereq(cls, value):
+        unknown = sorted(set(value) - set(PREREQ_KEYS))
+        if unknown:
+            raise ValueError(f"prérequis inconnus {unknown}")
+        return {k: bool(value.get(k, False)) for k in PREREQ_KEYS}
+
+
+class ResponseIn(Answers):
+    """Réponse complète ; dates au format ISO (AAAA-MM-JJ), sexe parmi SEX_OPTIONS."""
+
+    patient_id: str = ""
+    sex: Literal[SEX_OPTIONS] = ""
+    dob: Optional[date] = None
+    test_date: date = Field(default_factory=date.today)
+    practitioner_code: str = ""
+
+    @model_validator(mode="after")
+    def _dates(self):
+        if self.dob is not None and self.dob > self.test_date:
+            raise ValueError("date de naissance postérieure à la date de passation")
+        return self
+
+    def payload(self) -> dict:
+        """Payload à enregistrer, dates en texte ISO comme dans l'app."""
+        out = self.model_dump()
+        out["dob"] = self.dob.isoformat() if self.dob else ""
+        out["test_date"] = self.test_date.isoformat()
+        return out
+
+
+class BatchIn(BaseModel):
+    responses: list[Answers] = Field(max_length=MAX_BATCH)
+
+
+# =========================================================
+# TRAITEMENTS (exécutés dans le pool de threads)
+# =========================================================
+
+def _result(payload: dict, derived: dict) -> dict:
+    from aqeq.scoring import derived_texts
+
+    prereq = payload.get("prereq", {})
+    texts = derived_texts(derived, {k: bool(prereq.get(k, False)) for k in PREREQ_KEYS})
+    return {
+        "patient_code": payload.get("patient_code", ""),
+        "patient_id": payload.get("patient_id", ""),
+        "sex": payload.get("sex", ""),
+        "dob": payload.get("dob", ""),
+        "test_date": payload.get("test_date", ""),
+        "practitioner_code": payload.get("practitioner_code", ""),
+        "rules_version": derived["rules_version"],
+        "aq_score": derived["aq_score"],
+        "eq_score": derived["eq_score"],
+        "aq_subscales": derived["aq_subscales"],
+        "dsm_blocks": texts["dsm_blocks"],
+        "class_counts": texts["class_counts"],
+        "class_summary": texts["class_summary"],
+    }
+
+
+def submit_response(store, response: ResponseIn) -> dict:
+    from aqeq.scoring import compute_derived
+    from aqeq.storage import save_new
+
+    payload = response.payload()
+    payload["derived"] = compute_derived(payload["aq_answers"], payload["eq_answers"], payload["prereq"])
+    stored = save_new(store, payload)
+    return _result(stored, stored["derived"])
+
+
+def read_response(store, patient_code: str):
+    from aqeq.scoring import answers_from_payload, compute_derived, derived_is_current
+
+    payload = store.load(patient_code)
+    if payload is None:
+        return None
+    derived = payload.get("derived")
+    if not derived_is_current(derived):
+        derived = compute_derived(*answers_from_payload(payload))
+    return _result(payload, derived)
+
+
+def score_many(batch: BatchIn) -> list:
+    """Cotation NumPy de tout le lot en une passe (voir score_batch)."""
+    from aqeq.items import AQ_SUBSCALES, CLASS_SECTIONS
+    from aqeq.scoring import answers_matrix, score_batch, scoring_tables
+
+    responses = batch.responses
+    if not responses:
+        return []
+    scores = score_batch(
+        answers_matrix([r.aq_answers for r in responses], AQ_N_ITEMS),
+        answers_matrix([r.eq_answers for r in responses], EQ_N_ITEMS),
+    )
+    core_ok = (scores["class_counts"] >= scoring_tables().class_required).all(axis=1)
+    return [
+        {
+            "aq_score": int(scores["aq_score"][n]),
+            "eq_score": int(scores["eq_score"][n]),
+            "aq_subscales": dict(zip(AQ_SUBSCALES, map(int, scores["aq_subscales"][n]))),
+            "class_counts": dict(zip(CLASS_SECTIONS, map(int, scores["class_counts"][n]))),
+            "class_total": int(scores["class_total"][n]),
+            "class_core_ok": bool(core_ok[n]),
+            "prereq_ok": all(r.prereq.values()),
+        }
+        for n, r in enumerate(responses)
+    ]
+
+
+# =========================================================
+# APPLICATION
+# =========================================================
+
+def create_app(store_url: str = None) -> FastAPI:
+    """Application FastAPI sur le store `store_url` (défaut : $AQEQ_STORE)."""
+    from aqeq.storage import open_store, valid_code
+
+    store_url = store_url or default_store()
+    store = open_store(store_url, group_commit=True)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        store.close()
+
+    app = FastAPI(title="AQ + EQ", lifespan=lifespan)
+    app.state.store = store
+
+    @app.post("/responses", status_code=201)
+    async def post_response(response: ResponseIn):
+        with metrics.span("api_post_response"):
+            result = await run_in_threadpool(submit_response, store, response)
+        metrics.inc("submissions_total")
+        return result
+
+    @app.get("/responses/{patient_code}")
+    async def get_response(patient_code: str):
+        patient_code = patient_code.strip().upper()
+        result = None
+        metrics.inc("loads_total")
+        if valid_code(patient_code):
+            with metrics.span("api_get_response"):
+                result = await run_in_threadpool(read_response, store, patient_code)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Aucune donnée trouvée pour ce code patient.")
+        return result
+
+    @app.post("/score:batch")
+    async def post_score_batch(batch: BatchIn):
+        with metrics.span("api_score_batch"):
+            return {"results": await run_in_threadpool(score_many, batch)}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m aqeq.api")
+    parser.add_argument("--store", default=default_store())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("Le serveur nécessite uvicorn (pip install uvicorn).")
+    uvicorn.run(create_app(args.store), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
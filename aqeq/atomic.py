@@ -0,0 +1,141 @@
+"""
+Écritures de fichiers sûres en cas d'accès concurrent ou de crash.
+
+Le contenu est écrit dans un fichier temporaire du même répertoire,
+synchronisé sur disque (fsync), puis publié en une opération atomique :
+  - os.replace pour remplacer un fichier existant ;
+  - os.link pour une création exclusive (échoue si la cible existe, sans
+    fenêtre entre le test et la création).
+Un lecteur voit donc l'ancien contenu ou le nouveau, jamais un fichier
+tronqué.
+
+`GroupCommit` regroupe les écritures concurrentes : pendant qu'un thread
+synchronise un lot, les suivants s'accumulent et partent ensemble dans le
+lot suivant (une seule synchronisation du répertoire par lot).
+"""
+
+import os
+import secrets
+import threading
+
+
+def _tmp_path(path: str) -> str:
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+
+
+def write_tmp(path: str, data: bytes, fsync: bool = True) -> str:
+    """Écrit `data` dans un fichier temporaire à côté de `path` ; renvoie son chemin."""
+    tmp = _tmp_path(path)
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        if fsync:
+            os.fsync(fd)
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp)
+        raise
+    os.close(fd)
+    return tmp
+
+
+def publish(tmp: str, path: str, exclusive: bool = False):
+    """
+    Rend `tmp` visible sous le nom `path`. Avec `exclusive`, lève
+    FileExistsError si `path` existe déjà (le temporaire est supprimé).
+    """
+    if not exclusive:
+        os.replace(tmp, path)
+        return
+    try:
+        os.link(tmp, path)
+    finally:
+        os.unlink(tmp)
+
+
+def fsync_dir(directory: str):
+    """Rend durables les renommages faits dans `directory` (POSIX)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, data: bytes, exclusive: bool = False, fsync: bool = True):
+    """Écriture atomique d'un fichier (voir module)."""
+    publish(write_tmp(path, data, fsync), path, exclusive)
+    if fsync:
+        fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+class _Entry:
+    __slots__ = ("item", "done", "error")
+
+    def __init__(self, item):
+        self.item = item
+        self.done = False
+        self.error = None
+
+
+class GroupCommit:
+    """
+    Sérialise les appels à `flush(items) -> erreurs` en les regroupant.
+
+    `flush` reçoit une liste d'éléments et renvoie une liste de même
+    longueur (None ou l'exception propre à chaque élément). Le premier
+    thread qui trouve la voie libre devient « meneur » et écrit tout ce qui
+    attend (au plus `max_batch` éléments) ; les autres attendent la fin du
+    lot qui contient leur élément.
+    """
+
+    def __init__(self, flush, max_batch: int = 256):
+        self._flush = flush
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending = []
+        self._flushing = False
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """Bloque jusqu'à ce que `item` soit écrit ; relève son erreur éventuelle."""
+        entry = _Entry(item)
+        with self._cond:
+            self._pending.append(entry)
+            while not entry.done:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                batch = self._pending[: self.max_batch]
+                del self._pending[: self.max_batch]
+                self._cond.release()
+                errors = [RuntimeError("écriture groupée interrompue")] * len(batch)
+                try:
+                    errors = self._run(batch)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    for e, error in zip(batch, errors):
+                        e.done = True
+                        e.error = error
+                    self.batches += 1
+                    self.items += len(batch)
+                    self._cond.notify_all()
+        if entry.error is not None:
+            raise entry.error
+
+    def _run(self, batch):
+        try:
+            return self._flush([e.item for e in batch])
+        except Exception as exc:
+            return [exc] * len(batch)
@@ -0,0 +1,397 @@
+"""
+Banc de mesure des performances (sortie JSON).
+
+    python -m aqeq.bench -o bench.json
+    python -m aqeq.bench --quick -o new.json --compare bench.json
+    python -m aqeq.bench --check                 # --quick contre la référence
+
+Sections mesurées :
+  - single  : cotation d'un répondant (score_aq_officiel, score_eq_officiel,
+              compute_class_clinic_counts) ;
+  - batch   : score_batch sur des cohortes synthétiques (1k → 1M) ;
+  - storage : aller-retour save/load pour des stores de taille croissante ;
+  - writers : save concurrents (1 → 16 threads), avec et sans écriture
+              groupée (group commit), fsync compris ;
+  - rerun   : réexécution complète de app.py via streamlit AppTest
+              (ignorée si Streamlit n'est pas installé).
+
+Chaque mesure donne un débit (opérations/s) et les percentiles p50/p95/p99
+en millisecondes. Avec --compare, les débits sont comparés à un fichier
+précédent et la commande échoue si l'un d'eux baisse de plus de
+--threshold (20 % par défaut).
+
+La référence versionnée (BASELINE_PATH, benchmarks/baseline-quick.json) est
+le meilleur de trois exécutions --quick (`--runs 3`, voir `best_of`) :
+`--check` la rejoue de la même façon et s'y compare avec un seuil de 50 % :
+les mesures courtes de --quick varient de 30 à 40 % d'une exécution à
+l'autre sur une même machine, le contrôle ne vise que les régressions
+franches (débit divisé par deux).
+
+C'est une référence locale : les débits n'ont de sens que sur la machine
+qui l'a produite. `--check` ne compare que si `meta.platform` et
+`meta.cpu_count` de la référence sont ceux de la machine courante ; sinon
+il le signale et sort sans échec. Sur une autre machine (ou après une
+amélioration voulue), régénérer la référence avec
+
+    python -m aqeq.bench --quick --runs 3 -o benchmarks/baseline-quick.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from aqeq.items import AQ_N_ITEMS, EQ_N_ITEMS, PREREQ_KEYS
+from aqeq.paths import APP_PATH, ROOT_DIR
+
+BASELINE_PATH = os.path.join(ROOT_DIR, "benchmarks", "baseline-quick.json")
+# Champs de `meta` qui doivent coïncider pour que `--check` compare.
+HOST_FIELDS = ("platform", "cpu_count")
+
+
+# =========================================================
+# OUTILS
+# =========================================================
+
+def summarize(samples, ops_per_sample: int = 1) -> dict:
+    """Débit et percentiles (ms) d'une liste de durées en secondes."""
+    total = sum(samples)
+    ms = sorted(s * 1000 for s in samples)
+    if len(ms) >= 2:
+        q = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = q[49], q[94], q[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    return {
+        "n": len(samples),
+        "ops_per_s": round(len(samples) * ops_per_sample / total, 2) if total else None,
+        "p50_ms": round(p50, 4),
+        "p95_ms": round(p95, 4),
+        "p99_ms": round(p99, 4),
+    }
+
+
+def timed(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def synthetic_payload(rng: random.Random, patient_code: str) -> dict:
+    aq = {i: rng.randint(1, 4) for i in range(1, AQ_N_ITEMS + 1)}
+    eq = {i: rng.randint(1, 4) for i in range(1, EQ_N_ITEMS + 1)}
+    return {
+        "patient_code": patient_code,
+        "patient_id": f"ID{rng.randint(0, 9999):04d}",
+        "sex": rng.choice(["Féminin", "Masculin", "Autre"]),
+        "dob": f"{rng.randint(1950, 2010)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        "test_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "practitioner_code": f"P{rng.randint(0, 20)}",
+        "aq_answers": aq,
+        "eq_answers": eq,
+        "prereq": {k: rng.random() < 0.7 for k in PREREQ_KEYS},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =========================================================
+# SECTIONS
+# =========================================================
+
+def bench_single(repeat: int) -> dict:
+    from aqeq.scoring import compute_class_clinic_counts, score_aq_officiel, score_eq_officiel
+
+    payload = synthetic_payload(random.Random(0), "BENCH000")
+    aq, eq = payload["aq_answers"], payload["eq_answers"]
+    score_aq_officiel(aq)  # chargement de NumPy et des tables hors mesure
+    return {
+        "score_aq_officiel": summarize(timed(lambda: score_aq_officiel(aq), repeat)),
+        "score_eq_officiel": summarize(timed(lambda: score_eq_officiel(eq), repeat)),
+        "compute_class_clinic_counts": summarize(timed(lambda: compute_class_clinic_counts(aq), repeat)),
+    }
+
+
+def bench_batch(sizes, repeat: int) -> dict:
+    import numpy as np
+
+    from aqeq.scoring import score_batch
+
+    rng = np.random.default_rng(0)
+    out = {}
+    for n in sizes:
+        aq = rng.integers(1, 5, size=(n, AQ_N_ITEMS), dtype=np.int8)
+        eq = rng.integers(1, 5, size=(n, EQ_N_ITEMS), dtype=np.int8)
+        out[str(n)] = summarize(timed(lambda: score_batch(aq, eq), repeat), ops_per_sample=n)
+    return out
+
+
+def bench_storage(sizes, repeat: int) -> dict:
+    from aqeq.scoring import response_summary
+    from aqeq.storage import open_store
+
+    out = {}
+    for backend in ("file", "sqlite"):
+        for n in sizes:
+            tmp = tempfile.mkdtemp(prefix="aqeq-bench-")
+            try:
+                url = os.path.join(tmp, "data") if backend == "file" else "sqlite:" + os.path.join(tmp, "data.db")
+                store = open_store(url)
+                rng = random.Random(n)
+                store.save_many(
+                    (f"B{i:08X}", synthetic_payload(rng, f"B{i:08X}")) for i in range(n)
+                )
+                payload = synthetic_payload(rng, "")
+                codes = iter(range(n, n + repeat))
+
+                def round_trip():
+                    code = f"B{next(codes):08X}"
+                    payload["patient_code"] = code
+                    store.save(code, payload, summary=response_summary(payload))
+                    store.load(code)
+
+                out[f"{backend}/{n}"] = summarize(timed(round_trip, repeat))
+                store.close()
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+def bench_writers(thread_counts, per_thread: int) -> dict:
+    """Débit global (ops/s, horloge murale) de save concurrents."""
+    from aqeq.storage import open_store
+
+    out = {}
+    for backend in ("file", "sqlite"):
+        for group_commit in (False, True):
+            for threads in thread_counts:
+                tmp = tempfile.mkdtemp(prefix="aqeq-bench-")
+                try:
+                    url = os.path.join(tmp, "data") if backend == "file" else "sqlite:" + os.path.join(tmp, "data.db")
+                    store = open_store(url, group_commit=group_commit)
+                    samples = [[] for _ in range(threads)]
+                    start = threading.Barrier(threads + 1)
+
+                    def writer(t):
+                        rng = random.Random(t)
+                        payloads = [synthetic_payload(rng, f"W{t:02d}{i:06d}") for i in range(per_thread)]
+                        start.wait()
+                        for payload in payloads:
+                            t0 = time.perf_counter()
+                            store.save(payload["patient_code"], payload, exclusive=True)
+                            samples[t].append(time.perf_counter() - t0)
+
+                    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+                    for w in workers:
+                        w.start()
+                    start.wait()
+                    t0 = time.perf_counter()
+                    for w in workers:
+                        w.join()
+                    wall = time.perf_counter() - t0
+
+                    result = summarize([x for per in samples for x in per])
+                    result["ops_per_s"] = round(threads * per_thread / wall, 2)
+                    mode = "group" if group_commit else "single"
+                    out[f"{backend}/{mode}/{threads}"] = result
+                    store.close()
+                finally:
+                    shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+def bench_rerun(repeat: int) -> dict:
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"skipped": "streamlit non installé"}
+
+    tmp = tempfile.mkdtemp(prefix="aqeq-bench-")
+    cwd = os.getcwd()
+    saved_store = os.environ.get("AQEQ_STORE")
+    os.environ["AQEQ_STORE"] = os.path.join(tmp, "data")
+    try:
+        os.chdir(tmp)
+        out = {}
+
+        at = AppTest.from_file(APP_PATH, default_timeout=60)
+        at.run()
+        out["respondent_first_page"] = summarize(timed(at.run, repeat))
+
+        at = AppTest.from_file(APP_PATH, default_timeout=60)
+        at.run()
+        at.sidebar.radio[0].set_value("Je suis le praticien").run()
+        out["practitioner_page"] = summarize(timed(at.run, repeat))
+        return out
+    finally:
+        os.chdir(cwd)
+        if saved_store is None:
+            os.environ.pop("AQEQ_STORE", None)
+        else:
+            os.environ["AQEQ_STORE"] = saved_store
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# =========================================================
+# COMPARAISON
+# =========================================================
+
+def _throughputs(results: dict, prefix: str = ""):
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        if "ops_per_s" in value:
+            yield prefix + key, value["ops_per_s"]
+        else:
+            yield from _throughputs(value, f"{prefix}{key}.")
+
+
+def best_of(runs: list) -> dict:
+    """
+    Fusionne plusieurs exécutions : pour chaque mesure, celle du meilleur
+    débit. Moins sensible qu'une exécution isolée aux ralentissements
+    passagers de la machine (disque partagé, autre charge).
+    """
+    first, *others = runs
+    out = {}
+    for key, value in first.items():
+        if isinstance(value, dict) and "ops_per_s" in value:
+            out[key] = max([value] + [r[key] for r in others if key in r], key=lambda v: v["ops_per_s"] or 0)
+        elif isinstance(value, dict):
+            out[key] = best_of([value] + [r[key] for r in others if key in r])
+        else:
+            out[key] = value
+    return out
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Mesures dont le débit a baissé de plus de `threshold` (fraction)."""
+    old = dict(_throughputs(baseline.get("results", {})))
+    regressions = []
+    for name, ops in _throughputs(current.get("results", {})):
+        before = old.get(name)
+        if before and ops is not None and ops < before * (1 - threshold):
+            regressions.append({"name": name, "before": before, "after": ops, "ratio": round(ops / before, 3)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m aqeq.bench")
+    parser.add_argument("-o", "--output", help="fichier JSON de résultats (défaut : stdout)")
+    parser.add_argument("--quick", action="store_true", help="tailles réduites, pour la CI")
+    parser.add_argument("--sections", default="single,batch,storage,writers,rerun")
+    parser.add_argument("--batch-sizes", help="ex. 1000,10000,100000,1000000")
+    parser.add_argument("--store-sizes", help="ex. 100,1000,10000")
+    parser.add_argument("--writer-threads", help="ex. 1,4,16")
+    parser.add_argument("--repeat", type=int, help="répétitions par mesure")
+    parser.add_argument("--runs", type=int,
+                        help="exécutions complètes, meilleur débit retenu (défaut : 1, 3 avec --check)")
+    parser.add_argument("--compare", help="fichier JSON de référence")
+    parser.add_argument("--threshold", type=float, help="baisse tolérée (défaut : 0.2, 0.5 avec --check)")
+    parser.add_argument("--check", action="store_true",
+                        help="--quick, comparé à la référence locale benchmarks/baseline-quick.json")
+    args = parser.parse_args(argv)
+    if args.check:
+        args.quick = True
+        args.compare = args.compare or BASELINE_PATH
+        args.runs = args.runs or 3
+        if args.threshold is None:
+            args.threshold = 0.5
+    if args.threshold is None:
+        args.threshold = 0.2
+
+    def sizes(value, default):
+        return [int(x) for x in value.split(",")] if value else default
+
+    repeat = args.repeat or (20 if args.quick else 200)
+    batch_sizes = sizes(args.batch_sizes, [1000, 10000] if args.quick else [1000, 10000, 100000, 1000000])
+    store_sizes = sizes(args.store_sizes, [100, 1000] if args.quick else [100, 1000, 10000])
+    writer_threads = sizes(args.writer_threads, [1, 4] if args.quick else [1, 4, 16])
+    sections = set(args.sections.split(","))
+
+    from aqeq.scoring import SCORING_RULES_VERSION
+
+    def run_once() -> dict:
+        results = {}
+        if "single" in sections:
+            results["single"] = bench_single(repeat * 10)
+        if "batch" in sections:
+            results["batch"] = bench_batch(batch_sizes, max(3, repeat // 20))
+        if "storage" in sections:
+            results["storage"] = bench_storage(store_sizes, repeat)
+        if "writers" in sections:
+            results["writers"] = bench_writers(writer_threads, repeat)
+        if "rerun" in sections:
+            results["rerun"] = bench_rerun(max(5, repeat // 10))
+        return results
+
+    runs = max(1, args.runs or 1)
+    results = best_of([run_once() for _ in range(runs)])
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scoring_rules_version": SCORING_RULES_VERSION,
+            "runs": runs,
+        },
+        "results": results,
+    }
+
+    status = 0
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        theirs = baseline.get("meta", {})
+        other_host = [f"{k} = {theirs.get(k)!r}" for k in HOST_FIELDS if theirs.get(k) != report["meta"][k]]
+        if args.check and other_host:
+            print(
+                f"Référence {args.compare} produite sur une autre machine ({', '.join(other_host)}) : "
+                "comparaison ignorée. La régénérer ici avec --quick --runs 3 -o <référence>.",
+                file=sys.stderr,
+            )
+            baseline = None
+    if baseline is not None:
+        report["regressions"] = compare(baseline, report, args.threshold)
+        for r in report["regressions"]:
+            print(f"RÉGRESSION {r['name']} : {r['before']} → {r['after']} ops/s", file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
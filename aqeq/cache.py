@@ -0,0 +1,196 @@
+"""
+Cache LRU en mémoire des enregistrements relus, partagé par toutes les
+sessions d'un processus.
+
+Chaque entrée porte la « version » de l'enregistrement au moment de sa
+lecture (`store.version(code)` : mtime et taille d'un fichier, position
+dans un segment, numéro de séquence SQLite). Une entrée dont la version ne
+correspond plus est ignorée : une écriture faite par un autre processus
+est donc vue sans invalidation explicite. Dans le même processus,
+`invalidate()` après un enregistrement libère l'entrée tout de suite.
+
+Avec plusieurs processus (voir aqeq.serve), un `SharedCache` SQLite peut
+servir de second niveau commun : un enregistrement relu et coté par un
+processus ne l'est plus par les autres.
+
+Les succès, échecs et évictions sont comptés dans aqeq.metrics
+(`cache_hits_total{cache=...}`, etc.) et par `stats()`.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from aqeq import metrics
+from aqeq.db import LocalSQLite
+
+
+class RecordCache:
+    """LRU borné à `maxsize` entrées, validé par version (voir module)."""
+
+    def __init__(self, maxsize: int = 1024, name: str = "responses", shared=None):
+        self.maxsize = maxsize
+        self.name = name
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, version):
+        """Valeur en cache pour `key` à cette `version`, sinon None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == version:
+                self._data.move_to_end(key)
+                self.hits += 1
+                value = entry[1]
+            else:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                value = None
+        metrics.inc("cache_hits_total" if value is not None else "cache_misses_total", cache=self.name)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key, version)
+            if value is not None:
+                self._remember(key, version, value)
+        return value
+
+    def put(self, key, version, value):
+        """
+        Mémorise `value`, lue à `version`. La version doit avoir été relevée
+        avant la lecture : une écriture concurrente rend alors l'entrée
+        périmée au lieu de l'associer à une valeur ancienne.
+        """
+        self._remember(key, version, value)
+        if self.shared is not None:
+            self.shared.put(key, version, value)
+
+    def _remember(self, key, version, value):
+        if self.maxsize <= 0:
+            return
+        evicted = 0
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            metrics.inc("cache_evictions_total", evicted, cache=self.name)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.shared is not None:
+            self.shared.invalidate(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+# =========================================================
+# CACHE PARTAGÉ ENTRE PROCESSUS
+# =========================================================
+
+_SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    key     TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    value   TEXT NOT NULL,
+    stored  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_{table}_stored ON {table} (stored);
+"""
+
+
+class SharedCache:
+    """
+    Cache commun à plusieurs processus dans un fichier SQLite (mode WAL),
+    validé par version comme `RecordCache`. Borné à `maxsize` entrées : les
+    plus anciennement écrites sont retirées (une lecture n'écrit rien, pour
+    ne pas sérialiser les lecteurs des différents processus).
+
+    `dumps` / `loads` convertissent les valeurs en texte (JSON par défaut).
+    Plusieurs caches peuvent partager un fichier, chacun dans sa `table`
+    (et avec sa propre borne).
+    """
+
+    # Une purge toutes les PRUNE_EVERY écritures de ce processus.
+    PRUNE_EVERY = 100
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = 100_000,
+        name: str = "shared",
+        dumps=json.dumps,
+        loads=json.loads,
+        table: str = "cache_entries",
+    ):
+        if not table.isidentifier():
+            raise ValueError(f"Nom de table invalide : {table!r}")
+        self.path = path
+        self.maxsize = maxsize
+        self.name = name
+        self.table = table
+        self._dumps = dumps
+        self._loads = loads
+        self._db = LocalSQLite(path, _SHARED_SCHEMA.format(table=table))
+        self._puts = 0
+
+    def get(self, key, version):
+        row = self._db.conn().execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND version = ?",
+            (key, json.dumps(version)),
+        ).fetchone()
+        metrics.inc("cache_hits_total" if row is not None else "cache_misses_total", cache=self.name)
+        return None if row is None else self._loads(row[0])
+
+    def put(self, key, version, value):
+        conn = self._db.conn()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                (key, json.dumps(version), self._dumps(value), time.time()),
+            )
+        self._puts += 1
+        if self._puts % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def invalidate(self, key):
+        conn = self._db.conn()
+        with conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def prune(self) -> int:
+        """Retire les entrées au-delà de `maxsize` ; renvoie leur nombre."""
+        conn = self._db.conn()
+        with conn:
+            n = conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f" SELECT key FROM {self.table} ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            ).rowcount
+        if n:
+            metrics.inc("cache_evictions_total", n, cache=self.name)
+        return n
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,360 @@
+"""
+Outil en ligne de commande (sans Streamlit) :
+
+    python -m aqeq score  [--store data_aq_eq | --input brut.csv] -o scores.csv
+    python -m aqeq import brut.jsonl [--store sqlite:data_aq_eq.db] [--overwrite]
+    python -m aqeq report [CODE ...] [--practitioner P1 | --all] -o rapports.zip
+    python -m aqeq export -o export.parquet [--state export_state.json]
+    python -m aqeq check [--store data_aq_eq] [--quarantine] [-o rapport.json]
+    python -m aqeq rescore [--store data_aq_eq]
+
+Les enregistrements défilent dans le pipeline de aqeq.pipeline : lecture
+par paquets de `--chunk-size`, cotation par lot (score_batch) dans un pool
+de processus, écriture au fil de l'eau en CSV, JSONL ou Parquet. Seuls
+quelques paquets sont en mémoire à un instant donné, quelle que soit la
+taille du jeu de données.
+
+Format des fichiers bruts (CSV ou JSONL) : une ligne par répondant avec
+les colonnes patient_code (optionnel), patient_id, sex, dob, test_date,
+practitioner_code, aq_1 … aq_50, eq_1 … eq_60 (réponses 1–4) et
+prereq_E … prereq_I (Oui/Non, 1/0, true/false). En JSONL, les payloads
+au format de l'app (aq_answers / eq_answers / prereq) sont aussi acceptés.
+L'import n'enregistre que des réponses complètes et dans la plage : la
+première ligne invalide arrête l'import, avec son numéro et le problème.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+from aqeq.items import AQ_N_ITEMS, EQ_N_ITEMS, PREREQ_KEYS
+from aqeq.integrity import validate_payload
+from aqeq.paths import default_store
+from aqeq.pipeline import (
+    ANSWER_FIELDS,
+    IDENTITY_FIELDS,
+    SCORE_FIELDS,
+    chunked,
+    run_pipeline,
+    score_rows,
+    worker_store,
+    write_rows,
+)
+
+_TRUE = {"1", "true", "oui", "yes", "o", "y"}
+
+
+# =========================================================
+# LECTURE
+# =========================================================
+
+def _flag(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE
+
+
+def payload_from_flat(row: dict) -> dict:
+    """
+    Payload au format de l'app à partir d'une ligne « à plat ». Lève
+    ValueError (avec le nom de la colonne) pour une réponse non entière.
+    """
+    if "aq_answers" in row:
+        return row
+
+    def answers(prefix, n_items):
+        out = {}
+        for i in range(1, n_items + 1):
+            value = row.get(f"{prefix}_{i}")
+            if value not in (None, ""):
+                try:
+                    out[i] = int(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"colonne {prefix}_{i} : réponse non entière {value!r}") from None
+        return out
+
+    payload = {f: str(row.get(f, "") or "") for f in IDENTITY_FIELDS}
+    payload["aq_answers"] = answers("aq", AQ_N_ITEMS)
+    payload["eq_answers"] = answers("eq", EQ_N_ITEMS)
+    payload["prereq"] = {k: _flag(row.get(f"prereq_{k}", False)) for k in PREREQ_KEYS}
+    return payload
+
+
+def numbered_rows(path: str):
+    """Itère sur (numéro de ligne, ligne brute) d'un fichier CSV ou JSONL."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError as exc:
+                    raise ValueError(f"ligne {number} : JSON invalide ({exc})") from None
+
+
+def iter_raw_rows(path: str):
+    """Itère sur les lignes brutes (dict) d'un fichier CSV ou JSONL."""
+    for _, row in numbered_rows(path):
+        yield row
+
+
+def numbered_payload(number: int, row: dict) -> dict:
+    """`payload_from_flat`, le numéro de ligne ajouté au message d'erreur."""
+    try:
+        return payload_from_flat(row)
+    except ValueError as exc:
+        raise ValueError(f"ligne {number}, {exc}") from None
+
+
+def read_raw(path: str):
+    """
+    Itère sur les payloads d'un fichier CSV ou JSONL. Lève ValueError (avec
+    le numéro de ligne) pour une réponse incomplète ou hors plage, ou tout
+    autre problème relevé par `validate_payload`.
+    """
+    for number, row in numbered_rows(path):
+        payload = numbered_payload(number, row)
+        problems = validate_payload(payload)
+        if problems:
+            raise ValueError(f"ligne {number}, " + " ; ".join(problems))
+        yield payload
+
+
+# =========================================================
+# COTATION (exécutée dans les processus du pool)
+# =========================================================
+
+def _score_codes(codes, with_answers):
+    payloads = [p for p in (worker_store().load(c) for c in codes) if p is not None]
+    return score_rows(payloads, with_answers)
+
+
+def _score_raw_rows(rows, with_answers):
+    """`rows` : paires (numéro de ligne, ligne brute)."""
+    return score_rows([numbered_payload(n, r) for n, r in rows], with_answers)
+
+
+# =========================================================
+# COMMANDES
+# =========================================================
+
+def cmd_score(args) -> int:
+    fields = SCORE_FIELDS + (ANSWER_FIELDS if args.with_answers else [])
+    if args.input:
+        chunks = chunked(numbered_rows(args.input), args.chunk_size)
+        rows = run_pipeline(chunks, _score_raw_rows, args.with_answers, args.workers)
+    else:
+        from aqeq.storage import open_store
+
+        store = open_store(args.store)
+        chunks = chunked(store.codes(), args.chunk_size)
+        rows = run_pipeline(chunks, _score_codes, args.with_answers, args.workers, args.store)
+    try:
+        n = write_rows(rows, args.output, fields, args.format)
+    except ValueError as exc:
+        raise SystemExit(f"{args.input or args.store} : {exc}")
+    print(f"{n} répondants cotés → {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_import(args) -> int:
+    from aqeq.scoring import answers_from_payload, compute_derived, response_summary
+    from aqeq.storage import CodeExistsError, open_store, save_new
+
+    store = open_store(args.store)
+    n = 0
+    try:
+        for payload in read_raw(args.input):
+            payload["derived"] = compute_derived(*answers_from_payload(payload))
+            if payload.get("patient_code"):
+                store.save(payload["patient_code"], payload, summary=response_summary(payload),
+                           exclusive=not args.overwrite)
+            else:
+                save_new(store, {k: v for k, v in payload.items() if k != "patient_code"})
+            n += 1
+    except CodeExistsError as exc:
+        raise SystemExit(f"{exc} (--overwrite pour remplacer) ; {n} réponses importées avant l'arrêt.")
+    except ValueError as exc:
+        raise SystemExit(f"{args.input}, {exc} ; {n} réponses importées avant l'arrêt.")
+    finally:
+        store.close()
+    print(f"{n} réponses importées dans {store!r}", file=sys.stderr)
+    return 0
+
+
+def cmd_rescore(args) -> int:
+    from aqeq.scoring import SCORING_RULES_VERSION, answers_from_payload, compute_derived, derived_is_current
+    from aqeq.storage import open_store
+
+    store = open_store(args.store)
+    unreadable = []
+
+    def stale():
+        # Codes relevés avant d'écrire : les stores ne garantissent pas un
+        # parcours stable pendant les écritures.
+        for code in list(store.codes()):
+            payload = store.load(code)
+            if payload is None or derived_is_current(payload.get("derived")):
+                continue
+            try:
+                derived = compute_derived(*answers_from_payload(payload))
+            except (KeyError, TypeError, ValueError):
+                unreadable.append(code)
+                continue
+            yield code, {**payload, "derived": derived}
+
+    try:
+        n = store.save_many(stale(), batch_size=args.batch_size, with_summaries=True)
+    finally:
+        store.close()
+    for code in unreadable:
+        print(f"{code} : réponses illisibles, non recotées (voir python -m aqeq check)", file=sys.stderr)
+    print(f"{n} réponses recotées ({SCORING_RULES_VERSION}) dans {store!r}", file=sys.stderr)
+    return 1 if unreadable else 0
+
+
+def cmd_report(args) -> int:
+    from aqeq.reports import render_report, write_archive
+    from aqeq.storage import open_store
+
+    fmt = args.format or ("pdf" if args.output.endswith(".pdf") else "html")
+    store = open_store(args.store)
+    try:
+        if args.all:
+            codes = store.codes()
+        elif args.practitioner is not None:
+            codes = store.index.practitioner_codes(args.practitioner)
+        else:
+            codes = [c.strip().upper() for c in args.codes]
+
+        if not args.output.endswith(".zip"):
+            # Un seul rapport, écrit tel quel.
+            if len(args.codes) != 1 or args.all or args.practitioner is not None:
+                raise SystemExit("Plusieurs rapports : la sortie doit être une archive .zip.")
+            payload = store.load(codes[0])
+            if payload is None:
+                raise SystemExit(f"Code patient introuvable : {codes[0]}")
+            content = render_report(payload, fmt)
+            with open(args.output, "wb") as f:
+                f.write(content)
+            n = 1
+        else:
+            n = write_archive(args.output, codes, args.store, fmt, args.workers, args.chunk_size)
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+    finally:
+        store.close()
+    print(f"{n} rapports {fmt.upper()} → {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_export(args) -> int:
+    from aqeq.export import export
+
+    salt = args.salt or os.environ.get("AQEQ_EXPORT_SALT", "")
+    if not salt:
+        raise SystemExit("L'export nécessite un sel secret : --salt ou AQEQ_EXPORT_SALT.")
+    try:
+        n = export(args.store, args.output, salt.encode("utf-8"), args.state, args.format,
+                   args.workers, args.chunk_size)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    print(f"{n} répondants exportés (désidentifiés) → {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_check(args) -> int:
+    from aqeq.integrity import check_store
+
+    try:
+        report = check_store(args.store, args.quarantine, args.workers, args.chunk_size, args.full)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    for bad in report["invalid"]:
+        print(f"{bad['path']} : " + " ; ".join(bad["problems"]), file=sys.stderr)
+    for c in report["collisions"]:
+        print(f"collision {', '.join(c['codes'])} : {c['problem']} ({', '.join(c['paths'])})", file=sys.stderr)
+    for codes in report["duplicates"]:
+        print(f"doublon : {', '.join(codes)}", file=sys.stderr)
+    print(
+        f"{report['records']} enregistrements ({report['checked']} relus) : {len(report['invalid'])} invalides, "
+        f"{len(report['collisions'])} collisions, {len(report['duplicates'])} doublons, "
+        f"{len(report['quarantined'])} mis en quarantaine",
+        file=sys.stderr,
+    )
+    return 1 if report["invalid"] or report["collisions"] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m aqeq")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("score", help="coter un store ou un fichier brut et exporter les scores")
+    src = p.add_mutually_exclusive_group()
+    src.add_argument("--store", default=default_store(),
+                     help="store source (défaut : $AQEQ_STORE ou data_aq_eq)")
+    src.add_argument("--input", help="fichier brut CSV ou JSONL")
+    p.add_argument("-o", "--output", required=True, help="fichier de sortie (.csv, .jsonl, .parquet)")
+    p.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="forcer le format de sortie")
+    p.add_argument("--with-answers", action="store_true", help="inclure les réponses item par item")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunk-size", type=int, default=2000)
+    p.set_defaults(func=cmd_score)
+
+    p = sub.add_parser("import", help="importer un fichier brut dans un store")
+    p.add_argument("input", help="fichier brut CSV ou JSONL")
+    p.add_argument("--store", default=default_store())
+    p.add_argument("--overwrite", action="store_true", help="remplacer les codes patients déjà présents")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("report", help="rapports praticien HTML/PDF, un code ou un lot (zip)")
+    p.add_argument("codes", nargs="*", help="codes patients")
+    sel = p.add_mutually_exclusive_group()
+    sel.add_argument("--practitioner", help="tous les codes d'un praticien (via l'index)")
+    sel.add_argument("--all", action="store_true", help="tous les codes du store")
+    p.add_argument("--store", default=default_store())
+    p.add_argument("-o", "--output", required=True, help="fichier .html, .pdf ou archive .zip")
+    p.add_argument("--format", choices=["html", "pdf"], help="format des rapports (défaut : d'après -o, sinon html)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunk-size", type=int, default=50)
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("export", help="export de recherche désidentifié, complet ou incrémental")
+    p.add_argument("--store", default=default_store())
+    p.add_argument("-o", "--output", required=True, help="fichier de sortie (.parquet, .csv, .jsonl)")
+    p.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="forcer le format de sortie")
+    p.add_argument("--state", help="fichier d'état : n'exporter que les réponses écrites depuis le dernier export")
+    p.add_argument("--salt", help="sel des pseudonymes (défaut : $AQEQ_EXPORT_SALT)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunk-size", type=int, default=2000)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("check", help="contrôle d'intégrité (incrémental) des réponses d'un store")
+    p.add_argument("--store", default=default_store())
+    p.add_argument("-o", "--output", help="rapport JSON")
+    p.add_argument("--quarantine", action="store_true", help="déplacer les fichiers invalides dans _quarantine/ et les retirer des index (FileStore seulement)")
+    p.add_argument("--full", action="store_true", help="tout relire, sans tenir compte du manifeste")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser("rescore", help="réenregistrer les sections \"derived\" d'une autre version des règles")
+    p.add_argument("--store", default=default_store())
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=cmd_rescore)
+
+    args = parser.parse_args(argv)
+    if args.func is cmd_report and not (args.codes or args.all or args.practitioner is not None):
+        parser.error("report : indiquer des codes, --practitioner ou --all")
+    return args.func(args)
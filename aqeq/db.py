@@ -0,0 +1,60 @@
+"""Connexions SQLite partagées par les différents stockages."""
+
+import os
+import sqlite3
+import threading
+
+
+class LocalSQLite:
+    """
+    Une connexion SQLite par thread vers un même fichier (les sessions
+    Streamlit tournent dans des threads différents). Mode WAL : les
+    lecteurs ne bloquent pas l'écrivain. Les requêtes paramétrées sont
+    préparées une seule fois par connexion (cache d'instructions).
+
+    Les connexions ouvertes sont recensées par thread : `close()` les ferme
+    toutes, et celles des threads terminés sont fermées à l'ouverture
+    suivante. Plusieurs tables (store, index) peuvent partager une même
+    instance, donc les mêmes connexions et les mêmes transactions.
+    """
+
+    def __init__(self, path: str, schema: str = ""):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = {}
+        if schema:
+            self.conn().executescript(schema)
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._conns.get(threading.get_ident()) is not conn:
+            # Chaque connexion ne sert qu'à son thread ; check_same_thread
+            # est levé pour que `close()` puisse la fermer depuis un autre.
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=256, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            with self._lock:
+                self._reap()
+                # Identifiant repris d'un thread terminé : son ancienne connexion.
+                stale = self._conns.pop(threading.get_ident(), None)
+                self._conns[threading.get_ident()] = conn
+            if stale is not None:
+                stale.close()
+            self._local.conn = conn
+        return conn
+
+    def _reap(self):
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._conns if i not in alive]:
+            self._conns.pop(ident).close()
+
+    def close(self):
+        """Ferme les connexions de tous les threads."""
+        with self._lock:
+            conns, self._conns = list(self._conns.values()), {}
+        for conn in conns:
+            conn.close()
+        self._local.conn = None
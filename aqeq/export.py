@@ -0,0 +1,121 @@
+"""
+Export de recherche désidentifié : matrices d'items AQ/EQ et scores.
+
+    AQEQ_EXPORT_SALT=... python -m aqeq export -o export.parquet [--state export_state.json]
+
+(sortie Parquet : pip install -r requirements-export.txt)
+
+Chaque ligne est anonymisée avant d'être écrite :
+
+    patient_code       → pseudonym (HMAC-SHA256 salé, stable d'un export à l'autre)
+    practitioner_code  → practitioner_hash (idem)
+    patient_id         supprimé
+    dob + test_date    → age_band (tranche d'âge à la passation, voir aqeq.norms)
+    test_date          → test_month (AAAA-MM)
+
+Le sel (AQEQ_EXPORT_SALT ou --salt) reste chez le responsable des données :
+sans lui, les pseudonymes ne peuvent pas être recalculés à partir des codes.
+
+Les enregistrements défilent par paquets dans le pipeline de aqeq.pipeline
+(mémoire bornée, pool de processus). Avec `--state`, l'export est
+incrémental : le fichier d'état garde la marque de modification du store
+atteinte au dernier export (`change_mark()`), et seuls les codes écrits
+depuis sont relus. Sans fichier d'état existant, tout le store est exporté.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from aqeq.pipeline import ANSWER_FIELDS, IDENTITY_FIELDS, SCORE_FIELDS, chunked, run_pipeline, write_rows
+
+PSEUDONYM_FIELDS = ["pseudonym", "practitioner_hash", "sex", "age_band", "test_month"]
+
+EXPORT_FIELDS = (
+    PSEUDONYM_FIELDS
+    + [f for f in SCORE_FIELDS if f not in IDENTITY_FIELDS]
+    + ANSWER_FIELDS
+)
+
+
+def pseudonym(value: str, salt: bytes) -> str:
+    """Empreinte HMAC-SHA256 tronquée (16 hex) ; vide si `value` est vide."""
+    if not value:
+        return ""
+    return hmac.new(salt, value.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+def anonymize(row: dict, salt: bytes) -> dict:
+    """Ligne de score_rows(with_answers=True) → ligne désidentifiée."""
+    from aqeq.norms import age_band
+
+    test_date = row.get("test_date") or ""
+    out = {
+        "pseudonym": pseudonym(row.get("patient_code") or "", salt),
+        "practitioner_hash": pseudonym(row.get("practitioner_code") or "", salt),
+        "sex": row.get("sex") or "",
+        "age_band": age_band(row.get("dob"), test_date),
+        "test_month": test_date[:7],
+    }
+    for f in EXPORT_FIELDS[len(PSEUDONYM_FIELDS):]:
+        out[f] = row.get(f)
+    return out
+
+
+def _export_codes(codes, salt):
+    """Exécuté dans les processus du pool : lignes désidentifiées d'un paquet."""
+    from aqeq.pipeline import score_rows, worker_store
+
+    store = worker_store()
+    payloads = [p for p in (store.load(c) for c in codes) if p is not None]
+    return [anonymize(row, salt) for row in score_rows(payloads, with_answers=True)]
+
+
+# =========================================================
+# ÉTAT DES EXPORTS INCRÉMENTAUX
+# =========================================================
+
+def read_state(path: str):
+    """État du dernier export ({store, mark, exported_at}) ou None."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_state(path: str, store_url: str, mark: int):
+    from aqeq.atomic import atomic_write
+
+    state = {"store": store_url, "mark": mark, "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    atomic_write(path, json.dumps(state, indent=2).encode("utf-8"))
+
+
+def export(store_url: str, output: str, salt: bytes, state_path: str = None, fmt: str = None,
+           workers: int = 1, chunk_size: int = 2000) -> int:
+    """
+    Exporte le store `store_url` dans `output` (voir module) ; renvoie le
+    nombre de lignes. La marque n'est enregistrée qu'une fois le fichier
+    écrit : un export interrompu est simplement refait au passage suivant.
+    """
+    from aqeq.storage import open_store
+
+    state = read_state(state_path)
+    if state is not None and state.get("store") != store_url:
+        raise ValueError(f"Fichier d'état {state_path} établi pour un autre store : {state.get('store')}")
+    since = state["mark"] if state is not None else None
+
+    store = open_store(store_url)
+    try:
+        # Marque prise avant la lecture : une écriture concurrente sera
+        # reprise au prochain export plutôt que perdue.
+        mark = store.change_mark()
+        codes = store.codes_changed(since, mark)
+        rows = run_pipeline(chunked(codes, chunk_size), _export_codes, salt, workers, store_url)
+        n = write_rows(rows, output, EXPORT_FIELDS, fmt)
+    finally:
+        store.close()
+    if state_path:
+        write_state(state_path, store_url, mark)
+    return n
@@ -0,0 +1,130 @@
+"""
+Index des résumés de scores.
+
+À chaque enregistrement, l'app calcule un résumé (scores AQ/EQ, statut
+CLASS CLINIC) qui est écrit ici. Le tableau de bord praticien lit ensuite
+des pages de cet index par pagination « keyset » (curseur = dernière ligne
+vue) : le coût d'une page dépend de sa taille, pas du nombre de réponses
+stockées.
+"""
+
+from aqeq.db import LocalSQLite
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    patient_code      TEXT PRIMARY KEY,
+    practitioner_code TEXT NOT NULL DEFAULT '',
+    patient_id        TEXT NOT NULL DEFAULT '',
+    sex               TEXT NOT NULL DEFAULT '',
+    test_date         TEXT NOT NULL DEFAULT '',
+    aq_score          INTEGER NOT NULL,
+    eq_score          INTEGER NOT NULL,
+    class_total       INTEGER NOT NULL,
+    class_core_ok     INTEGER NOT NULL,
+    prereq_ok         INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_page
+    ON summaries (practitioner_code, test_date DESC, patient_code DESC);
+"""
+
+# Champs d'un résumé, dans l'ordre des colonnes.
+SUMMARY_FIELDS = (
+    "patient_code",
+    "practitioner_code",
+    "patient_id",
+    "sex",
+    "test_date",
+    "aq_score",
+    "eq_score",
+    "class_total",
+    "class_core_ok",
+    "prereq_ok",
+)
+
+_UPSERT = (
+    f"INSERT OR REPLACE INTO summaries ({', '.join(SUMMARY_FIELDS)}) "
+    f"VALUES ({', '.join('?' for _ in SUMMARY_FIELDS)})"
+)
+
+_PAGE_FIRST = (
+    f"SELECT {', '.join(SUMMARY_FIELDS)} FROM summaries "
+    "WHERE practitioner_code = ? "
+    "ORDER BY test_date DESC, patient_code DESC LIMIT ?"
+)
+
+_PAGE_AFTER = (
+    f"SELECT {', '.join(SUMMARY_FIELDS)} FROM summaries "
+    "WHERE practitioner_code = ? AND (test_date, patient_code) < (?, ?) "
+    "ORDER BY test_date DESC, patient_code DESC LIMIT ?"
+)
+
+
+class SummaryIndex:
+    """Table `summaries` dans un fichier SQLite."""
+
+    def __init__(self, path: str, db: LocalSQLite = None):
+        """`db` : connexions partagées avec le store (même fichier), sinon propres."""
+        self.path = path
+        self._db = db or LocalSQLite(path)
+        self._db.conn().executescript(_SCHEMA)
+
+    def upsert(self, summary: dict):
+        conn = self._db.conn()
+        with conn:
+            conn.execute(_UPSERT, tuple(summary[f] for f in SUMMARY_FIELDS))
+
+    def upsert_many(self, summaries):
+        conn = self._db.conn()
+        with conn:
+            self.upsert_in(conn, summaries)
+
+    def upsert_in(self, conn, summaries):
+        """Comme `upsert_many`, dans la transaction en cours de `conn`."""
+        conn.executemany(_UPSERT, (tuple(s[f] for f in SUMMARY_FIELDS) for s in summaries))
+
+    def remove_many(self, codes):
+        conn = self._db.conn()
+        with conn:
+            conn.executemany("DELETE FROM summaries WHERE patient_code = ?", ((c,) for c in codes))
+
+    def codes(self) -> set:
+        return {code for (code,) in self._db.conn().execute("SELECT patient_code FROM summaries")}
+
+    def practitioner_codes(self, practitioner_code: str) -> list:
+        """Codes patients d'un praticien, du plus récent au plus ancien."""
+        return [
+            code
+            for (code,) in self._db.conn().execute(
+                "SELECT patient_code FROM summaries WHERE practitioner_code = ? "
+                "ORDER BY test_date DESC, patient_code DESC",
+                (practitioner_code,),
+            )
+        ]
+
+    def count(self, practitioner_code: str) -> int:
+        return self._db.conn().execute(
+            "SELECT COUNT(*) FROM summaries WHERE practitioner_code = ?",
+            (practitioner_code,),
+        ).fetchone()[0]
+
+    def page(self, practitioner_code: str, after=None, limit: int = 25):
+        """
+        Renvoie (lignes, curseur_suivant). `after` est le curseur renvoyé par
+        l'appel précédent (None pour la première page) ; le curseur suivant
+        vaut None quand il n'y a plus rien après.
+        """
+        conn = self._db.conn()
+        if after is None:
+            cur = conn.execute(_PAGE_FIRST, (practitioner_code, limit + 1))
+        else:
+            test_date, patient_code = after
+            cur = conn.execute(_PAGE_AFTER, (practitioner_code, test_date, patient_code, limit + 1))
+        rows = [dict(zip(SUMMARY_FIELDS, r)) for r in cur]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]["test_date"], rows[-1]["patient_code"])
+        return rows, next_cursor
+
+    def close(self):
+        self._db.close()
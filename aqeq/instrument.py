@@ -0,0 +1,173 @@
+"""
+Questionnaires décrits par des fichiers déclaratifs (aqeq/instruments/).
+
+Un fichier JSON par instrument, version et langue (ex. aq-50.fr.json) :
+
+    id, version, language, title
+    answers   : {"1": libellé, ...}           modalités de réponse
+    items     : {"1": libellé, ...}           énoncés, numérotés à partir de 1
+    keys      : {clé: [points pour 1, 2, ...]} barèmes de cotation
+    scoring   : {clé: [items]}                 items cotés avec chaque barème
+                                               (les autres valent 0 point)
+    subscales : {nom: [items]}
+    sections  : {code: {label, items, required}}  (CLASS CLINIC pour l'AQ)
+
+`load_instrument()` lit et compile chaque fichier une seule fois par
+processus (tables Python et masques binaires tout de suite, tables NumPy
+au premier calcul) : plusieurs instruments ou langues peuvent coexister
+dans un même serveur sans relecture par requête.
+"""
+
+import hashlib
+import json
+import os
+from functools import cached_property, lru_cache
+
+INSTRUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instruments")
+
+
+def _mask(items) -> int:
+    """Masque binaire : bit i - 1 pour l'item i."""
+    m = 0
+    for i in items:
+        m |= 1 << (i - 1)
+    return m
+
+
+class Instrument:
+    """Instrument compilé (voir module) ; ne pas construire directement."""
+
+    def __init__(self, spec: dict):
+        self.id = spec["id"]
+        self.version = str(spec["version"])
+        self.language = spec["language"]
+        self.title = spec.get("title", self.id)
+        # Empreinte du fichier : toute modification, même sans changement de
+        # `version`, change la version des règles de cotation (aqeq.scoring).
+        self.digest = hashlib.sha256(
+            json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:12]
+        self.answers = {int(k): v for k, v in spec["answers"].items()}
+        self.items = {int(k): v for k, v in spec["items"].items()}
+        self.n_items = len(self.items)
+        if sorted(self.items) != list(range(1, self.n_items + 1)):
+            raise ValueError(f"{self.key} : items non numérotés de 1 à {self.n_items}")
+
+        n_answers = len(self.answers)
+        keys = spec.get("keys", {})
+        scoring = {name: list(items) for name, items in spec.get("scoring", {}).items()}
+        # Points par item et par réponse ; colonne 0 = sans réponse.
+        points = [[0] * (n_answers + 1) for _ in range(self.n_items)]
+        for name, items in scoring.items():
+            if len(keys[name]) != n_answers:
+                raise ValueError(f"{self.key} : barème {name!r} de longueur {len(keys[name])}")
+            for i in items:
+                points[i - 1] = [0] + list(keys[name])
+        self.points = tuple(tuple(row) for row in points)
+        self.scoring = scoring
+
+        self.subscales = {name: list(items) for name, items in spec.get("subscales", {}).items()}
+        self.sections = {
+            code: {"label": sec["label"], "items": list(sec["items"]), "required": sec["required"]}
+            for code, sec in spec.get("sections", {}).items()
+        }
+
+        # Pour chaque (réponse, points > 0) : items qui rapportent ces points
+        # avec cette réponse (cotation sur la forme compacte, aqeq.packed).
+        self.point_masks = {}
+        for i, row in enumerate(self.points, start=1):
+            for resp, pts in enumerate(row):
+                if pts:
+                    self.point_masks[(resp, pts)] = self.point_masks.get((resp, pts), 0) | 1 << (i - 1)
+        self.subscale_masks = {name: _mask(items) for name, items in self.subscales.items()}
+        self.section_masks = {code: _mask(sec["items"]) for code, sec in self.sections.items()}
+
+    @property
+    def key(self) -> tuple:
+        return (self.id, self.version, self.language)
+
+    def __repr__(self):
+        return f"Instrument({self.id} v{self.version} {self.language})"
+
+    def item_points(self, item: int, resp) -> int:
+        if resp is None or not 1 <= item <= self.n_items:
+            return 0
+        row = self.points[item - 1]
+        return row[resp] if 0 <= resp < len(row) else 0
+
+    # -- tables NumPy (chargées au premier calcul) ------------------------
+
+    @cached_property
+    def points_table(self):
+        """Tableau n_items × (1 + nb réponses) : item, réponse → points."""
+        import numpy as np
+
+        return np.array(self.points, dtype=np.int16)
+
+    @cached_property
+    def subscale_matrix(self):
+        """Appartenance item × sous-échelle (ordre de `subscales`)."""
+        return self._membership([items for items in self.subscales.values()])
+
+    @cached_property
+    def section_matrix(self):
+        """Appartenance item × section (ordre de `sections`)."""
+        return self._membership([sec["items"] for sec in self.sections.values()])
+
+    @cached_property
+    def section_required(self):
+        import numpy as np
+
+        return np.array([sec["required"] for sec in self.sections.values()])
+
+    def _membership(self, groups):
+        import numpy as np
+
+        m = np.zeros((self.n_items, len(groups)), dtype=np.int16)
+        for j, items in enumerate(groups):
+            m[[i - 1 for i in items], j] = 1
+        return m
+
+
+# =========================================================
+# CATALOGUE
+# =========================================================
+
+@lru_cache(maxsize=None)
+def _catalog() -> dict:
+    """(id, version, langue) → définition lue, pour tout INSTRUMENTS_DIR."""
+    out = {}
+    for name in sorted(os.listdir(INSTRUMENTS_DIR)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(INSTRUMENTS_DIR, name), "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        out[(spec["id"], str(spec["version"]), spec["language"])] = spec
+    return out
+
+
+def available_instruments() -> list:
+    """Clés (id, version, langue) des instruments disponibles."""
+    return sorted(_catalog())
+
+
+def _version_key(version: str):
+    return tuple(int(p) if p.isdigit() else p for p in version.split("."))
+
+
+def load_instrument(instrument_id: str, version: str = None, language: str = "fr") -> Instrument:
+    """
+    Instrument compilé, gardé en mémoire pour la durée du processus.
+    Sans `version`, la plus récente disponible dans cette langue.
+    """
+    candidates = [k for k in _catalog() if k[0] == instrument_id and k[2] == language]
+    if version is not None:
+        candidates = [k for k in candidates if k[1] == str(version)]
+    if not candidates:
+        raise KeyError(f"Instrument introuvable : {instrument_id} v{version or '*'} ({language})")
+    return _compiled(max(candidates, key=lambda k: _version_key(k[1])))
+
+
+@lru_cache(maxsize=None)
+def _compiled(key: tuple) -> Instrument:
+    return Instrument(_catalog()[key])
@@ -0,0 +1,392 @@
+"""
+Contrôle d'intégrité des réponses enregistrées.
+
+    python -m aqeq check [--store data_aq_eq] [--quarantine] [-o rapport.json]
+
+Chaque enregistrement est validé par rapport aux instruments (aqeq.items) :
+contenu lisible, code patient conforme à la clé, réponses AQ/EQ complètes
+et dans la plage de réponses (ou forme compacte de la bonne taille),
+`prereq` objet de booléens. Sur l'ensemble du store, le contrôle signale
+aussi :
+
+  - les collisions : codes ne différant que par la casse (l'espace
+    praticien met les codes saisis en majuscules) et, dans un FileStore,
+    code présent dans plusieurs fichiers (à plat et dans AB/CD/ par
+    exemple) ou rangé dans un mauvais sous-répertoire (illisible par
+    `load`) ;
+  - les doublons : plusieurs codes portant exactement la même passation
+    (mêmes données, mêmes réponses).
+
+Dans un FileStore, chaque fichier <CODE>.json est lu directement (un JSON
+illisible est signalé, pas seulement sauté). Les autres stores (SQLite,
+segments) sont parcourus par `codes()` / `load()`.
+
+Le contrôle est incrémental. Le manifeste (`_integrity/manifest.json` dans
+le répertoire du store, `<base>.integrity.json` pour SQLite) garde, par
+fichier ou par code, son état (mtime et taille du fichier, ou
+`store.version(code)`), une empreinte SHA-256 et le résultat. Une entrée
+dont l'état n'a pas changé n'est pas relue ; relue mais d'empreinte
+inchangée, elle n'est pas revalidée. Les entrées à relire sont réparties en
+paquets dans le pipeline de aqeq.pipeline (pool de processus).
+
+Avec `--quarantine` (FileStore seulement), les fichiers invalides sont
+déplacés dans `_quarantine/` (même chemin relatif) : ils sortent du store,
+et les codes qui ne sont plus lisibles sont retirés des index (résumés,
+normes, timeline), pour que le tableau de bord ne les liste plus.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+
+from aqeq.items import ANSWER_LABELS, AQ_N_ITEMS, EQ_N_ITEMS, PREREQ_KEYS
+
+# Version des règles de validation : un manifeste d'une autre version est
+# ignoré (tout est revalidé).
+CHECK_VERSION = 2
+
+MANIFEST_PATH = os.path.join("_integrity", "manifest.json")
+QUARANTINE_DIR = "_quarantine"
+
+
+# =========================================================
+# VALIDATION D'UN ENREGISTREMENT
+# =========================================================
+
+def _listed(values, limit: int = 10) -> str:
+    return ", ".join(map(str, values[:limit])) + (" …" if len(values) > limit else "")
+
+
+def _check_answers(payload: dict, field: str, n_items: int) -> list:
+    answers = payload.get(field)
+    if not isinstance(answers, dict):
+        return [f"{field} absent ou mal formé"]
+    seen = set()
+    bad_keys, outside, bad_values = [], [], []
+    for key, value in answers.items():
+        try:
+            item = int(key)
+        except (TypeError, ValueError):
+            bad_keys.append(repr(key))
+            continue
+        if not 1 <= item <= n_items:
+            outside.append(item)
+            continue
+        seen.add(item)
+        # Une liste ou un objet ne doit pas faire échouer le test d'appartenance.
+        if isinstance(value, bool) or not isinstance(value, int) or value not in ANSWER_LABELS:
+            bad_values.append(f"{item} : {value!r}")
+    missing = sorted(set(range(1, n_items + 1)) - seen)
+    problems = []
+    if bad_keys:
+        problems.append(f"{field} : {len(bad_keys)} clé(s) non numérique(s) ({_listed(bad_keys)})")
+    if outside:
+        problems.append(f"{field} : {len(outside)} item(s) hors instrument 1–{n_items} ({_listed(outside)})")
+    if bad_values:
+        problems.append(f"{field} : {len(bad_values)} réponse(s) hors plage ({_listed(bad_values)})")
+    if missing:
+        problems.append(f"{field} : {len(missing)} item(s) manquant(s) ({_listed(missing)})")
+    return problems
+
+
+def validate_payload(payload, patient_code: str = None) -> list:
+    """
+    Problèmes d'un payload tel qu'enregistré (JSON décodé, avant
+    `decode_json`, ou payload relu par `store.load`) ; liste vide s'il est
+    valide.
+    """
+    from aqeq.packed import PACKED_SIZE
+
+    if not isinstance(payload, dict):
+        return ["le contenu n'est pas un objet JSON"]
+    problems = []
+    stored_code = payload.get("patient_code")
+    if patient_code is not None and stored_code != patient_code:
+        problems.append(f"patient_code {stored_code!r} différent du nom de fichier")
+
+    if "answers_packed" in payload:
+        packed = payload["answers_packed"]
+        try:
+            if isinstance(packed, bytes):
+                size = len(packed)
+            else:
+                size = len(base64.b64decode(packed, validate=True)) if isinstance(packed, str) else None
+        except (binascii.Error, ValueError):
+            size = None
+        if size is None:
+            problems.append("answers_packed : base64 invalide")
+        elif size != PACKED_SIZE:
+            problems.append(f"answers_packed : {size} octets ({PACKED_SIZE} attendus)")
+    else:
+        problems += _check_answers(payload, "aq_answers", AQ_N_ITEMS)
+        problems += _check_answers(payload, "eq_answers", EQ_N_ITEMS)
+
+    prereq = payload.get("prereq", {})
+    if not isinstance(prereq, dict):
+        problems.append("prereq : objet attendu")
+    else:
+        for key in PREREQ_KEYS:
+            if key in prereq and not isinstance(prereq[key], bool):
+                problems.append(f"prereq : valeur non booléenne pour {key} ({prereq[key]!r})")
+
+    if "derived" in payload and not isinstance(payload["derived"], dict):
+        problems.append("derived : objet attendu")
+    return problems
+
+
+def content_digest(payload: dict) -> str:
+    """
+    Empreinte d'une passation valide, indépendante de son code et de sa
+    forme de stockage : deux codes de même empreinte sont des doublons.
+    """
+    from aqeq.scoring import answers_from_payload
+    from aqeq.storage import decode_json
+
+    aq, eq, prereq = answers_from_payload(decode_json(dict(payload)))
+    identity = {k: v for k, v in payload.items()
+                if k not in ("patient_code", "derived", "answers_packed", "aq_answers", "eq_answers", "prereq")}
+    text = json.dumps(
+        [identity, sorted(aq.items()), sorted(eq.items()), sorted(prereq.items())],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def check_file(path: str, patient_code: str) -> dict:
+    """Contrôle d'un fichier : {sha256, digest, problems}."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    result = {"sha256": hashlib.sha256(raw).hexdigest(), "digest": None}
+    try:
+        payload = json.loads(raw)
+    except (UnicodeDecodeError, ValueError) as exc:
+        result["problems"] = [f"JSON illisible : {exc}"]
+        return result
+    result["problems"] = validate_payload(payload, patient_code)
+    if not result["problems"]:
+        result["digest"] = content_digest(payload)
+    return result
+
+
+def _sha256_payload(payload) -> str:
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False,
+                      default=lambda v: v.hex() if isinstance(v, bytes) else repr(v))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def check_record(store, patient_code: str) -> dict:
+    """Contrôle d'un enregistrement relu par `store.load` : {sha256, digest, problems}."""
+    try:
+        payload = store.load(patient_code)
+    except Exception as exc:
+        return {"sha256": None, "digest": None, "problems": [f"enregistrement illisible : {exc!r}"]}
+    if payload is None:
+        return None
+    result = {"sha256": _sha256_payload(payload), "digest": None}
+    result["problems"] = validate_payload(payload, patient_code)
+    if not result["problems"]:
+        result["digest"] = content_digest(payload)
+    return result
+
+
+def _check_records(chunk, _):
+    """
+    Exécuté dans les processus du pool : (code, code, version, résultat)
+    par enregistrement, résultat None si l'empreinte n'a pas changé.
+    """
+    from aqeq.pipeline import worker_store
+
+    store = worker_store()
+    out = []
+    for key, code, version, old_sha in chunk:
+        result = check_record(store, code)
+        if result is None:
+            # Supprimé depuis le parcours : vu au passage suivant.
+            continue
+        if result["sha256"] is not None and result["sha256"] == old_sha:
+            result = None
+        out.append((key, code, version, result))
+    return out
+
+
+def _check_files(chunk, directory):
+    """
+    Exécuté dans les processus du pool : (chemin relatif, code, stat,
+    résultat) par fichier, résultat None si l'empreinte n'a pas changé.
+    """
+    out = []
+    for rel, code, stat, old_sha in chunk:
+        try:
+            result = check_file(os.path.join(directory, rel), code)
+        except FileNotFoundError:
+            # Supprimé ou déplacé depuis le parcours : vu au passage suivant.
+            continue
+        if result["sha256"] == old_sha:
+            result = None
+        out.append((rel, code, stat, result))
+    return out
+
+
+# =========================================================
+# MANIFESTE
+# =========================================================
+
+def read_manifest(path: str) -> dict:
+    """Entrées du manifeste (chemin relatif → entrée), vide s'il est absent ou périmé."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get("version") != CHECK_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def write_manifest(path: str, files: dict):
+    from aqeq.atomic import atomic_write
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    manifest = {"version": CHECK_VERSION, "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "files": files}
+    atomic_write(path, json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+
+
+# =========================================================
+# CONTRÔLE DU STORE
+# =========================================================
+
+def _collisions(files: dict) -> list:
+    from aqeq.storage import fanout_dirs
+
+    by_code = defaultdict(list)
+    by_folded = defaultdict(set)
+    problems = []
+    for rel, entry in files.items():
+        code = entry["code"]
+        by_code[code].append(rel)
+        by_folded[code.casefold()].add(code)
+        parent = os.path.dirname(rel)
+        if parent and parent != os.path.join(*fanout_dirs(code)):
+            problems.append({"codes": [code], "paths": [rel], "problem": "fichier hors de son sous-répertoire"})
+    for code, paths in sorted(by_code.items()):
+        if len(paths) > 1:
+            problems.append({"codes": [code], "paths": sorted(paths), "problem": "code présent dans plusieurs fichiers"})
+    for codes in by_folded.values():
+        if len(codes) > 1:
+            codes = sorted(codes)
+            paths = sorted(p for c in codes for p in by_code[c])
+            problems.append({"codes": codes, "paths": paths, "problem": "codes ne différant que par la casse"})
+    return problems
+
+
+def _manifest_path(store) -> str:
+    from aqeq.storage import SQLiteStore
+
+    if isinstance(store, SQLiteStore):
+        return f"{store.path}.integrity.json"
+    return os.path.join(store.directory, MANIFEST_PATH)
+
+
+def _scan(store, previous):
+    """
+    (entrées à jour, entrées à relire) : un FileStore est parcouru fichier
+    par fichier (clé = chemin relatif, état = mtime et taille), les autres
+    stores code par code (clé = code, état = `store.version(code)`).
+    """
+    from aqeq.storage import FileStore
+
+    current, todo = {}, []
+    if type(store) is FileStore:
+        entries = (
+            (os.path.relpath(entry.path, store.directory), code, [entry.stat().st_mtime_ns, entry.stat().st_size])
+            for code, entry in store._entries()
+        )
+    else:
+        # Même forme que dans le manifeste relu (listes JSON).
+        entries = ((code, code, json.loads(json.dumps(store.version(code)))) for code in store.codes())
+    for key, code, state in entries:
+        old = previous.get(key)
+        if old is not None and old["stat"] == state and old["code"] == code:
+            current[key] = old
+        else:
+            todo.append((key, code, state, old["sha256"] if old else None))
+    return current, todo
+
+
+def check_store(store_url: str, quarantine: bool = False, workers: int = 1, chunk_size: int = 500,
+                full: bool = False) -> dict:
+    """
+    Contrôle le store `store_url` (voir module) et met à jour son manifeste ;
+    renvoie le rapport. `full` ignore le manifeste. Lève ValueError si la
+    quarantaine est demandée pour un store qui n'est pas un FileStore.
+    """
+    from aqeq.pipeline import chunked, run_pipeline
+    from aqeq.storage import FileStore, open_store
+
+    started = time.perf_counter()
+    store = open_store(store_url)
+    try:
+        by_file = type(store) is FileStore
+        if quarantine and not by_file:
+            raise ValueError(f"La quarantaine déplace des fichiers : elle ne s'applique pas à {store!r}.")
+        manifest_path = _manifest_path(store)
+        previous = {} if full else read_manifest(manifest_path)
+        entries, todo = _scan(store, previous)
+
+        if by_file:
+            results = run_pipeline(chunked(todo, chunk_size), _check_files, store.directory, workers)
+        else:
+            results = run_pipeline(chunked(todo, chunk_size), _check_records, None, workers,
+                                   store_url if workers > 1 else store)
+        for key, code, state, result in results:
+            if result is None:
+                entries[key] = {**previous[key], "stat": state}
+            else:
+                entries[key] = {"code": code, "stat": state, **result}
+
+        invalid = [
+            {"path": key, "code": e["code"], "problems": e["problems"]}
+            for key, e in sorted(entries.items()) if e["problems"]
+        ]
+        by_digest = defaultdict(list)
+        for e in entries.values():
+            if e["digest"] is not None:
+                by_digest[e["digest"]].append(e["code"])
+        duplicates = sorted(sorted(set(codes)) for codes in by_digest.values() if len(set(codes)) > 1)
+        collisions = _collisions(entries)
+
+        quarantined = []
+        if quarantine:
+            for bad in invalid:
+                target = os.path.join(store.directory, QUARANTINE_DIR, bad["path"])
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    os.replace(os.path.join(store.directory, bad["path"]), target)
+                except FileNotFoundError:
+                    continue
+                entries.pop(bad["path"])
+                quarantined.append(bad["path"])
+            # Un code peut rester lisible par un autre fichier (doublon de
+            # disposition) : seuls les codes disparus quittent les index.
+            gone = {bad["code"] for bad in invalid if bad["path"] in quarantined}
+            store.unindex(code for code in gone if store.version(code) is None)
+
+        write_manifest(manifest_path, entries)
+    finally:
+        store.close()
+
+    return {
+        "store": store_url,
+        "records": len(entries) + len(quarantined),
+        "checked": len(todo),
+        "invalid": invalid,
+        "collisions": collisions,
+        "duplicates": duplicates,
+        "quarantined": quarantined,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
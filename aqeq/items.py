@@ -0,0 +1,56 @@
+"""
+Tables des questionnaires AQ (50 items) et EQ (60 items) : libellés,
+clés de cotation, sous-échelles AQ et sections CLASS CLINIC.
+
+Les définitions sont lues dans les fichiers d'instruments (voir
+aqeq.instrument) ; ce module en expose les tables sous leurs noms
+historiques pour l'app et la cotation.
+"""
+
+from aqeq.instrument import load_instrument
+
+AQ = load_instrument("AQ-50")
+EQ = load_instrument("EQ-60")
+
+# =========================================================
+# QUESTIONS AQ & EQ
+# =========================================================
+
+AQ_ITEMS = AQ.items
+EQ_ITEMS = EQ.items
+ANSWER_LABELS = AQ.answers
+
+AQ_N_ITEMS = AQ.n_items
+EQ_N_ITEMS = EQ.n_items
+
+# =========================================================
+# COTATION AQ
+# =========================================================
+
+AQ_AGREE_ITEMS = set(AQ.scoring["agree"])
+AQ_SUBSCALES = AQ.subscales
+
+# =========================================================
+# DSM / CLASS CLINIC
+# =========================================================
+
+CLASS_SECTIONS = AQ.sections
+CLASS_A_ITEMS = CLASS_SECTIONS["A"]["items"]
+CLASS_B_ITEMS = CLASS_SECTIONS["B"]["items"]
+CLASS_C_ITEMS = CLASS_SECTIONS["C"]["items"]
+CLASS_D_ITEMS = CLASS_SECTIONS["D"]["items"]
+
+PREREQ_KEYS = ["E", "F", "G", "H", "I"]
+
+# =========================================================
+# DONNÉES DU RÉPONDANT
+# =========================================================
+
+SEX_OPTIONS = ("", "Féminin", "Masculin", "Autre")
+
+# =========================================================
+# COTATION EQ
+# =========================================================
+
+EQ_EMPATHY_ITEMS = set(EQ.scoring["agree"]) | set(EQ.scoring["disagree"])
+EQ_POSITIVE_AGREE = set(EQ.scoring["agree"])
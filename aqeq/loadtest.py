@@ -0,0 +1,450 @@
+"""
+Test de charge de app.py : des centaines de sessions simultanées dans un
+même processus, comme sur un serveur Streamlit.
+
+    python -m aqeq.loadtest --respondents 200 --practitioners 100 --concurrency 50 -o charge.json
+
+Chaque session est une `streamlit.testing.v1.AppTest` (exécution sans
+navigateur du vrai script), jouée dans un thread :
+  - répondant : ouverture, page d'informations, pages AQ et EQ remplies au
+    hasard, prérequis, envoi (`form_repondant_*`) ;
+  - praticien : ouverture, passage en mode praticien, recherche d'un code
+    (`form_praticien`) parmi les réponses préchargées (--seed) et celles
+    envoyées pendant le test.
+
+Les caches `st.cache_resource` (store, cache des réponses, envoi des
+emails) sont partagés par toutes les sessions, comme dans un serveur. Les
+secrets EMAIL_* sont fournis et smtplib est remplacé par un faux serveur
+qui compte les messages : l'outbox et son thread d'envoi travaillent
+réellement, sans réseau. La couche websocket/Tornado n'est pas mesurée.
+
+AppTest remplace des objets globaux de Streamlit le temps d'une
+exécution : les réexécutions sont donc jouées l'une après l'autre (verrou)
+tandis que les sessions, elles, restent ouvertes en parallèle. C'est
+proche d'un serveur limité par le GIL, où le travail Python des
+réexécutions est de toute façon sérialisé. La latence d'une étape compte
+l'attente du verrou (ce que perçoit l'utilisateur) ; `service` donne la
+durée d'exécution seule.
+
+Avec --processes N, le même test est réparti sur N processus, comme
+derrière `python -m aqeq.serve --workers N` : environnement de aqeq.serve
+(store et cache SQLite communs, mesures par processus), sessions et
+concurrence divisées entre eux. Le débit est alors calculé sur la fenêtre
+commune (du premier départ à la dernière fin) ; chaque processus garde son
+rapport détaillé dans `per_process`.
+
+Résultat (JSON) : débit en sessions/s et en réexécutions/s, percentiles
+p50/p95/p99 de chaque étape, latence et service (voir
+aqeq.bench.summarize), erreurs, et mémoire résidente du processus
+avant/après, rapportée au nombre de sessions gardées ouvertes jusqu'à la
+fin du test (majorant : l'arbre d'éléments d'AppTest y est compté).
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import queue
+import random
+import shutil
+import smtplib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from aqeq.bench import summarize, synthetic_payload
+from aqeq.items import AQ_N_ITEMS, EQ_N_ITEMS, PREREQ_KEYS
+from aqeq.paths import APP_PATH
+
+PRACTITIONER_MODE = "Je suis le praticien"
+
+# Une seule réexécution AppTest à la fois (voir module).
+_RUN_LOCK = threading.Lock()
+
+
+# =========================================================
+# SMTP FACTICE
+# =========================================================
+
+class StubSMTP:
+    """Remplaçant de smtplib.SMTP / SMTP_SSL : accepte et compte les messages."""
+
+    sent = 0
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return (250, b"OK")
+
+    def send_message(self, msg, *args, **kwargs):
+        with StubSMTP._lock:
+            StubSMTP.sent += 1
+        return {}
+
+    def quit(self):
+        pass
+
+    close = quit
+
+
+@contextmanager
+def stub_smtp():
+    saved = smtplib.SMTP, smtplib.SMTP_SSL
+    smtplib.SMTP = smtplib.SMTP_SSL = StubSMTP
+    try:
+        yield StubSMTP
+    finally:
+        smtplib.SMTP, smtplib.SMTP_SSL = saved
+
+
+SECRETS = {
+    "EMAIL_SENDER": "loadtest@example.invalid",
+    "EMAIL_APP_PASSWORD": "x",
+    "PRACTITIONER_EMAIL": "praticien@example.invalid",
+    "EMAIL_SMTP_HOST": "localhost",
+    "EMAIL_SMTP_PORT": 2525,
+    "EMAIL_SMTP_SSL": False,
+}
+
+
+def _rss_bytes() -> int:
+    """Mémoire résidente du processus (Linux : /proc ; sinon le pic)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# =========================================================
+# SESSIONS
+# =========================================================
+
+class Recorder:
+    """Durées par étape, erreurs et codes envoyés (partagés entre threads)."""
+
+    def __init__(self, codes):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.service = {}
+        self.errors = {}
+        self.codes = list(codes)
+
+    def step(self, name: str, at, action):
+        t0 = time.perf_counter()
+        with _RUN_LOCK:
+            t1 = time.perf_counter()
+            action()
+        t2 = time.perf_counter()
+        with self._lock:
+            self.samples.setdefault(name, []).append(t2 - t0)
+            self.service.setdefault(name, []).append(t2 - t1)
+        if at.exception:
+            raise RuntimeError(f"{name} : {at.exception[0].message}")
+
+    def error(self, kind: str, exc: Exception):
+        with self._lock:
+            self.errors.setdefault(kind, []).append(repr(exc))
+
+    def add_code(self, code: str):
+        with self._lock:
+            self.codes.append(code)
+
+    def pick_code(self, rng: random.Random):
+        with self._lock:
+            return rng.choice(self.codes) if self.codes else None
+
+
+def _new_app(timeout: float):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    for key, value in SECRETS.items():
+        at.secrets[key] = value
+    return at
+
+
+def _click(at, label: str):
+    return lambda: next(b for b in at.button if label in b.label).click().run()
+
+
+def respondent_session(rec: Recorder, rng: random.Random, think: float, timeout: float):
+    at = _new_app(timeout)
+    rec.step("respondent_open", at, at.run)
+
+    info = synthetic_payload(rng, "")
+    next(t for t in at.text_input if t.label.startswith("Identifiant")).input(info["patient_id"])
+    next(t for t in at.text_input if t.label.startswith("Code praticien")).input(info["practitioner_code"])
+    at.selectbox[0].set_value(info["sex"])
+    time.sleep(think)
+    rec.step("respondent_page", at, _click(at, "Suivant"))
+
+    for prefix, n_items in (("AQ", AQ_N_ITEMS), ("EQ", EQ_N_ITEMS)):
+        for i in range(1, n_items + 1):
+            at.radio(key=f"{prefix}_{i}").set_value(rng.randint(1, 4))
+        time.sleep(think)
+        rec.step("respondent_page", at, _click(at, "Suivant"))
+
+    for key in PREREQ_KEYS:
+        at.radio(key=f"prereq_{key}").set_value(rng.choice(["Oui", "Non"]))
+    time.sleep(think)
+    rec.step("respondent_submit", at, _click(at, "Envoyer"))
+    code = at.info[-1].value.split("**")[-2]
+    rec.add_code(code)
+    return at
+
+
+def practitioner_session(rec: Recorder, rng: random.Random, think: float, timeout: float):
+    at = _new_app(timeout)
+    rec.step("practitioner_open", at, at.run)
+    rec.step("practitioner_mode", at, lambda: at.sidebar.radio[0].set_value(PRACTITIONER_MODE).run())
+    for _ in range(2):
+        # Le même dossier est souvent rouvert (voir le cache des réponses).
+        code = rec.pick_code(rng)
+        if code is None:
+            break
+        at.text_input[0].input(code)
+        time.sleep(think)
+        rec.step("practitioner_lookup", at, _click(at, "Charger"))
+        if at.error:
+            raise RuntimeError(f"practitioner_lookup : code {code} introuvable")
+    return at
+
+
+# =========================================================
+# CONDUITE DU TEST
+# =========================================================
+
+def seed_store(store_url: str, n: int, rng: random.Random) -> list:
+    """Réponses préchargées, pour que les praticiens aient des codes à chercher."""
+    from aqeq.scoring import compute_derived, response_summary
+    from aqeq.storage import open_store
+
+    store = open_store(store_url)
+    codes = []
+    for k in range(n):
+        payload = synthetic_payload(rng, f"LOAD{k:06d}")
+        payload["derived"] = compute_derived(payload["aq_answers"], payload["eq_answers"], payload["prereq"])
+        store.save(payload["patient_code"], payload, summary=response_summary(payload))
+        codes.append(payload["patient_code"])
+    store.close()
+    return codes
+
+
+def run_load(respondents: int, practitioners: int, concurrency: int, seed: int = 50,
+             think: float = 0.0, timeout: float = 120.0, store_url: str = None, rng_seed: int = 0) -> dict:
+    """
+    Joue les sessions avec `concurrency` threads et renvoie le rapport. Sans
+    `store_url`, le test travaille dans un répertoire temporaire.
+    """
+    tmp = tempfile.mkdtemp(prefix="aqeq-load-")
+    cwd = os.getcwd()
+    saved_store = os.environ.get("AQEQ_STORE")
+    store_url = store_url or os.path.join(tmp, "data")
+    os.environ["AQEQ_STORE"] = store_url
+    rng = random.Random(rng_seed)
+    try:
+        os.chdir(tmp)
+        rec = Recorder(seed_store(store_url, seed, rng))
+        kinds = ["respondent"] * respondents + ["practitioner"] * practitioners
+        rng.shuffle(kinds)
+        jobs = queue.Queue()
+        for n, kind in enumerate(kinds):
+            jobs.put((n, kind))
+
+        sessions = []
+        sessions_lock = threading.Lock()
+
+        def worker():
+            while True:
+                try:
+                    n, kind = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                session = respondent_session if kind == "respondent" else practitioner_session
+                try:
+                    at = session(rec, random.Random(rng_seed * 1_000_003 + n), think, timeout)
+                except Exception as exc:  # noqa: BLE001 - on compte toutes les erreurs
+                    rec.error(kind, exc)
+                    continue
+                with sessions_lock:
+                    sessions.append(at)
+
+        rss_before = _rss_bytes()
+        with stub_smtp() as smtp:
+            started_at = time.time()
+            t0 = time.perf_counter()
+            threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - t0
+            ended_at = time.time()
+            rss_after = _rss_bytes()
+            # Laisser le thread d'envoi vider l'outbox.
+            time.sleep(1.0)
+            emails = smtp.sent
+
+        reruns = sum(len(s) for s in rec.samples.values())
+        return {
+            "config": {
+                "respondents": respondents,
+                "practitioners": practitioners,
+                "concurrency": concurrency,
+                "seed": seed,
+                "think_s": think,
+                "store": "(temporaire)" if store_url.startswith(tmp) else store_url,
+            },
+            "wall_s": round(wall, 3),
+            "started_at": started_at,
+            "ended_at": ended_at,
+            "sessions_ok": len(sessions),
+            "reruns": reruns,
+            "sessions_per_s": round(len(sessions) / wall, 3) if wall else None,
+            "reruns_per_s": round(reruns / wall, 3) if wall else None,
+            "steps": {name: summarize(samples) for name, samples in sorted(rec.samples.items())},
+            "service": {name: summarize(samples) for name, samples in sorted(rec.service.items())},
+            "errors": {kind: {"n": len(errs), "examples": errs[:3]} for kind, errs in rec.errors.items()},
+            "emails_sent": emails,
+            "memory": {
+                "rss_before_mb": round(rss_before / 2**20, 1),
+                "rss_after_mb": round(rss_after / 2**20, 1),
+                "per_session_kb": round((rss_after - rss_before) / 1024 / len(sessions), 1) if sessions else None,
+            },
+        }
+    finally:
+        os.chdir(cwd)
+        if saved_store is None:
+            os.environ.pop("AQEQ_STORE", None)
+        else:
+            os.environ["AQEQ_STORE"] = saved_store
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _share(total: int, n: int, k: int) -> int:
+    """Part du processus k quand `total` est réparti sur n processus."""
+    return total // n + (1 if k < total % n else 0)
+
+
+def run_processes(processes: int, respondents: int, practitioners: int, concurrency: int,
+                  seed: int = 50, think: float = 0.0, timeout: float = 120.0, store_url: str = None) -> dict:
+    """
+    Répartit le test sur `processes` processus (voir module) et agrège
+    leurs rapports. Sans `store_url`, un store temporaire commun.
+    """
+    from aqeq.paths import ROOT_DIR
+    from aqeq.serve import worker_env
+
+    tmp = tempfile.mkdtemp(prefix="aqeq-load-")
+    try:
+        shared_url = store_url or os.path.join(tmp, "data")
+        shared_cache = os.path.join(tmp, "_cache.sqlite3")
+        runs = []
+        for k in range(processes):
+            output = os.path.join(tmp, f"worker{k}.json")
+            cmd = [
+                sys.executable, "-m", "aqeq.loadtest",
+                "--respondents", str(_share(respondents, processes, k)),
+                "--practitioners", str(_share(practitioners, processes, k)),
+                "--concurrency", str(max(1, _share(concurrency, processes, k))),
+                "--seed", str(seed), "--think", str(think), "--timeout", str(timeout),
+                "--store", shared_url, "--rng-seed", str(k), "-o", output,
+            ]
+            env = worker_env(k, shared_url, shared_cache)
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT_DIR, env.get("PYTHONPATH")]))
+            runs.append((subprocess.Popen(cmd, env=env, cwd=tmp), output))
+
+        reports = []
+        for process, output in runs:
+            process.wait()
+            if not os.path.exists(output):
+                raise RuntimeError(f"Processus de charge arrêté sans rapport (code {process.returncode}).")
+            with open(output, "r", encoding="utf-8") as f:
+                reports.append(json.load(f)["results"])
+
+        window = max(r["ended_at"] for r in reports) - min(r["started_at"] for r in reports)
+        sessions = sum(r["sessions_ok"] for r in reports)
+        errors = {}
+        for r in reports:
+            for kind, err in r["errors"].items():
+                merged = errors.setdefault(kind, {"n": 0, "examples": []})
+                merged["n"] += err["n"]
+                merged["examples"] = (merged["examples"] + err["examples"])[:3]
+        return {
+            "config": {
+                "processes": processes,
+                "respondents": respondents,
+                "practitioners": practitioners,
+                "concurrency": concurrency,
+                "seed": seed,
+                "think_s": think,
+                "store": "(temporaire)" if store_url is None else store_url,
+            },
+            "wall_s": round(window, 3),
+            "sessions_ok": sessions,
+            "sessions_per_s": round(sessions / window, 3) if window else None,
+            "reruns_per_s": round(sum(r["reruns"] for r in reports) / window, 3) if window else None,
+            "errors": errors,
+            "emails_sent": sum(r["emails_sent"] for r in reports),
+            "per_process": reports,
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m aqeq.loadtest")
+    parser.add_argument("--respondents", type=int, default=100, help="sessions répondant (passation complète)")
+    parser.add_argument("--practitioners", type=int, default=50, help="sessions praticien (recherche de codes)")
+    parser.add_argument("--concurrency", type=int, default=20, help="sessions simultanées")
+    parser.add_argument("--seed", type=int, default=50, help="réponses préchargées dans le store")
+    parser.add_argument("--think", type=float, default=0.0, help="pause (s) avant chaque action, comme un humain")
+    parser.add_argument("--timeout", type=float, default=120.0, help="délai maximal d'une réexécution (s)")
+    parser.add_argument("--store", help="store à utiliser (défaut : répertoire temporaire)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="processus entre lesquels répartir les sessions (comme aqeq.serve --workers)")
+    parser.add_argument("--rng-seed", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", help="fichier JSON de résultats (défaut : stdout)")
+    args = parser.parse_args(argv)
+
+    if importlib.util.find_spec("streamlit") is None:
+        raise SystemExit("Le test de charge nécessite Streamlit (pip install streamlit).")
+
+    if args.processes > 1:
+        results = run_processes(
+            args.processes, args.respondents, args.practitioners, args.concurrency, args.seed,
+            args.think, args.timeout, args.store,
+        )
+    else:
+        results = run_load(
+            args.respondents, args.practitioners, args.concurrency, args.seed,
+            args.think, args.timeout, args.store, args.rng_seed,
+        )
+    report = {
+        "meta": {"date": datetime.now(timezone.utc).isoformat(timespec="seconds")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["results"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
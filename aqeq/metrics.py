@@ -0,0 +1,257 @@
+"""
+Instrumentation légère : compteurs, durées (« spans ») et profils.
+
+    from aqeq import metrics
+
+    with metrics.span("save_response"):
+        ...
+    metrics.inc("submissions_total")
+
+Les mesures sont gardées en mémoire pour tout le processus (toutes les
+sessions Streamlit) et exportées au format texte de Prometheus par
+`render()`, ou dans un fichier par `dump(path)` (écriture atomique, à
+faire lire par node_exporter --collector.textfile ou un script).
+
+Pour un script Streamlit, `start_rerun()` en tête et `end_rerun()` en fin
+mesurent chaque réexécution (span "rerun") ; une réexécution interrompue
+par st.rerun() ou st.stop() est comptée au début de la suivante, dans le
+même thread (span "rerun_interrupted").
+
+Profilage optionnel, par réexécution, activé par variable d'environnement :
+
+    AQEQ_PROFILE=cprofile      → <AQEQ_PROFILE_DIR>/<horodatage>.prof
+    AQEQ_PROFILE=pyinstrument  → <AQEQ_PROFILE_DIR>/<horodatage>.html
+                                 (pip install -r requirements-dev.txt)
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "aqeq_"
+
+# Bornes des histogrammes de durée, en secondes.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Registry:
+    """Compteurs et histogrammes de durée, protégés par un verrou."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0}
+            for n, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h["buckets"][n] += 1
+            h["count"] += 1
+            h["sum"] += seconds
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Mesure la durée du bloc (histogramme `span_seconds{span=name}`)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("span_seconds", time.perf_counter() - t0, span=name, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _labels_key(labels)), 0)
+
+    def snapshot(self) -> dict:
+        """Copie des mesures : {"counters": {...}, "spans": {nom: {count, sum}}}."""
+        with self._lock:
+            return {
+                "counters": {
+                    name + _format_labels(key): value for (name, key), value in self._counters.items()
+                },
+                "spans": {
+                    dict(key).get("span", name): {"count": h["count"], "sum": h["sum"]}
+                    for (name, key), h in self._histograms.items()
+                },
+            }
+
+    def render(self) -> str:
+        """Format texte d'exposition Prometheus (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        lines = []
+        seen = set()
+        for (name, key), value in counters:
+            metric = PREFIX + name
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            lines.append(f"{metric}{_format_labels(key)} {value}")
+        for (name, key), h in histograms:
+            metric = PREFIX + name
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} histogram")
+                seen.add(metric)
+            for bound, count in zip(BUCKETS, h["buckets"]):
+                lines.append(f"{metric}_bucket{_format_labels(key, (('le', bound),))} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(key, (('le', '+Inf'),))} {h['count']}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {h['sum']:.6f}")
+            lines.append(f"{metric}_count{_format_labels(key)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Écrit `render()` dans `path` de façon atomique."""
+        from aqeq.atomic import atomic_write
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        atomic_write(path, self.render().encode("utf-8"), fsync=False)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Registre du processus et raccourcis.
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+span = REGISTRY.span
+counter = REGISTRY.counter
+snapshot = REGISTRY.snapshot
+render = REGISTRY.render
+dump = REGISTRY.dump
+
+
+# =========================================================
+# DÉMARRAGE / ARRÊT EXPLICITES (script Streamlit)
+# =========================================================
+
+class Timer:
+    """Span démarré et arrêté explicitement (quand un bloc `with` ne convient pas)."""
+
+    def __init__(self, name: str, registry: Registry = REGISTRY, **labels):
+        self.name = name
+        self.labels = labels
+        self._registry = registry
+        self._t0 = time.perf_counter()
+
+    def stop(self) -> float:
+        elapsed = time.perf_counter() - self._t0
+        self._registry.observe("span_seconds", elapsed, span=self.name, **self.labels)
+        return elapsed
+
+
+class Profile:
+    """
+    Profil d'une réexécution selon AQEQ_PROFILE (voir module) ; ne fait
+    rien si la variable est vide. `stop()` écrit le fichier et renvoie son
+    chemin.
+    """
+
+    def __init__(self, name: str = "rerun", directory: str = None):
+        self.mode = os.environ.get("AQEQ_PROFILE", "").strip().lower()
+        self.name = name
+        self.directory = os.environ.get("AQEQ_PROFILE_DIR") or directory or "profiles"
+        self._profiler = None
+        if self.mode == "cprofile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Un autre profileur est actif (session concurrente).
+                return
+            self._profiler = profiler
+        elif self.mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise RuntimeError("AQEQ_PROFILE=pyinstrument nécessite pyinstrument (pip install -r requirements-dev.txt).")
+            # async_mode="disabled" : chaque session Streamlit a son thread.
+            self._profiler = Profiler(async_mode="disabled")
+            self._profiler.start()
+
+    def stop(self):
+        if self._profiler is None:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{time.perf_counter_ns() % 1_000_000:06d}"
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            path = os.path.join(self.directory, f"{self.name}-{stamp}.prof")
+            self._profiler.dump_stats(path)
+        else:
+            self._profiler.stop()
+            path = os.path.join(self.directory, f"{self.name}-{stamp}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self._profiler.output_html())
+        self._profiler = None
+        return path
+
+
+# =========================================================
+# RÉEXÉCUTIONS STREAMLIT
+# =========================================================
+
+_active = threading.local()
+_last_dump = {}
+
+
+def start_rerun(profile_dir: str = None):
+    """Début d'une réexécution du script (voir module)."""
+    previous = getattr(_active, "rerun", None)
+    if previous is not None:
+        timer, profile = previous
+        profile.stop()
+        timer.name = "rerun_interrupted"
+        timer.stop()
+    _active.rerun = (Timer("rerun"), Profile("rerun", profile_dir))
+
+
+def end_rerun():
+    """Fin normale d'une réexécution : span "rerun", profil écrit."""
+    current = getattr(_active, "rerun", None)
+    if current is None:
+        return
+    _active.rerun = None
+    timer, profile = current
+    profile.stop()
+    timer.stop()
+    inc("reruns_total")
+
+
+def dump_if_due(path: str, interval: float = 5.0):
+    """`dump(path)` au plus une fois toutes les `interval` secondes."""
+    now = time.monotonic()
+    if now - _last_dump.get(path, float("-inf")) >= interval:
+        _last_dump[path] = now
+        dump(path)
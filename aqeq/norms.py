@@ -0,0 +1,207 @@
+"""
+Normes de la population enregistrée, mises à jour à chaque enregistrement.
+
+Pour chaque échelle (AQ, EQ) et chaque groupe (sexe × tranche d'âge, plus
+les regroupements « tous sexes » / « tous âges », notés "*") on tient :
+  - n, somme et somme des carrés (moyenne et variance en temps constant) ;
+  - l'histogramme exact des scores : les scores étant entiers et bornés
+    (0–50, 0–80), il sert de « sketch » de percentiles sans erreur.
+
+Une table `norms_members` garde la contribution de chaque code patient :
+réenregistrer un code retire d'abord son ancienne contribution, les
+agrégats ne comptent donc jamais deux fois la même personne.
+"""
+
+from datetime import date
+from math import sqrt
+
+from aqeq.db import LocalSQLite
+
+SCALES = ("aq", "eq")
+ALL = "*"
+
+# (âge minimal, libellé), par ordre croissant.
+AGE_BANDS = [
+    (0, "< 18 ans"),
+    (18, "18–25 ans"),
+    (26, "26–35 ans"),
+    (36, "36–45 ans"),
+    (46, "46–55 ans"),
+    (56, "56–65 ans"),
+    (66, "> 65 ans"),
+]
+UNKNOWN_BAND = "âge inconnu"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS norms_members (
+    patient_code TEXT PRIMARY KEY,
+    sex          TEXT NOT NULL,
+    age_band     TEXT NOT NULL,
+    aq_score     INTEGER NOT NULL,
+    eq_score     INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS norms_moments (
+    scale    TEXT NOT NULL,
+    sex      TEXT NOT NULL,
+    age_band TEXT NOT NULL,
+    n        INTEGER NOT NULL,
+    total    INTEGER NOT NULL,
+    total_sq INTEGER NOT NULL,
+    PRIMARY KEY (scale, sex, age_band)
+);
+CREATE TABLE IF NOT EXISTS norms_hist (
+    scale    TEXT NOT NULL,
+    sex      TEXT NOT NULL,
+    age_band TEXT NOT NULL,
+    score    INTEGER NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (scale, sex, age_band, score)
+);
+"""
+
+_ADD_MOMENTS = """
+INSERT INTO norms_moments (scale, sex, age_band, n, total, total_sq)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (scale, sex, age_band) DO UPDATE SET
+    n        = n + excluded.n,
+    total    = total + excluded.total,
+    total_sq = total_sq + excluded.total_sq
+"""
+
+_ADD_HIST = """
+INSERT INTO norms_hist (scale, sex, age_band, score, count)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (scale, sex, age_band, score) DO UPDATE SET
+    count = count + excluded.count
+"""
+
+
+def age_band(dob: str, test_date: str) -> str:
+    """Tranche d'âge à la date de passation (dates ISO)."""
+    try:
+        born = date.fromisoformat(dob)
+        tested = date.fromisoformat(test_date)
+    except (TypeError, ValueError):
+        return UNKNOWN_BAND
+    age = tested.year - born.year - ((tested.month, tested.day) < (born.month, born.day))
+    if age < 0:
+        return UNKNOWN_BAND
+    label = AGE_BANDS[0][1]
+    for lower, name in AGE_BANDS:
+        if age >= lower:
+            label = name
+    return label
+
+
+def _groups(sex: str, band: str):
+    return [(sex, band), (sex, ALL), (ALL, band), (ALL, ALL)]
+
+
+class NormsIndex:
+    """Agrégats incrémentaux dans un fichier SQLite (voir module)."""
+
+    def __init__(self, path: str, db: LocalSQLite = None):
+        self.path = path
+        self._db = db or LocalSQLite(path)
+        self._db.conn().executescript(_SCHEMA)
+
+    def _apply(self, conn, member, sign: int):
+        _, sex, band, aq, eq = member
+        for scale, score in (("aq", aq), ("eq", eq)):
+            for g_sex, g_band in _groups(sex, band):
+                conn.execute(_ADD_MOMENTS, (scale, g_sex, g_band, sign, sign * score, sign * score * score))
+                conn.execute(_ADD_HIST, (scale, g_sex, g_band, score, sign))
+
+    def record_many(self, summaries):
+        """
+        Ajoute (ou remplace) la contribution de chaque résumé. Les résumés
+        doivent porter patient_code, sex, age_band, aq_score et eq_score.
+        """
+        conn = self._db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self.record_in(conn, summaries)
+
+    def record_in(self, conn, summaries):
+        """Comme `record_many`, dans la transaction en cours de `conn`."""
+        for s in summaries:
+            member = (s["patient_code"], s["sex"] or "", s["age_band"], s["aq_score"], s["eq_score"])
+            old = conn.execute(
+                "SELECT patient_code, sex, age_band, aq_score, eq_score "
+                "FROM norms_members WHERE patient_code = ?",
+                (member[0],),
+            ).fetchone()
+            if old == member:
+                continue
+            if old is not None:
+                self._apply(conn, old, -1)
+            self._apply(conn, member, +1)
+            conn.execute("INSERT OR REPLACE INTO norms_members VALUES (?, ?, ?, ?, ?)", member)
+
+    def record(self, summary: dict):
+        self.record_many([summary])
+
+    def remove_many(self, codes):
+        """Retire la contribution de codes qui ne sont plus enregistrés."""
+        conn = self._db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for code in codes:
+                old = conn.execute(
+                    "SELECT patient_code, sex, age_band, aq_score, eq_score "
+                    "FROM norms_members WHERE patient_code = ?",
+                    (code,),
+                ).fetchone()
+                if old is not None:
+                    self._apply(conn, old, -1)
+                    conn.execute("DELETE FROM norms_members WHERE patient_code = ?", (code,))
+
+    def codes(self) -> set:
+        return {code for (code,) in self._db.conn().execute("SELECT patient_code FROM norms_members")}
+
+    def stats(self, scale: str, sex: str = ALL, band: str = ALL) -> dict:
+        """n, moyenne et écart-type du groupe (None si le groupe est vide)."""
+        row = self._db.conn().execute(
+            "SELECT n, total, total_sq FROM norms_moments WHERE scale = ? AND sex = ? AND age_band = ?",
+            (scale, sex, band),
+        ).fetchone()
+        if row is None or row[0] <= 0:
+            return None
+        n, total, total_sq = row
+        mean = total / n
+        variance = max(0.0, total_sq / n - mean * mean)
+        if n > 1:
+            variance *= n / (n - 1)
+        return {"n": n, "mean": mean, "sd": sqrt(variance)}
+
+    def percentile(self, scale: str, score: int, sex: str = ALL, band: str = ALL):
+        """
+        Rang percentile de `score` dans le groupe : % de scores inférieurs,
+        plus la moitié des ex aequo. None si le groupe est vide.
+        """
+        below = equal = n = 0
+        for value, count in self._db.conn().execute(
+            "SELECT score, count FROM norms_hist WHERE scale = ? AND sex = ? AND age_band = ?",
+            (scale, sex, band),
+        ):
+            n += count
+            if value < score:
+                below += count
+            elif value == score:
+                equal += count
+        if n <= 0:
+            return None
+        return 100.0 * (below + 0.5 * equal) / n
+
+    def histogram(self, scale: str, sex: str = ALL, band: str = ALL) -> dict:
+        return {
+            score: count
+            for score, count in self._db.conn().execute(
+                "SELECT score, count FROM norms_hist "
+                "WHERE scale = ? AND sex = ? AND age_band = ? AND count > 0 ORDER BY score",
+                (scale, sex, band),
+            )
+        }
+
+    def close(self):
+        self._db.close()
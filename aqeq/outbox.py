@@ -0,0 +1,375 @@
+"""
+File d'attente d'emails persistante (outbox) + thread d'envoi.
+
+Chaque notification est un petit fichier JSON déposé dans un répertoire :
+elle survit donc à un redémarrage de l'app. Un thread unique vide la file
+en réutilisant une seule connexion SMTP authentifiée, envoie plusieurs
+messages par session, réessaie avec un délai croissant et peut regrouper
+plusieurs notifications en un seul email récapitulatif (digest).
+
+Aucune dépendance à Streamlit : le module se teste contre un serveur SMTP
+local (use_ssl=False, port quelconque).
+"""
+
+import json
+import logging
+import os
+import secrets
+import smtplib
+import threading
+import time
+from dataclasses import dataclass
+from email.mime.text import MIMEText
+
+from aqeq import metrics
+
+logger = logging.getLogger("aqeq.outbox")
+
+# Un message réclamé par un worker est renommé avec ce suffixe.
+_CLAIM_SUFFIX = ".sending"
+# Au-delà de ce délai, une réclamation est considérée comme abandonnée
+# (processus tué en cours d'envoi) et le message est remis en file.
+_STALE_CLAIM_SECONDS = 300
+
+_TRUE = {"1", "true", "yes", "on", "oui", "vrai"}
+_FALSE = {"0", "false", "no", "off", "non", "faux", ""}
+
+
+def parse_flag(value, default: bool = False) -> bool:
+    """
+    Booléen d'un secret ou d'une variable d'environnement : True/False,
+    0/1 ou texte ("true", "false", "oui", "non"...). None → `default`.
+    Lève ValueError pour toute autre valeur (bool("false") vaudrait True).
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"Valeur booléenne invalide : {value!r}")
+
+
+@dataclass
+class SMTPConfig:
+    sender: str
+    password: str
+    recipient: str
+    host: str = "smtp.gmail.com"
+    port: int = 465
+    use_ssl: bool = True
+    timeout: float = 10.0
+
+
+def _well_formed(message) -> bool:
+    return (
+        isinstance(message, dict)
+        and isinstance(message.get("subject"), str)
+        and isinstance(message.get("body"), str)
+        and isinstance(message.get("attempts", 0), int)
+        and isinstance(message.get("next_attempt", 0), (int, float))
+    )
+
+
+class Outbox:
+    """Répertoire de messages en attente, un fichier JSON par message."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.failed_dir = os.path.join(directory, "failed")
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+    def put(self, subject: str, body: str) -> str:
+        """Ajoute un message à la file ; renvoie son identifiant."""
+        msg_id = f"{time.time_ns():020d}-{secrets.token_hex(4)}"
+        message = {
+            "id": msg_id,
+            "subject": subject,
+            "body": body,
+            "attempts": 0,
+            "next_attempt": 0.0,
+            "last_error": "",
+        }
+        self._write(os.path.join(self.directory, f"{msg_id}.json"), message)
+        return msg_id
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def _write(self, path: str, message: dict):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(message, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def claim_due(self, limit: int, now: float = None):
+        """
+        Réclame jusqu'à `limit` messages dont l'heure d'envoi est passée.
+        Renvoie une liste de (chemin réclamé, message), par ordre d'arrivée.
+        """
+        now = time.time() if now is None else now
+        claimed = []
+        for name in sorted(os.listdir(self.directory)):
+            if len(claimed) >= limit:
+                break
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    message = json.load(f)
+            except OSError:
+                continue
+            except ValueError:
+                message = None
+            if not _well_formed(message):
+                # Fichier illisible : il ne partira jamais, on l'écarte.
+                self._quarantine(path)
+                continue
+            if message.get("next_attempt", 0) > now:
+                continue
+            claim_path = path + _CLAIM_SUFFIX
+            try:
+                os.rename(path, claim_path)
+                # rename garde le mtime de la mise en file : on date la
+                # réclamation, sinon recover_stale la jugerait abandonnée
+                # (et un autre processus renverrait le message) dès qu'elle
+                # a été mise en file il y a plus de _STALE_CLAIM_SECONDS.
+                os.utime(claim_path)
+            except FileNotFoundError:
+                # Déjà pris par un autre worker.
+                continue
+            claimed.append((claim_path, message))
+        return claimed
+
+    def ack(self, claim_path: str):
+        """Message envoyé : on le supprime."""
+        try:
+            os.remove(claim_path)
+        except FileNotFoundError:
+            pass
+
+    def retry(self, claim_path: str, message: dict, error: str, delay: float, max_attempts: int):
+        """Replanifie un message en échec, ou le range dans failed/."""
+        message["attempts"] = message.get("attempts", 0) + 1
+        message["last_error"] = error
+        message["next_attempt"] = time.time() + delay
+        name = os.path.basename(claim_path)[: -len(_CLAIM_SUFFIX)]
+        if message["attempts"] >= max_attempts:
+            target = os.path.join(self.failed_dir, name)
+        else:
+            target = os.path.join(self.directory, name)
+        self._write(target, message)
+        self.ack(claim_path)
+
+    def fail(self, claim_path: str, message: dict, error: str):
+        """Range un message dans failed/ sans nouvel essai."""
+        message["attempts"] = message.get("attempts", 0) + 1
+        message["last_error"] = error
+        name = os.path.basename(claim_path)[: -len(_CLAIM_SUFFIX)]
+        self._write(os.path.join(self.failed_dir, name), message)
+        self.ack(claim_path)
+
+    def _quarantine(self, path: str):
+        try:
+            os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+        except OSError:
+            return
+        logger.warning("Message illisible déplacé dans %s : %s", self.failed_dir, os.path.basename(path))
+        metrics.inc("email_failures_total")
+
+    def recover_stale(self, older_than: float = _STALE_CLAIM_SECONDS):
+        """
+        Remet en file les messages réclamés par un worker disparu : ceux dont
+        la réclamation (mtime, voir `claim_due`) date de plus de `older_than`.
+        """
+        limit = time.time() - older_than
+        for name in os.listdir(self.directory):
+            if not name.endswith(_CLAIM_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.rename(path, path[: -len(_CLAIM_SUFFIX)])
+            except FileNotFoundError:
+                continue
+
+
+class DeliveryWorker(threading.Thread):
+    """
+    Thread démon qui vide l'outbox.
+
+    - une connexion SMTP est ouverte à la demande puis conservée tant que
+      des messages arrivent (fermée après `idle_timeout` secondes) ;
+    - au plus `batch_size` messages sont envoyés par tour ;
+    - en cas d'échec : délai `base_delay * 2**tentatives`, plafonné à
+      `max_delay`, puis abandon dans failed/ après `max_attempts` essais ;
+    - avec `digest=True`, les messages d'un même tour sont regroupés en un
+      seul email ;
+    - un message qui fait échouer autre chose que l'envoi (message mal
+      formé, erreur inattendue) part directement dans failed/, sans arrêter
+      le thread ;
+    - les réclamations abandonnées sont remises en file toutes les
+      `recover_interval` secondes.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        config: SMTPConfig,
+        batch_size: int = 20,
+        poll_interval: float = 2.0,
+        idle_timeout: float = 60.0,
+        digest: bool = False,
+        base_delay: float = 5.0,
+        max_delay: float = 900.0,
+        max_attempts: int = 8,
+        recover_interval: float = _STALE_CLAIM_SECONDS / 2,
+    ):
+        super().__init__(name="aqeq-email-outbox", daemon=True)
+        self.outbox = outbox
+        self.config = config
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.digest = digest
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.recover_interval = recover_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._server = None
+        self._last_used = 0.0
+        self._last_recovery = 0.0
+
+    # -- pilotage -------------------------------------------------------
+
+    def notify(self):
+        """Signale qu'un nouveau message vient d'être déposé."""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = None):
+        self._stopping.set()
+        self._wakeup.set()
+        self.join(timeout)
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                if time.time() - self._last_recovery >= self.recover_interval:
+                    self.outbox.recover_stale()
+                    self._last_recovery = time.time()
+                self.drain()
+                if self._server is not None and time.time() - self._last_used > self.idle_timeout:
+                    self._disconnect()
+            except Exception:
+                # Disque plein, répertoire supprimé... : on réessaiera au tour suivant.
+                logger.exception("Erreur dans le thread d'envoi des emails")
+                self._disconnect()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+        self._disconnect()
+
+    # -- envoi ----------------------------------------------------------
+
+    def drain(self) -> int:
+        """Envoie tout ce qui est dû ; renvoie le nombre de messages envoyés."""
+        sent = 0
+        while True:
+            batch = self.outbox.claim_due(self.batch_size)
+            if not batch:
+                return sent
+            sent += self._send_batch(batch)
+            if len(batch) < self.batch_size:
+                return sent
+
+    def _send_batch(self, batch) -> int:
+        if self.digest and len(batch) > 1:
+            subject = f"{len(batch)} nouveaux questionnaires AQ/EQ"
+            body = "\n\n----------------------------------------\n\n".join(
+                m["body"] for _, m in batch
+            )
+            groups = [(batch, subject, body)]
+        else:
+            groups = [([item], item[1]["subject"], item[1]["body"]) for item in batch]
+
+        sent = 0
+        for items, subject, body in groups:
+            try:
+                with metrics.span("smtp_send"):
+                    self._connection().send_message(self._build(subject, body))
+                self._last_used = time.time()
+            except (smtplib.SMTPException, OSError) as e:
+                # Serveur injoignable, refus temporaire... : nouvel essai plus tard.
+                metrics.inc("email_failures_total", len(items))
+                self._disconnect()
+                for claim_path, message in items:
+                    self._settle(claim_path, message, e, retry=True)
+                continue
+            except Exception as e:
+                metrics.inc("email_failures_total", len(items))
+                logger.exception("Message non envoyable, déplacé dans failed/")
+                for claim_path, message in items:
+                    self._settle(claim_path, message, e, retry=False)
+                continue
+            for claim_path, _ in items:
+                self.outbox.ack(claim_path)
+            metrics.inc("emails_sent_total", len(items))
+            sent += len(items)
+        return sent
+
+    def _settle(self, claim_path: str, message: dict, error: Exception, retry: bool):
+        """Replanifie ou écarte un message ; une erreur ici n'arrête pas le tour."""
+        if retry:
+            try:
+                delay = min(self.max_delay, self.base_delay * 2 ** message.get("attempts", 0))
+                self.outbox.retry(claim_path, message, repr(error), delay, self.max_attempts)
+                return
+            except Exception:
+                logger.exception("Impossible de replanifier le message %s", claim_path)
+        try:
+            self.outbox.fail(claim_path, message, repr(error))
+        except Exception:
+            # La réclamation reste en place : recover_stale la remettra en file.
+            logger.exception("Impossible d'écarter le message %s", claim_path)
+
+    def _build(self, subject: str, body: str) -> MIMEText:
+        msg = MIMEText(body, _charset="utf-8")
+        msg["Subject"] = subject
+        msg["From"] = self.config.sender
+        msg["To"] = self.config.recipient
+        return msg
+
+    def _connection(self):
+        if self._server is not None:
+            try:
+                self._server.noop()
+                return self._server
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+        cfg = self.config
+        if cfg.use_ssl:
+            server = smtplib.SMTP_SSL(cfg.host, cfg.port, timeout=cfg.timeout)
+        else:
+            server = smtplib.SMTP(cfg.host, cfg.port, timeout=cfg.timeout)
+        if cfg.password:
+            server.login(cfg.sender, cfg.password)
+        self._server = server
+        return server
+
+    def _disconnect(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
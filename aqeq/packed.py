@@ -0,0 +1,160 @@
+"""
+Représentation compacte des réponses : 2 bits par item.
+
+Les 50 items AQ puis les 60 items EQ sont rangés à la suite (item AQ i en
+position i - 1, item EQ i en position 49 + i), la réponse r (1–4) étant
+codée r - 1. Les 110 items tiennent en 28 octets (entier little-endian).
+
+La cotation se fait directement sur cette forme : des masques binaires
+compilés depuis les fichiers d'instruments sélectionnent, pour chaque
+réponse, les items qui rapportent des points, puis ceux d'une
+sous-échelle ou d'une section CLASS ; chaque score est un comptage de bits.
+
+Le format JSON historique (aq_answers / eq_answers) reste disponible pour
+l'export via `expand_payload`.
+"""
+
+from aqeq.items import AQ, AQ_N_ITEMS, EQ, EQ_N_ITEMS
+
+N_ITEMS = AQ_N_ITEMS + EQ_N_ITEMS
+PACKED_SIZE = (2 * N_ITEMS + 7) // 8
+
+
+def _bit(position: int) -> int:
+    return 1 << (2 * position)
+
+
+def _mask(positions) -> int:
+    m = 0
+    for p in positions:
+        m |= _bit(p)
+    return m
+
+
+def _spread(item_mask: int, offset: int) -> int:
+    """Masque d'items d'un instrument (bit i - 1) → bits de poids faible."""
+    return _mask(offset + p for p in range(item_mask.bit_length()) if item_mask >> p & 1)
+
+
+# Bit de poids faible de chaque item (les masques ci-dessous s'appliquent
+# aux bits de poids faible, après décalage éventuel).
+LOW_BITS = _mask(range(N_ITEMS))
+
+# Masques compilés depuis les instruments (aqeq.instrument) : items qui
+# rapportent `points` avec la réponse `resp`, sous-échelles AQ et sections
+# CLASS. Une réponse r (1–4) est codée r - 1.
+AQ_POINT_MASKS = {key: _spread(m, 0) for key, m in AQ.point_masks.items()}
+EQ_POINT_MASKS = {key: _spread(m, AQ_N_ITEMS) for key, m in EQ.point_masks.items()}
+AQ_SUBSCALE_MASKS = {name: _spread(m, 0) for name, m in AQ.subscale_masks.items()}
+CLASS_MASKS = {code: _spread(m, 0) for code, m in AQ.section_masks.items()}
+
+
+# =========================================================
+# ENCODAGE
+# =========================================================
+
+def pack_answers(aq_answers: dict, eq_answers: dict) -> bytes:
+    """
+    Encode des réponses complètes (1–4 pour chacun des 110 items).
+    Lève ValueError si un item manque ou a une valeur hors plage.
+    """
+    value = 0
+    for offset, answers, n_items in ((0, aq_answers, AQ_N_ITEMS), (AQ_N_ITEMS, eq_answers, EQ_N_ITEMS)):
+        for i in range(1, n_items + 1):
+            resp = answers.get(i)
+            if resp not in (1, 2, 3, 4):
+                raise ValueError(f"Réponse manquante ou invalide pour l'item {i} : {resp!r}")
+            value |= (resp - 1) << (2 * (offset + i - 1))
+    return value.to_bytes(PACKED_SIZE, "little")
+
+
+def unpack_answers(blob: bytes):
+    """Inverse de `pack_answers` : renvoie (aq_answers, eq_answers)."""
+    value = int.from_bytes(blob, "little")
+    aq = {i: ((value >> (2 * (i - 1))) & 3) + 1 for i in range(1, AQ_N_ITEMS + 1)}
+    eq = {i: ((value >> (2 * (AQ_N_ITEMS + i - 1))) & 3) + 1 for i in range(1, EQ_N_ITEMS + 1)}
+    return aq, eq
+
+
+def compact_payload(payload: dict) -> dict:
+    """
+    Remplace aq_answers / eq_answers par `answers_packed` (bytes) quand les
+    réponses sont complètes ; sinon renvoie le payload tel quel.
+    """
+    if "answers_packed" in payload or "aq_answers" not in payload:
+        return payload
+    aq = {int(k): v for k, v in payload["aq_answers"].items()}
+    eq = {int(k): v for k, v in payload.get("eq_answers", {}).items()}
+    try:
+        blob = pack_answers(aq, eq)
+    except ValueError:
+        return payload
+    out = {k: v for k, v in payload.items() if k not in ("aq_answers", "eq_answers")}
+    out["answers_packed"] = blob
+    return out
+
+
+def expand_payload(payload: dict) -> dict:
+    """Forme JSON d'export : aq_answers / eq_answers à la place du binaire."""
+    if "answers_packed" not in payload:
+        return payload
+    aq, eq = unpack_answers(payload["answers_packed"])
+    out = {k: v for k, v in payload.items() if k != "answers_packed"}
+    out["aq_answers"] = aq
+    out["eq_answers"] = eq
+    return out
+
+
+# =========================================================
+# COTATION SUR LA FORME COMPACTE
+# =========================================================
+
+def _by_points(value: int, point_masks: dict) -> dict:
+    """
+    {points: bits de poids faible des items qui rapportent ces points}, pour
+    les réponses compactes `value` et les masques d'un instrument.
+    """
+    high = (value >> 1) & LOW_BITS
+    low = value & LOW_BITS
+    # Items dont le code vaut 0, 1, 2, 3 (réponse 1–4).
+    codes = (~high & ~low & LOW_BITS, ~high & low, high & ~low, high & low)
+    out = {}
+    for (resp, points), mask in point_masks.items():
+        out[points] = out.get(points, 0) | (codes[resp - 1] & mask)
+    return out
+
+
+def _weighted(by_points: dict, mask: int) -> int:
+    return sum(points * (bits & mask).bit_count() for points, bits in by_points.items())
+
+
+def score_packed(blob: bytes) -> dict:
+    """
+    Mêmes scores que `score_batch` pour un répondant, sans décodage :
+    aq_score, eq_score, aq_subscales (liste, ordre de AQ_SUBSCALES),
+    class_counts (liste, sections A–D), class_total.
+    """
+    value = int.from_bytes(blob, "little")
+    aq = _by_points(value, AQ_POINT_MASKS)
+    eq = _by_points(value, EQ_POINT_MASKS)
+    class_counts = [_weighted(aq, m) for m in CLASS_MASKS.values()]
+    return {
+        "aq_score": _weighted(aq, LOW_BITS),
+        "eq_score": _weighted(eq, LOW_BITS),
+        "aq_subscales": [_weighted(aq, m) for m in AQ_SUBSCALE_MASKS.values()],
+        "class_counts": class_counts,
+        "class_total": sum(class_counts),
+    }
+
+
+def packed_matrix(blobs):
+    """
+    Décode N réponses compactes en une passe NumPy : renvoie les matrices
+    (N × 50, N × 60) attendues par `score_batch`.
+    """
+    import numpy as np
+
+    raw = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), PACKED_SIZE)
+    codes = (raw[:, :, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    answers = codes.reshape(len(blobs), -1)[:, :N_ITEMS].astype(np.int8) + 1
+    return answers[:, :AQ_N_ITEMS], answers[:, AQ_N_ITEMS:]
@@ -0,0 +1,19 @@
+"""
+Emplacements communs à l'app (app.py) et aux outils qui la lancent ou la
+mesurent (aqeq.serve, aqeq.bench, aqeq.loadtest, API, CLI).
+"""
+
+import os
+
+# Racine du dépôt et script Streamlit.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT_DIR, "app.py")
+
+# Répertoire de données de l'app, relatif au répertoire de lancement :
+# réponses (store par défaut), outbox, mesures, profils.
+DATA_DIR = "data_aq_eq"
+
+
+def default_store() -> str:
+    """URL du store par défaut : $AQEQ_STORE, sinon DATA_DIR."""
+    return os.environ.get("AQEQ_STORE", DATA_DIR)
@@ -0,0 +1,197 @@
+"""
+Traitement par paquets commun aux commandes de aqeq.cli, à l'export
+(aqeq.export), aux rapports en lot (aqeq.reports) et au contrôle
+d'intégrité (aqeq.integrity).
+
+Les enregistrements défilent dans un pipeline de générateurs : lecture
+par paquets (`chunked`), traitement de chaque paquet dans un pool de
+processus (`run_pipeline`, chaque processus ouvrant le store une fois,
+voir `worker_store`), écriture au fil de l'eau en CSV, JSONL ou Parquet
+(`write_rows`). Seuls quelques paquets sont en mémoire à un instant donné.
+"""
+
+import csv
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from aqeq.items import AQ_N_ITEMS, AQ_SUBSCALES, CLASS_SECTIONS, EQ_N_ITEMS, PREREQ_KEYS
+
+IDENTITY_FIELDS = ["patient_code", "patient_id", "sex", "dob", "test_date", "practitioner_code"]
+
+SCORE_FIELDS = (
+    IDENTITY_FIELDS
+    + ["aq_score", "eq_score"]
+    + [f"aq_sub_{n}" for n in range(1, len(AQ_SUBSCALES) + 1)]
+    + [f"class_{k}" for k in CLASS_SECTIONS]
+    + ["class_total", "class_core_ok", "prereq_ok"]
+)
+
+ANSWER_FIELDS = (
+    [f"aq_{i}" for i in range(1, AQ_N_ITEMS + 1)]
+    + [f"eq_{i}" for i in range(1, EQ_N_ITEMS + 1)]
+    + [f"prereq_{k}" for k in PREREQ_KEYS]
+)
+
+# Colonnes entières (scores, réponses) ; toutes les autres sont du texte.
+INTEGER_FIELDS = frozenset(SCORE_FIELDS[len(IDENTITY_FIELDS):]) | frozenset(ANSWER_FIELDS)
+
+
+def chunked(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# =========================================================
+# PROCESSUS DU POOL
+# =========================================================
+
+_worker_store = None
+
+# Store d'un traitement exécuté dans le processus appelant (workers <= 1),
+# propre au thread : deux sessions Streamlit ne se le disputent pas.
+_local = threading.local()
+
+
+def _init_worker(store_url):
+    global _worker_store
+    if store_url is not None:
+        from aqeq.storage import open_store
+
+        _worker_store = open_store(store_url)
+
+
+def worker_store():
+    """
+    Store du traitement en cours : celui passé à `run_pipeline` dans le
+    processus appelant, sinon celui ouvert par `_init_worker` dans le
+    processus du pool.
+    """
+    return getattr(_local, "store", None) or _worker_store
+
+
+def score_rows(payloads, with_answers: bool = False) -> list:
+    """Une ligne de sortie (dict à plat) par payload, cotés en un lot."""
+    from aqeq.packed import packed_matrix
+    from aqeq.scoring import answers_from_payload, answers_matrix, score_batch, scoring_tables
+
+    parsed = [answers_from_payload(p) for p in payloads]
+    if payloads and all("answers_packed" in p for p in payloads):
+        aq_matrix, eq_matrix = packed_matrix([p["answers_packed"] for p in payloads])
+    else:
+        aq_matrix = answers_matrix([aq for aq, _, _ in parsed], AQ_N_ITEMS)
+        eq_matrix = answers_matrix([eq for _, eq, _ in parsed], EQ_N_ITEMS)
+    scores = score_batch(aq_matrix, eq_matrix)
+    core_ok = (scores["class_counts"] >= scoring_tables().class_required).all(axis=1)
+
+    rows = []
+    for n, (payload, (aq, eq, prereq)) in enumerate(zip(payloads, parsed)):
+        row = {f: payload.get(f, "") or "" for f in IDENTITY_FIELDS}
+        row["aq_score"] = int(scores["aq_score"][n])
+        row["eq_score"] = int(scores["eq_score"][n])
+        for j, value in enumerate(scores["aq_subscales"][n], start=1):
+            row[f"aq_sub_{j}"] = int(value)
+        for key, value in zip(CLASS_SECTIONS, scores["class_counts"][n]):
+            row[f"class_{key}"] = int(value)
+        row["class_total"] = int(scores["class_total"][n])
+        row["class_core_ok"] = int(core_ok[n])
+        row["prereq_ok"] = int(all(prereq.values()))
+        if with_answers:
+            row.update({f"aq_{i}": aq.get(i) for i in range(1, AQ_N_ITEMS + 1)})
+            row.update({f"eq_{i}": eq.get(i) for i in range(1, EQ_N_ITEMS + 1)})
+            row.update({f"prereq_{k}": int(v) for k, v in prereq.items()})
+        rows.append(row)
+    return rows
+
+
+def run_pipeline(chunks, func, option, workers: int, store=None):
+    """
+    Applique `func(paquet, option)` à chaque paquet et itère sur les lignes
+    produites, dans l'ordre d'entrée. Au plus 2 × workers paquets sont en
+    vol à la fois.
+
+    `store` (URL ou store ouvert) est rendu par `worker_store()`. Dans le
+    processus appelant (workers <= 1), un store ouvert est utilisé tel quel
+    et une URL est ouverte puis refermée à la fin ; le pool de processus
+    demande une URL, ouverte une fois par processus.
+    """
+    if workers <= 1:
+        from aqeq.storage import open_store
+
+        opened = open_store(store) if isinstance(store, str) else None
+        previous = getattr(_local, "store", None)
+        _local.store = opened or store
+        try:
+            for chunk in chunks:
+                yield from func(chunk, option)
+        finally:
+            _local.store = previous
+            if opened is not None:
+                opened.close()
+        return
+
+    if store is not None and not isinstance(store, str):
+        raise ValueError("Le pool de processus nécessite l'URL du store, pas un store ouvert.")
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(store,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk, option))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+# =========================================================
+# ÉCRITURE
+# =========================================================
+
+def _format_of(path: str, fmt: str = None) -> str:
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"jsonl": "jsonl", "ndjson": "jsonl", "parquet": "parquet"}.get(ext, "csv")
+
+
+def write_rows(rows, path: str, fields, fmt: str = None, chunk_size: int = 5000) -> int:
+    """
+    Écrit les lignes au fil de l'eau ; renvoie le nombre de lignes. Le
+    fichier est toujours créé, avec ses colonnes, même sans aucune ligne.
+    """
+    fmt = _format_of(path, fmt)
+    n = 0
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("La sortie Parquet nécessite pyarrow (pip install -r requirements-export.txt).")
+        # Schéma fixé par `fields` et non déduit du premier paquet : un
+        # export vide a ses colonnes, et une colonne vide d'un paquet ne
+        # change pas de type d'un paquet à l'autre.
+        schema = pa.schema([(f, pa.int64() if f in INTEGER_FIELDS else pa.string()) for f in fields])
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunked(rows, chunk_size):
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                n += len(chunk)
+        return n
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "jsonl":
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                n += 1
+        else:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                n += 1
+    return n
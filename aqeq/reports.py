@@ -0,0 +1,300 @@
+"""
+Rapports praticien autonomes (HTML, PDF) pour un code ou pour un lot.
+
+    python -m aqeq report ABCD1234 -o rapport.html
+    python -m aqeq report --practitioner P1 -o rapports.zip [--format pdf]
+
+Le gabarit (aqeq/templates/report.html, string.Template) est lu et compilé
+une seule fois par processus. Le HTML produit embarque sa feuille de style :
+il s'ouvre et s'imprime sans dépendance externe.
+
+`result_view` prépare la page de résultats de l'espace praticien (fragments
+Markdown, lignes des tableaux) ; l'app la garde dans un cache adressé par
+contenu (`view_key`) et ne la reconstruit pas à chaque consultation. Le
+rapport HTML n'en fait pas partie : il n'est rendu qu'au téléchargement.
+
+Le PDF est rendu localement par WeasyPrint s'il est installé, sinon par
+l'exécutable wkhtmltopdf. Les lots sont rendus dans un pool de processus
+(voir aqeq.pipeline.run_pipeline) et écrits au fil de l'eau dans une archive zip.
+"""
+
+import hashlib
+import html
+import json
+import os
+import shutil
+import subprocess
+import zipfile
+from functools import lru_cache
+from string import Template
+
+from aqeq.items import ANSWER_LABELS, AQ_N_ITEMS, AQ_SUBSCALES, EQ_N_ITEMS
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+DSM_TITLES = {
+    "A": "A. Trouble qualitatif de l’interaction sociale",
+    "B": "B. Intérêts restreints et répétitifs",
+    "C": "C. Communication",
+    "D": "D. Imagination",
+}
+
+PREREQ_LABELS = {
+    "E": "présent depuis l’enfance",
+    "F": "impact significatif",
+    "G": "pas de retard langage",
+    "H": "pas de trouble apprentissage majeur",
+    "I": "pas de traits psychotiques",
+}
+
+FORMATS = ("html", "pdf")
+
+# Version de la forme de `result_view` : à incrémenter quand les fragments
+# changent, pour que les vues déjà en cache soient reconstruites.
+VIEW_VERSION = 2
+
+
+@lru_cache(maxsize=None)
+def template(name: str = "report.html") -> Template:
+    with open(os.path.join(TEMPLATES_DIR, name), "r", encoding="utf-8") as f:
+        return Template(f.read())
+
+
+def _e(value) -> str:
+    return html.escape(str(value if value is not None else ""))
+
+
+def _row(*cells) -> str:
+    return "  <tr>" + "".join(f"<td>{_e(c)}</td>" for c in cells) + "</tr>"
+
+
+# =========================================================
+# RENDU D'UN RAPPORT
+# =========================================================
+
+def render_html(payload: dict) -> str:
+    """Rapport HTML complet d'une réponse enregistrée."""
+    from aqeq.scoring import answers_from_payload, compute_derived, derived_is_current, derived_texts
+
+    aq, eq, prereq = answers_from_payload(payload)
+    derived = payload.get("derived")
+    if not derived_is_current(derived):
+        derived = compute_derived(aq, eq, prereq)
+    texts = derived_texts(derived, prereq)
+
+    dsm = []
+    for key, title in DSM_TITLES.items():
+        phrases = texts["dsm_blocks"].get(key) or []
+        dsm.append(f"<h3>{_e(title)}</h3>")
+        if phrases:
+            dsm.append("<ul>" + "".join(f"<li>{_e(p)}</li>" for p in phrases) + "</ul>")
+        else:
+            dsm.append('<p class="muted">Aucun item significatif.</p>')
+
+    counts = texts["class_counts"]
+    class_rows = [
+        _row(key, counts[key]["label"], counts[key]["required"], counts[key]["observed"], counts[key]["max_items"])
+        for key in ("A", "B", "C", "D")
+    ]
+    tot = counts["TOTAL"]
+    class_rows.append(_row("Total", tot["label"], tot["required"], tot["observed"], tot["max_items"]))
+
+    prereq_items = [
+        f"  <li><b>{k}</b> : {_e(label)} – {'✅ Oui' if prereq.get(k) else '❌ Non'}</li>"
+        for k, label in PREREQ_LABELS.items()
+    ]
+
+    answer_rows = [
+        _row(
+            i,
+            ANSWER_LABELS.get(aq.get(i), "") if i <= AQ_N_ITEMS else "",
+            ANSWER_LABELS.get(eq.get(i), ""),
+        )
+        for i in range(1, max(AQ_N_ITEMS, EQ_N_ITEMS) + 1)
+    ]
+
+    summary = "".join(f"<p>{_e(part)}</p>" for part in texts["class_summary"].split("\n\n"))
+
+    return template().substitute(
+        patient_code=_e(payload.get("patient_code")),
+        patient_id=_e(payload.get("patient_id")),
+        sex=_e(payload.get("sex")),
+        dob=_e(payload.get("dob")),
+        test_date=_e(payload.get("test_date")),
+        practitioner_code=_e(payload.get("practitioner_code")),
+        aq_score=derived["aq_score"],
+        eq_score=derived["eq_score"],
+        subscale_rows="\n".join(
+            _row(name, derived["aq_subscales"][name], len(items)) for name, items in AQ_SUBSCALES.items()
+        ),
+        dsm_blocks="\n".join(dsm),
+        class_rows="\n".join(class_rows),
+        prereq_items="\n".join(prereq_items),
+        class_summary=summary,
+        answer_rows="\n".join(answer_rows),
+        rules_version=derived["rules_version"],
+    )
+
+
+# =========================================================
+# VUE PRATICIEN
+# =========================================================
+
+def view_key(payload: dict) -> str:
+    """
+    Adresse de la vue d'une réponse : empreinte SHA-256 de son contenu
+    enregistré (hors "derived", forme compacte), des règles de cotation et
+    de VIEW_VERSION. Une réponse modifiée, ou relue sous d'autres règles,
+    change d'adresse : rien n'est à invalider.
+    """
+    from aqeq.packed import compact_payload
+    from aqeq.scoring import SCORING_RULES_VERSION
+
+    content = compact_payload({k: v for k, v in payload.items() if k != "derived"})
+    text = json.dumps(
+        [SCORING_RULES_VERSION, VIEW_VERSION, content],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=lambda value: value.hex(),
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def result_view(payload: dict) -> dict:
+    """
+    Page de résultats d'une réponse, prête à afficher :
+
+        subscales, class_rows       lignes des tableaux (listes de dicts)
+        analysis, prereq, summary   Markdown (blocs DSM, pré-requis, synthèse)
+        aq_answers, eq_answers      tableaux des réponses, par colonnes
+
+    Les valeurs sont du JSON simple : la vue se met en cache telle quelle.
+    Le rapport téléchargeable se rend à part (`render_html`).
+    """
+    from aqeq.scoring import answers_from_payload, compute_derived, derived_is_current, derived_texts
+
+    aq, eq, prereq = answers_from_payload(payload)
+    derived = payload.get("derived")
+    if not derived_is_current(derived):
+        derived = compute_derived(aq, eq, prereq)
+    texts = derived_texts(derived, prereq)
+
+    analysis = ["### Analyse qualitative – blocs DSM / CLASS CLINIC"]
+    for key, title in DSM_TITLES.items():
+        phrases = texts["dsm_blocks"].get(key) or []
+        analysis.append(f"#### {title}")
+        analysis.append("\n".join(f"- {p}" for p in phrases) if phrases else "_Aucun item significatif._")
+
+    counts = texts["class_counts"]
+    class_rows = [
+        {
+            "Section": "Total" if key == "TOTAL" else key,
+            "Domaine": counts[key]["label"],
+            "Nb requis": counts[key]["required"],
+            "Nb observés": counts[key]["observed"],
+            "Nb items possibles": counts[key]["max_items"],
+        }
+        for key in ("A", "B", "C", "D", "TOTAL")
+    ]
+
+    prereq_md = ["### Pré-requis (réponses du patient)"] + [
+        f"- **{k}** : {label} – {'✅ Oui' if prereq.get(k) else '❌ Non'}"
+        for k, label in PREREQ_LABELS.items()
+    ]
+
+    return {
+        "subscales": [
+            {"Sous-échelle": name, "Score": derived["aq_subscales"][name], "Max": len(items)}
+            for name, items in AQ_SUBSCALES.items()
+        ],
+        "analysis": "\n\n".join(analysis),
+        "class_rows": class_rows,
+        "prereq": prereq_md[0] + "\n\n" + "\n".join(prereq_md[1:]),
+        "summary": "### Synthèse clinique automatique\n\n"
+        + texts["class_summary"].replace("\n\n", "\n\n---\n\n"),
+        "aq_answers": {"Item": sorted(aq), "Réponse": [ANSWER_LABELS.get(aq[i], str(aq[i])) for i in sorted(aq)]},
+        "eq_answers": {"Item": sorted(eq), "Réponse": [ANSWER_LABELS.get(eq[i], str(eq[i])) for i in sorted(eq)]},
+    }
+
+
+# =========================================================
+# PDF
+# =========================================================
+
+def pdf_engine():
+    """
+    Fonction HTML → PDF locale : WeasyPrint, sinon wkhtmltopdf. Lève
+    RuntimeError si aucun des deux n'est disponible.
+    """
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        pass
+    else:
+        return lambda document: HTML(string=document).write_pdf()
+
+    exe = shutil.which("wkhtmltopdf")
+    if exe is None:
+        raise RuntimeError(
+            "La sortie PDF nécessite WeasyPrint (pip install -r requirements-reports.txt) ou wkhtmltopdf."
+        )
+    return lambda document: subprocess.run(
+        [exe, "--quiet", "--encoding", "utf-8", "-", "-"],
+        input=document.encode("utf-8"),
+        capture_output=True,
+        check=True,
+    ).stdout
+
+
+def html_to_pdf(document: str) -> bytes:
+    return pdf_engine()(document)
+
+
+def render_report(payload: dict, fmt: str = "html") -> bytes:
+    document = render_html(payload)
+    if fmt == "pdf":
+        return html_to_pdf(document)
+    return document.encode("utf-8")
+
+
+# =========================================================
+# LOTS
+# =========================================================
+
+def _render_codes(codes, fmt):
+    """Exécuté dans les processus du pool : (nom de fichier, contenu) par code."""
+    from aqeq.pipeline import worker_store
+
+    store = worker_store()
+    out = []
+    for code in codes:
+        payload = store.load(code)
+        if payload is not None:
+            out.append((f"{code}.{fmt}", render_report(payload, fmt)))
+    return out
+
+
+def write_archive(fileobj, codes, store, fmt: str = "html", workers: int = 1, chunk_size: int = 50) -> int:
+    """
+    Écrit dans `fileobj` (chemin ou fichier binaire) une archive zip des
+    rapports de `codes`, rendus en parallèle. `store` : URL, ou store déjà
+    ouvert pour un rendu dans le processus courant (workers = 1). Renvoie
+    le nombre de rapports.
+    """
+    from aqeq.pipeline import chunked, run_pipeline
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Format de rapport inconnu : {fmt!r}")
+    if fmt == "pdf":
+        # Échouer tout de suite plutôt que dans chaque processus.
+        pdf_engine()
+    n = 0
+    # Les PDF sont déjà compressés : inutile de les recompresser.
+    compression = zipfile.ZIP_STORED if fmt == "pdf" else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(fileobj, "w", compression=compression) as archive:
+        for name, content in run_pipeline(chunked(codes, chunk_size), _render_codes, fmt, workers, store):
+            archive.writestr(name, content)
+            n += 1
+    return n
+
@@ -0,0 +1,347 @@
+"""
+Cotation AQ / EQ / CLASS CLINIC, sans Streamlit ni effet de bord.
+
+Les fonctions par répondant (score_aq_officiel, score_eq_officiel, ...)
+sont de fines enveloppes autour de `score_batch`, qui cote N répondants
+en une passe NumPy. NumPy et les tables de cotation ne sont chargés qu'au
+premier calcul : importer ce module ne coûte que quelques millisecondes.
+"""
+
+from functools import lru_cache
+from types import SimpleNamespace
+
+from aqeq.items import (
+    ANSWER_LABELS,
+    AQ,
+    AQ_ITEMS,
+    AQ_N_ITEMS,
+    AQ_SUBSCALES,
+    CLASS_SECTIONS,
+    EQ,
+    EQ_N_ITEMS,
+    PREREQ_KEYS,
+)
+from aqeq.norms import age_band
+from aqeq.packed import compact_payload, score_packed, unpack_answers
+
+# À incrémenter à chaque modification du code de cotation ou de la forme
+# des sections "derived" (les textes, rédigés à l'affichage, relèvent de
+# VIEW_VERSION dans aqeq.reports). Les fichiers d'instruments entrent dans
+# la version des règles par leur `version` et leur empreinte : modifier un
+# barème, une sous-échelle ou une section suffit à faire recalculer les
+# sections "derived" (et les vues, voir aqeq.reports) à leur prochaine
+# consultation, en mémoire ; `python -m aqeq rescore` les réenregistre.
+RULES_REVISION = 2
+SCORING_RULES_VERSION = "/".join(
+    [str(RULES_REVISION)] + [f"{i.id}@{i.version}.{i.digest}" for i in (AQ, EQ)]
+)
+
+
+# =========================================================
+# COTATION PAR RÉPONDANT
+# =========================================================
+
+def is_aq_autistic(item: int, resp: int) -> bool:
+    return AQ.item_points(item, resp) > 0
+
+
+def score_aq_officiel(aq_answers: dict) -> int:
+    return int(score_batch(answers_matrix([aq_answers], AQ_N_ITEMS))["aq_score"][0])
+
+
+def score_aq_subscales(aq_answers):
+    counts = score_batch(answers_matrix([aq_answers], AQ_N_ITEMS))["aq_subscales"][0]
+    return {name: int(n) for name, n in zip(AQ_SUBSCALES, counts)}
+
+
+def score_eq_officiel(eq_answers: dict) -> int:
+    return int(score_batch(eq_matrix=answers_matrix([eq_answers], EQ_N_ITEMS))["eq_score"][0])
+
+
+def build_dsm_blocks(aq_answers):
+    import numpy as np
+
+    points = score_batch(answers_matrix([aq_answers], AQ_N_ITEMS))["aq_points"][0]
+    return _dsm_blocks(np.flatnonzero(points) + 1)
+
+
+def _dsm_blocks(flagged) -> dict:
+    """Énoncés des items AQ cotés (`flagged`), par section CLASS CLINIC."""
+    flagged = set(int(item) for item in flagged)
+    return {
+        key: [f"{AQ_ITEMS[item]} (AQ{item})" for item in sorted(sec["items"]) if item in flagged]
+        for key, sec in CLASS_SECTIONS.items()
+    }
+
+
+def compute_class_clinic_counts(aq_answers):
+    observed = score_batch(answers_matrix([aq_answers], AQ_N_ITEMS))["class_counts"][0]
+    return class_counts_from_row(observed)
+
+
+def class_counts_from_row(observed):
+    """Met en forme une ligne de `score_batch()["class_counts"]`."""
+    out = {}
+    total_obs = 0
+
+    for (key, sec), obs in zip(CLASS_SECTIONS.items(), observed):
+        obs = int(obs)
+        total_obs += obs
+        out[key] = {
+            "label": sec["label"],
+            "required": sec["required"],
+            "observed": obs,
+            "max_items": len(sec["items"]),
+        }
+
+    out["TOTAL"] = {
+        "label": "Total A+B+C+D",
+        "required": 10,
+        "observed": total_obs,
+        "max_items": 18,
+    }
+
+    return out
+
+
+def build_class_clinic_summary(section_counts, prereq_flags):
+    core_ok = all(
+        section_counts[s]["observed"] >= section_counts[s]["required"]
+        for s in ["A", "B", "C", "D"]
+    )
+    prereq_ok = all(prereq_flags.values())
+
+    msg = []
+
+    titles = {"A": "Social", "B": "Intérêts restreints", "C": "Communication", "D": "Imagination"}
+    for key, title in titles.items():
+        sec = section_counts[key]
+        msg.append(f"{key}: {title} – {sec['observed']} symptômes (≥ {sec['required']}).")
+    msg.append(f"Total A+B+C+D : {section_counts['TOTAL']['observed']} symptômes (seuil = 10).")
+
+    if core_ok and prereq_ok:
+        msg.append(
+            "➡️ Ensemble des critères principaux + prérequis cochés : profil compatible "
+            "avec un fonctionnement du spectre autistique "
+            "(à confirmer cliniquement, ce résultat n'étant pas un diagnostic)."
+        )
+    elif core_ok and not prereq_ok:
+        msg.append(
+            "➡️ Critères A–D atteints, mais prérequis non tous remplis "
+            "(selon les réponses du patient). Interprétation clinique prudente."
+        )
+    elif not core_ok and prereq_ok:
+        msg.append(
+            "➡️ Pré-requis cochés mais critères A–D partiellement atteints : "
+            "traits ou particularités possibles, sans réunir tous les critères."
+        )
+    else:
+        msg.append(
+            "➡️ Ni les critères ni les prérequis ne sont réunis : particularités possibles "
+            "mais non compatibles avec le tableau complet."
+        )
+
+    return "\n\n".join(msg)
+
+
+# =========================================================
+# COTATION PAR LOTS (NumPy)
+# =========================================================
+# Les réponses sont des matrices d'entiers (N × 50 pour l'AQ, N × 60 pour
+# l'EQ) : colonne j = item j + 1, valeur 1–4 = ANSWER_LABELS, 0 = sans
+# réponse. Toute la cotation se fait par consultation des tables
+# item × réponse → points compilées depuis les fichiers d'instruments.
+
+@lru_cache(maxsize=None)
+def scoring_tables() -> SimpleNamespace:
+    """Tables de cotation NumPy des instruments AQ-50 et EQ-60."""
+    return SimpleNamespace(
+        aq_points=AQ.points_table,
+        eq_points=EQ.points_table,
+        aq_subscale_matrix=AQ.subscale_matrix,
+        class_matrix=AQ.section_matrix,
+        class_required=AQ.section_required,
+    )
+
+
+def answers_matrix(answers_list, n_items: int):
+    """
+    Convertit une liste de dictionnaires {item: réponse} en matrice
+    N × n_items. Les items absents, hors plage ou sans réponse valent 0.
+    """
+    import numpy as np
+
+    m = np.zeros((len(answers_list), n_items), dtype=np.int8)
+    for row, answers in enumerate(answers_list):
+        for item, resp in answers.items():
+            if 1 <= item <= n_items and resp in ANSWER_LABELS:
+                m[row, item - 1] = resp
+    return m
+
+
+def _lookup(points, matrix):
+    import numpy as np
+
+    matrix = np.asarray(matrix)
+    if matrix.ndim != 2 or matrix.shape[1] != points.shape[0]:
+        raise ValueError(
+            f"Matrice de réponses attendue de forme (N, {points.shape[0]}), reçue {matrix.shape}"
+        )
+    valid = (matrix >= 1) & (matrix <= 4)
+    idx = np.where(valid, matrix, 0).astype(np.intp)
+    return points[np.arange(points.shape[0]), idx]
+
+
+def score_batch(aq_matrix=None, eq_matrix=None) -> dict:
+    """
+    Cote N répondants en une passe.
+
+    Renvoie un dictionnaire de tableaux NumPy :
+      - aq_score (N,), aq_subscales (N × 5, ordre de AQ_SUBSCALES),
+        class_counts (N × 4, sections A–D), class_total (N,) et
+        aq_points (N × 50, points de chaque item) si `aq_matrix` est fourni ;
+      - eq_score (N,) si `eq_matrix` est fourni.
+    """
+    tables = scoring_tables()
+    out = {}
+    if aq_matrix is not None:
+        autistic = _lookup(tables.aq_points, aq_matrix)
+        out["aq_points"] = autistic
+        out["aq_score"] = autistic.sum(axis=1)
+        out["aq_subscales"] = autistic @ tables.aq_subscale_matrix
+        out["class_counts"] = autistic @ tables.class_matrix
+        out["class_total"] = out["class_counts"].sum(axis=1)
+    if eq_matrix is not None:
+        out["eq_score"] = _lookup(tables.eq_points, eq_matrix).sum(axis=1)
+    return out
+
+
+# =========================================================
+# SCORES DÉRIVÉS + RÉSUMÉS
+# =========================================================
+
+def answers_from_payload(data: dict):
+    """Réponses AQ/EQ (clés entières) et prérequis d'un payload enregistré."""
+    if "answers_packed" in data:
+        aq_answers, eq_answers = unpack_answers(data["answers_packed"])
+    else:
+        aq_answers = {int(k): int(v) for k, v in data["aq_answers"].items()}
+        eq_answers = {int(k): int(v) for k, v in data["eq_answers"].items()}
+    prereq_data = data.get("prereq", {})
+    prereq_flags = {k: bool(prereq_data.get(k, False)) for k in PREREQ_KEYS}
+    return aq_answers, eq_answers, prereq_flags
+
+
+def compute_derived(aq_answers: dict, eq_answers: dict, prereq_flags: dict) -> dict:
+    """
+    Résultats chiffrés d'une réponse, prêts à être stockés en JSON (une
+    seule passe de `score_batch`) :
+
+        aq_score, eq_score, class_total
+        aq_subscales   {sous-échelle: score}
+        class_counts   {section: items observés}
+        aq_flagged     items AQ cotés, par ordre croissant
+        class_core_ok, prereq_ok   0 / 1
+
+    Les textes (blocs DSM, synthèse CLASS) sont rédigés à l'affichage par
+    `derived_texts`.
+    """
+    import numpy as np
+
+    scores = score_batch(
+        answers_matrix([aq_answers], AQ_N_ITEMS),
+        answers_matrix([eq_answers], EQ_N_ITEMS),
+    )
+    counts = scores["class_counts"][0]
+    return {
+        "rules_version": SCORING_RULES_VERSION,
+        "aq_score": int(scores["aq_score"][0]),
+        "eq_score": int(scores["eq_score"][0]),
+        "aq_subscales": {name: int(n) for name, n in zip(AQ_SUBSCALES, scores["aq_subscales"][0])},
+        "class_counts": {key: int(n) for key, n in zip(CLASS_SECTIONS, counts)},
+        "class_total": int(scores["class_total"][0]),
+        "aq_flagged": (np.flatnonzero(scores["aq_points"][0]) + 1).tolist(),
+        "class_core_ok": int((counts >= scoring_tables().class_required).all()),
+        "prereq_ok": int(all(prereq_flags.get(k, False) for k in PREREQ_KEYS)),
+    }
+
+
+def derived_texts(derived: dict, prereq_flags: dict) -> dict:
+    """
+    Textes de l'espace praticien à partir d'une section "derived" :
+    dsm_blocks ({section: [énoncés]}), class_counts (tableau CLASS CLINIC
+    détaillé, voir `class_counts_from_row`) et class_summary.
+    """
+    blocks = _dsm_blocks(derived["aq_flagged"])
+    class_counts = class_counts_from_row([derived["class_counts"][key] for key in CLASS_SECTIONS])
+    return {
+        "dsm_blocks": blocks,
+        "class_counts": class_counts,
+        "class_summary": build_class_clinic_summary(class_counts, prereq_flags),
+    }
+
+
+def derived_is_current(derived) -> bool:
+    return bool(derived) and derived.get("rules_version") == SCORING_RULES_VERSION
+
+
+def summary_from_derived(payload: dict, derived: dict) -> dict:
+    """Résumé de scores (voir aqeq.index) d'un payload à jour."""
+    prereq = payload.get("prereq", {})
+    return {
+        "patient_code": payload.get("patient_code", ""),
+        "practitioner_code": payload.get("practitioner_code", "") or "",
+        "patient_id": payload.get("patient_id", "") or "",
+        "sex": payload.get("sex", "") or "",
+        "test_date": payload.get("test_date", "") or "",
+        "age_band": age_band(payload.get("dob"), payload.get("test_date")),
+        "aq_score": derived["aq_score"],
+        "eq_score": derived["eq_score"],
+        "class_total": derived["class_total"],
+        "class_core_ok": derived["class_core_ok"],
+        "prereq_ok": int(all(bool(prereq.get(k, False)) for k in PREREQ_KEYS)),
+        "answers_packed": compact_payload(payload).get("answers_packed"),
+    }
+
+
+def summarize_responses(payloads) -> list:
+    """Résumés de scores (voir aqeq.index) pour une liste de payloads, cotés par lot."""
+    if payloads and all("answers_packed" in p for p in payloads):
+        # Réponses compactes : cotation par comptage de bits, sans NumPy.
+        rows = [score_packed(p["answers_packed"]) for p in payloads]
+    else:
+        parsed = [answers_from_payload(p) for p in payloads]
+        scores = score_batch(
+            answers_matrix([aq for aq, _, _ in parsed], AQ_N_ITEMS),
+            answers_matrix([eq for _, eq, _ in parsed], EQ_N_ITEMS),
+        )
+        keys = ("aq_score", "eq_score", "class_counts", "class_total")
+        rows = [{key: scores[key][n].tolist() for key in keys} for n in range(len(payloads))]
+
+    required = [sec["required"] for sec in CLASS_SECTIONS.values()]
+    out = []
+    for payload, row in zip(payloads, rows):
+        prereq = payload.get("prereq", {})
+        out.append({
+            "patient_code": payload.get("patient_code", ""),
+            "practitioner_code": payload.get("practitioner_code", "") or "",
+            "patient_id": payload.get("patient_id", "") or "",
+            "sex": payload.get("sex", "") or "",
+            "test_date": payload.get("test_date", "") or "",
+            "age_band": age_band(payload.get("dob"), payload.get("test_date")),
+            "aq_score": row["aq_score"],
+            "eq_score": row["eq_score"],
+            "class_total": row["class_total"],
+            "class_core_ok": int(all(o >= r for o, r in zip(row["class_counts"], required))),
+            "prereq_ok": int(all(bool(prereq.get(k, False)) for k in PREREQ_KEYS)),
+            "answers_packed": compact_payload(payload).get("answers_packed"),
+        })
+    return out
+
+
+def response_summary(payload: dict) -> dict:
+    """Résumé de scores d'un payload, depuis "derived" s'il est à jour."""
+    derived = payload.get("derived")
+    if derived_is_current(derived):
+        return summary_from_derived(payload, derived)
+    return summarize_responses([payload])[0]
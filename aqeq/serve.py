@@ -0,0 +1,261 @@
+"""
+Service multi-processus : plusieurs serveurs Streamlit derrière un proxy
+local à sessions persistantes.
+
+    python -m aqeq.serve --workers 4 --port 8501 [--store sqlite:data_aq_eq.db]
+
+Chaque processus exécute app.py sur son propre port (--backend-port,
+--backend-port + 1, …, sur 127.0.0.1) : les réexécutions ne se disputent
+plus un seul GIL. Le proxy écoute sur --port et rattache chaque navigateur
+à un processus par un cookie `aqeq_worker`, posé sur la première réponse :
+la session Streamlit (websocket /_stcore/stream) et son session_state
+restent dans le même processus. Un nouveau navigateur va au processus qui
+a le moins de connexions ouvertes ; si son processus ne répond plus, il est
+rattaché à un autre (la session repart de zéro).
+
+Partagé entre les processus :
+  - le store (AQEQ_STORE) : fichiers publiés atomiquement, création
+    exclusive par lien, ou SQLite en mode WAL ; l'index des résumés et les
+    normes sont des bases SQLite à transactions courtes ;
+  - le cache des réponses relues et cotées : en plus du LRU de chaque
+    processus, un cache SQLite commun (AQEQ_SHARED_CACHE, voir
+    aqeq.cache.SharedCache), qui garde aussi les pages de résultats
+    praticien déjà construites ;
+  - l'outbox des emails (réclamation des messages par renommage).
+
+Chaque processus écrit ses mesures dans son propre fichier
+(`_metrics.worker<N>.prom`). Un processus qui s'arrête est relancé.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from aqeq.paths import APP_PATH, DATA_DIR
+
+COOKIE = "aqeq_worker"
+
+# Taille maximale d'un en-tête HTTP lu par le proxy.
+MAX_HEAD = 64 * 1024
+
+_UNAVAILABLE = b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+def _cookie_worker(head: bytes, n_workers: int):
+    """Numéro de processus porté par le cookie de la requête, ou None."""
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() != b"cookie":
+            continue
+        for pair in value.split(b";"):
+            key, _, val = pair.strip().partition(b"=")
+            if key == COOKIE.encode() and val.isdigit() and int(val) < n_workers:
+                return int(val)
+    return None
+
+
+def _with_cookie(head: bytes, worker: int) -> bytes:
+    """En-tête de réponse complété du cookie de rattachement."""
+    cookie = f"Set-Cookie: {COOKIE}={worker}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+    return head[:-2] + cookie + b"\r\n"
+
+
+# =========================================================
+# PROXY
+# =========================================================
+
+class StickyProxy:
+    """Proxy TCP/HTTP à sessions persistantes (voir module)."""
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+        self.active = [0] * len(self.backends)
+
+    def _candidates(self, preferred):
+        by_load = sorted(range(len(self.backends)), key=lambda k: self.active[k])
+        if preferred is None:
+            return by_load
+        return [preferred] + [k for k in by_load if k != preferred]
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+
+        preferred = _cookie_worker(head, len(self.backends))
+        for worker in self._candidates(preferred):
+            try:
+                backend_reader, backend_writer = await asyncio.open_connection(*self.backends[worker])
+                break
+            except OSError:
+                continue
+        else:
+            client_writer.write(_UNAVAILABLE)
+            client_writer.close()
+            return
+
+        self.active[worker] += 1
+        try:
+            backend_writer.write(head)
+            set_cookie = worker if worker != preferred else None
+            await asyncio.gather(
+                self._pipe(client_reader, backend_writer),
+                self._pipe(backend_reader, client_writer, set_cookie),
+            )
+        finally:
+            self.active[worker] -= 1
+            for writer in (backend_writer, client_writer):
+                writer.close()
+
+    @staticmethod
+    async def _pipe(reader, writer, set_cookie=None):
+        """Recopie un sens de la connexion ; pose le cookie sur la première réponse."""
+        try:
+            if set_cookie is not None:
+                head = await reader.readuntil(b"\r\n\r\n")
+                writer.write(_with_cookie(head, set_cookie))
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            # Une extrémité fermée : on ferme aussi l'autre sens.
+            writer.close()
+
+
+# =========================================================
+# PROCESSUS STREAMLIT
+# =========================================================
+
+class Worker:
+    """Un serveur Streamlit sur 127.0.0.1:`port`, relancé s'il s'arrête."""
+
+    def __init__(self, number: int, port: int, env: dict, extra_args=()):
+        self.number = number
+        self.port = port
+        self.env = env
+        self.extra_args = list(extra_args)
+        self.process = None
+        self.restarts = 0
+
+    def start(self):
+        cmd = [
+            sys.executable, "-m", "streamlit", "run", APP_PATH,
+            "--server.address", "127.0.0.1",
+            "--server.port", str(self.port),
+            "--server.headless", "true",
+            *self.extra_args,
+        ]
+        self.process = subprocess.Popen(cmd, env=self.env)
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout: float = 10.0):
+        if not self.alive():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def worker_env(number: int, store_url: str = None, shared_cache: str = None) -> dict:
+    env = dict(os.environ)
+    if store_url:
+        env["AQEQ_STORE"] = store_url
+    if shared_cache:
+        env["AQEQ_SHARED_CACHE"] = shared_cache
+    env["AQEQ_METRICS_FILE"] = os.path.join(DATA_DIR, f"_metrics.worker{number}.prom")
+    return env
+
+
+async def _wait_ready(port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        writer.close()
+        return True
+    return False
+
+
+async def _supervise(workers, interval: float = 1.0):
+    """Relance les processus arrêtés (délai croissant s'ils échouent en boucle)."""
+    while True:
+        await asyncio.sleep(interval)
+        for w in workers:
+            if not w.alive():
+                w.restarts += 1
+                print(f"processus {w.number} arrêté (code {w.process.returncode}), relance", file=sys.stderr)
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** min(w.restarts, 6)))
+                w.start()
+
+
+async def serve(workers, host: str, port: int, ready_timeout: float = 60.0):
+    for w in workers:
+        w.start()
+    for w in workers:
+        if not await _wait_ready(w.port, ready_timeout):
+            raise RuntimeError(f"Le processus {w.number} (port {w.port}) ne répond pas.")
+
+    proxy = StickyProxy(("127.0.0.1", w.port) for w in workers)
+    server = await asyncio.start_server(proxy.handle, host, port, limit=MAX_HEAD)
+    print(f"{len(workers)} processus prêts → http://{host}:{port}", file=sys.stderr)
+    supervisor = asyncio.create_task(_supervise(workers))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # pragma: no cover - Windows
+            pass
+    async with server:
+        await stop.wait()
+    supervisor.cancel()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m aqeq.serve")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processus Streamlit")
+    parser.add_argument("--host", default="127.0.0.1", help="adresse d'écoute du proxy")
+    parser.add_argument("--port", type=int, default=8501, help="port du proxy")
+    parser.add_argument("--backend-port", type=int, default=8600, help="port du premier processus")
+    parser.add_argument("--store", help="store partagé (défaut : $AQEQ_STORE ou data_aq_eq)")
+    parser.add_argument("--shared-cache", default=os.path.join(DATA_DIR, "_cache.sqlite3"),
+                        help="cache SQLite commun des réponses ('' pour le désactiver)")
+    parser.add_argument("streamlit_args", nargs="*", help="options passées à streamlit run (après --)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    workers = [
+        Worker(n, args.backend_port + n, worker_env(n, args.store, args.shared_cache), args.streamlit_args)
+        for n in range(args.workers)
+    ]
+    try:
+        asyncio.run(serve(workers, args.host, args.port))
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+    finally:
+        for w in workers:
+            w.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
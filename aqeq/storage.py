@@ -0,0 +1,1018 @@
+"""
+Stockage des réponses.
+
+Trois implémentations interchangeables :
+  - FileStore   : un fichier JSON par code patient, réparti en
+                  sous-répertoires AB/CD/ (utilisé par défaut ; les
+                  fichiers de l'ancienne disposition à plat restent lus) ;
+  - PackStore   : les mêmes JSON ajoutés à la suite dans des segments,
+                  avec un index des positions en mémoire ;
+  - SQLiteStore : base SQLite embarquée (mode WAL) indexée sur le code
+                  patient, le code praticien et la date de passation.
+
+Chacun porte un `index` (voir aqeq.index.SummaryIndex) des scores
+calculés à l'enregistrement, pour le tableau de bord praticien, les
+`norms` de la population (voir aqeq.norms.NormsIndex), la `timeline`
+des passations successives d'un répondant (voir aqeq.timeline) et un
+journal des brouillons (questionnaires en cours, un delta par page).
+
+Les réponses complètes sont stockées sous forme compacte (28 octets, voir
+aqeq.packed) : en base64 dans les fichiers JSON, en BLOB dans SQLite. Les
+payloads relus portent alors `answers_packed` (bytes) à la place de
+aq_answers / eq_answers ; les anciens fichiers restent lisibles.
+
+Les fichiers JSON sont écrits de façon atomique (temporaire synchronisé
+puis renommé, voir aqeq.atomic). `save(..., exclusive=True)` refuse
+d'écraser un code existant (CodeExistsError) ; avec `group_commit=True`,
+les écritures concurrentes sont synchronisées par lots.
+
+Pour les exports incrémentaux, chaque store expose une « marque » de
+modification croissante (`change_mark()`, mtime en ns pour les fichiers,
+numéro de séquence pour SQLite) et `codes_changed(since, until)` ; pour
+les caches, `version(code)` change à chaque écriture d'un code.
+
+`open_store()` choisit l'implémentation à partir d'une URL
+("data_aq_eq" ou "file:data_aq_eq" → FileStore, "pack:data_aq_eq" →
+PackStore, "sqlite:chemin/vers/base.db" → SQLiteStore).
+
+Migrations en une fois :
+
+    python -m aqeq.storage fanout data_aq_eq                          # à plat → AB/CD/
+    python -m aqeq.storage migrate data_aq_eq sqlite:data_aq_eq.db    # fichiers → SQLite
+    python -m aqeq.storage migrate data_aq_eq pack:data_aq_eq         # fichiers → segments
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+from aqeq.atomic import GroupCommit, fsync_dir, publish, write_tmp
+from aqeq.db import LocalSQLite
+from aqeq.index import SummaryIndex
+from aqeq.norms import NormsIndex
+from aqeq.packed import compact_payload
+from aqeq.timeline import TimelineIndex
+
+_CODE_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class CodeExistsError(FileExistsError):
+    """Création exclusive d'un code patient déjà utilisé."""
+
+    def __init__(self, patient_code: str):
+        super().__init__(f"Code patient déjà utilisé : {patient_code}")
+        self.patient_code = patient_code
+
+
+def valid_code(patient_code: str) -> bool:
+    """Un code patient ne doit pas pouvoir sortir du répertoire de données."""
+    return bool(patient_code) and bool(_CODE_RE.match(patient_code))
+
+
+def _matches(payload: dict, practitioner_code, sex, date_from, date_to) -> bool:
+    if practitioner_code is not None and payload.get("practitioner_code") != practitioner_code:
+        return False
+    if sex is not None and payload.get("sex") != sex:
+        return False
+    test_date = payload.get("test_date", "")
+    if date_from is not None and test_date < date_from:
+        return False
+    if date_to is not None and test_date > date_to:
+        return False
+    return True
+
+
+def encode_json(payload: dict) -> str:
+    """
+    JSON compact d'un payload, réponses encodées sur 2 bits par item
+    (voir aqeq.packed) puis en base64.
+    """
+    payload = compact_payload(payload)
+    if isinstance(payload.get("answers_packed"), bytes):
+        payload = {**payload, "answers_packed": base64.b64encode(payload["answers_packed"]).decode("ascii")}
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_json(data: dict) -> dict:
+    """Inverse de `encode_json` (les anciens fichiers sont lus tels quels)."""
+    if isinstance(data.get("answers_packed"), str):
+        data["answers_packed"] = base64.b64decode(data["answers_packed"])
+    return data
+
+
+def merge_draft(deltas) -> dict:
+    """
+    Rejoue les deltas d'un brouillon dans l'ordre. Chaque delta est un
+    dict {section: {clé: valeur}} ; les valeurs non-dict (ex. "step")
+    remplacent simplement la précédente.
+    """
+    draft = {}
+    for delta in deltas:
+        for section, value in delta.items():
+            if isinstance(value, dict):
+                draft.setdefault(section, {}).update(value)
+            else:
+                draft[section] = value
+    return draft
+
+
+# =========================================================
+# STOCKAGE FICHIERS
+# =========================================================
+
+_FANOUT_RE = re.compile(r"^[0-9A-F]{2}$")
+
+
+def fanout_dirs(patient_code: str) -> tuple:
+    """
+    Sous-répertoires (2 niveaux de 256) d'un code : préfixe de son
+    empreinte SHA-1, réparti uniformément même pour des codes importés
+    séquentiels (P0001, P0002…).
+    """
+    digest = hashlib.sha1(patient_code.encode("utf-8")).hexdigest().upper()
+    return digest[:2], digest[2:4]
+
+
+def _json_entries(directory: str):
+    """(code, DirEntry) des `<CODE>.json` d'un répertoire."""
+    try:
+        it = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with it:
+        for entry in it:
+            if entry.name.endswith(".json") and entry.is_file():
+                code = entry.name[: -len(".json")]
+                if valid_code(code):
+                    yield code, entry
+
+
+def _fanout_subdirs(directory: str) -> list:
+    with os.scandir(directory) as it:
+        return sorted(e.path for e in it if _FANOUT_RE.match(e.name) and e.is_dir())
+
+
+class FileStore:
+    """
+    Un fichier JSON par répondant, réparti en sous-répertoires
+    `AB/CD/<CODE>.json` (voir `fanout_dirs`) pour que ni les recherches du
+    système de fichiers ni les sauvegardes ne butent sur un répertoire
+    unique de plusieurs millions d'entrées. Les fichiers de la disposition
+    historique (`<CODE>.json` à la racine) restent lisibles ; ils sont
+    déplacés à leur réécriture, ou en une fois par
+    `python -m aqeq.storage fanout data_aq_eq`.
+
+    L'index des résumés est un fichier SQLite à la racine
+    (`_index.sqlite3`). `fsync=False` garde l'écriture atomique mais
+    renonce à la durabilité (tests, bancs).
+    """
+
+    def __init__(self, directory: str, fsync: bool = True, group_commit: bool = False):
+        self.directory = directory
+        self.fsync = fsync
+        self._group = GroupCommit(self._write) if group_commit else None
+        self._dirs = set()
+        self.drafts_dir = os.path.join(directory, "_drafts")
+        os.makedirs(self.drafts_dir, exist_ok=True)
+        self.index = SummaryIndex(os.path.join(directory, "_index.sqlite3"))
+        self.norms = NormsIndex(self.index.path)
+        self.timeline = TimelineIndex(self.index.path)
+
+    def __repr__(self):
+        return f"FileStore({self.directory!r})"
+
+    def _path(self, patient_code: str) -> str:
+        return os.path.join(self.directory, *fanout_dirs(patient_code), f"{patient_code}.json")
+
+    def _flat_path(self, patient_code: str) -> str:
+        """Emplacement dans la disposition historique (lecture, migration)."""
+        return os.path.join(self.directory, f"{patient_code}.json")
+
+    def _makedirs(self, directory: str):
+        """Crée un sous-répertoire de fan-out (et rend sa création durable)."""
+        if directory in self._dirs:
+            return
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            if self.fsync:
+                fsync_dir(os.path.dirname(directory))
+                fsync_dir(self.directory)
+        self._dirs.add(directory)
+
+    def _write(self, items):
+        """
+        Écrit un lot de (code, contenu, exclusif) : tous les temporaires,
+        puis les renommages, puis une synchronisation par répertoire
+        touché. Renvoie une erreur (ou None) par élément.
+        """
+        errors = [None] * len(items)
+        tmps = [None] * len(items)
+        for n, (patient_code, data, exclusive) in enumerate(items):
+            try:
+                if exclusive and os.path.exists(self._flat_path(patient_code)):
+                    errors[n] = CodeExistsError(patient_code)
+                    continue
+                path = self._path(patient_code)
+                self._makedirs(os.path.dirname(path))
+                tmps[n] = write_tmp(path, data, self.fsync)
+            except OSError as exc:
+                errors[n] = exc
+        touched = set()
+        for n, (patient_code, _, exclusive) in enumerate(items):
+            if tmps[n] is None:
+                continue
+            path = self._path(patient_code)
+            try:
+                publish(tmps[n], path, exclusive)
+            except FileExistsError:
+                errors[n] = CodeExistsError(patient_code)
+                continue
+            except OSError as exc:
+                errors[n] = exc
+                continue
+            touched.add(os.path.dirname(path))
+            try:
+                # Réécriture d'un fichier historique : l'ancien exemplaire
+                # ne doit plus masquer le nouveau.
+                os.remove(self._flat_path(patient_code))
+                touched.add(self.directory)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                errors[n] = exc
+        if self.fsync:
+            for directory in touched:
+                fsync_dir(directory)
+        return errors
+
+    def save(self, patient_code: str, payload: dict, summary: dict = None, exclusive: bool = False):
+        """
+        Écrit la réponse ; `summary` (optionnel) met à jour l'index. Avec
+        `exclusive`, lève CodeExistsError si le code existe déjà.
+        """
+        if not valid_code(patient_code):
+            raise ValueError(f"Code patient invalide : {patient_code!r}")
+        item = (patient_code, encode_json(payload).encode("utf-8"), exclusive)
+        if self._group is not None:
+            self._group.submit(item)
+        else:
+            error = self._write([item])[0]
+            if error is not None:
+                raise error
+        if summary is not None:
+            self.index_summaries([summary])
+
+    def save_many(self, items, batch_size: int = 1000, with_summaries: bool = False):
+        """
+        `items` : itérable de (code, payload), écrits par lots. Avec
+        `with_summaries`, les résumés de chaque lot (cotés par lot) sont
+        indexés après son écriture. Renvoie le nombre écrit.
+        """
+        n = 0
+        batch, payloads = [], []
+        for patient_code, payload in items:
+            if not valid_code(patient_code):
+                raise ValueError(f"Code patient invalide : {patient_code!r}")
+            batch.append((patient_code, encode_json(payload).encode("utf-8"), False))
+            payloads.append(payload)
+            if len(batch) >= batch_size:
+                n += self._write_batch(batch, payloads if with_summaries else None)
+                batch, payloads = [], []
+        if batch:
+            n += self._write_batch(batch, payloads if with_summaries else None)
+        return n
+
+    def _write_batch(self, batch, payloads=None) -> int:
+        for error in self._write(batch):
+            if error is not None:
+                raise error
+        if payloads:
+            self.index_summaries(_batch_summaries(batch, payloads))
+        return len(batch)
+
+    def load(self, patient_code: str):
+        if not valid_code(patient_code):
+            return None
+        for path in (self._path(patient_code), self._flat_path(patient_code)):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return decode_json(json.load(f))
+            except FileNotFoundError:
+                continue
+        return None
+
+    def version(self, patient_code: str):
+        """
+        Version de l'enregistrement sans le lire, ou None. Chaque écriture
+        publie un nouveau fichier (inode) : l'inode distingue deux écritures
+        de même taille dans le même intervalle de mtime.
+        """
+        if not valid_code(patient_code):
+            return None
+        for path in (self._path(patient_code), self._flat_path(patient_code)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        return None
+
+    def _entries(self):
+        """(code, DirEntry) des deux dispositions, l'historique d'abord."""
+        yield from _json_entries(self.directory)
+        for first in _fanout_subdirs(self.directory):
+            for second in _fanout_subdirs(first):
+                yield from _json_entries(second)
+
+    def codes(self):
+        """Itère sur tous les codes patients stockés (une fois chacun)."""
+        # Un code peut brièvement exister dans les deux dispositions (entre
+        # la publication et la suppression de l'ancien fichier).
+        flat = set()
+        for code, entry in self._entries():
+            if os.path.dirname(entry.path) == self.directory:
+                flat.add(code)
+            elif code in flat:
+                continue
+            yield code
+
+    def migrate_layout(self) -> int:
+        """Déplace les fichiers historiques dans leur sous-répertoire ; renvoie leur nombre."""
+        n = 0
+        touched = set()
+        for code, entry in list(_json_entries(self.directory)):
+            path = self._path(code)
+            self._makedirs(os.path.dirname(path))
+            if os.path.exists(path):
+                # Le fichier réparti a été écrit après l'historique.
+                os.remove(entry.path)
+            else:
+                os.rename(entry.path, path)
+                touched.add(os.path.dirname(path))
+            n += 1
+        if self.fsync and n:
+            for directory in touched | {self.directory}:
+                fsync_dir(directory)
+        return n
+
+    # Marge de sécurité : un fichier plus récent que ce délai est laissé à
+    # l'export suivant (granularité des mtime, écritures en cours).
+    MTIME_MARGIN_NS = 2_000_000_000
+
+    def change_mark(self) -> int:
+        """Marque de modification courante (mtime en ns, moins la marge)."""
+        return time.time_ns() - self.MTIME_MARGIN_NS
+
+    def codes_changed(self, since=None, until=None):
+        """
+        Codes enregistrés ou modifiés après la marque `since` (tous si None)
+        et au plus tard à `until`, par date de modification croissante. Les
+        fichiers ne sont pas ouverts : seul leur mtime est lu.
+        """
+        changed = {}
+        for code, entry in self._entries():
+            mtime = entry.stat().st_mtime_ns
+            if (since is None or mtime > since) and (until is None or mtime <= until):
+                changed[code] = max(mtime, changed.get(code, mtime))
+        for code in sorted(changed, key=changed.get):
+            yield code
+
+    def query(self, practitioner_code=None, sex=None, date_from=None, date_to=None):
+        """
+        Itère sur les payloads correspondant aux filtres. Sans index, chaque
+        fichier doit être ouvert : préférer SQLiteStore pour les gros volumes.
+        """
+        for code in self.codes():
+            payload = self.load(code)
+            if payload is not None and _matches(payload, practitioner_code, sex, date_from, date_to):
+                yield payload
+
+    def index_summaries(self, summaries):
+        """Met à jour l'index des résumés, les normes et la timeline."""
+        summaries = list(summaries)
+        self.index.upsert_many(summaries)
+        self.norms.record_many(summaries)
+        self.timeline.record_many(summaries)
+
+    def unindex(self, codes):
+        """Retire des index (résumés, normes, timeline) des codes qui ne sont plus enregistrés."""
+        codes = list(codes)
+        self.index.remove_many(codes)
+        self.norms.remove_many(codes)
+        self.timeline.remove_many(codes)
+
+    # -- brouillons (questionnaires en cours) ---------------------------
+
+    def _draft_path(self, token: str) -> str:
+        return os.path.join(self.drafts_dir, f"{token}.jsonl")
+
+    def append_draft(self, token: str, delta: dict):
+        """Ajoute une ligne (le delta seul) au journal du brouillon."""
+        if not valid_code(token):
+            raise ValueError(f"Code de reprise invalide : {token!r}")
+        line = json.dumps(delta, ensure_ascii=False, separators=(",", ":"))
+        with open(self._draft_path(token), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def load_draft(self, token: str):
+        if not valid_code(token):
+            return None
+        try:
+            with open(self._draft_path(token), "r", encoding="utf-8") as f:
+                return merge_draft(json.loads(line) for line in f if line.strip())
+        except FileNotFoundError:
+            return None
+
+    def delete_draft(self, token: str):
+        if valid_code(token):
+            try:
+                os.remove(self._draft_path(token))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        self.index.close()
+        self.norms.close()
+        self.timeline.close()
+
+
+# =========================================================
+# STOCKAGE EN SEGMENTS (journal)
+# =========================================================
+
+_SEGMENT_RE = re.compile(r"^(\d{6})\.pack$")
+
+# Marque de modification d'un enregistrement : (segment << 40) + fin de
+# l'enregistrement dans le segment.
+_SEGMENT_SHIFT = 40
+
+
+class PackStore(FileStore):
+    """
+    Variante de FileStore qui ajoute les réponses à la suite dans des
+    segments `_packs/000001.pack`, une ligne `CODE<TAB>{json}` par
+    écriture (la dernière écriture d'un code l'emporte) : plus d'un fichier
+    par répondant, et des sauvegardes par simple copie de quelques gros
+    fichiers. Un index en mémoire (code → segment, position, longueur) est
+    reconstruit à l'ouverture en relisant les segments, puis complété au
+    fil des écritures, y compris celles des autres processus.
+
+    Les écrivains se sérialisent par un verrou fcntl (POSIX) sur
+    `_packs/.lock` ; seule la fin du dernier segment est modifiée. Une
+    ligne incomplète (crash pendant un ajout) est ignorée à la lecture puis
+    tronquée par l'écriture suivante. Les fichiers JSON du même répertoire
+    (fan-out ou disposition historique) restent lisibles, ce qui permet de
+    basculer un répertoire existant sans migration préalable.
+    """
+
+    SEGMENT_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, directory: str, fsync: bool = True, group_commit: bool = False, segment_bytes: int = None):
+        super().__init__(directory, fsync=fsync, group_commit=group_commit)
+        self.packs_dir = os.path.join(directory, "_packs")
+        os.makedirs(self.packs_dir, exist_ok=True)
+        self.segment_bytes = segment_bytes or self.SEGMENT_BYTES
+        self._lock = threading.Lock()
+        self._offsets = {}
+        self._scanned = {}
+        self._fds = {}
+        with self._lock:
+            self._refresh()
+
+    def __repr__(self):
+        return f"PackStore({self.directory!r})"
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.packs_dir, f"{segment:06d}.pack")
+
+    def _segments(self) -> list:
+        return sorted(int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(self.packs_dir)) if m)
+
+    def _refresh(self):
+        """Indexe les lignes ajoutées depuis le dernier passage (verrou tenu)."""
+        last = max(self._scanned, default=0)
+        for segment in self._segments():
+            if segment < last:
+                continue  # segments pleins : plus jamais modifiés
+            start = self._scanned.get(segment, 0)
+            if os.path.getsize(self._segment_path(segment)) > start:
+                self._scan(segment, start)
+            else:
+                self._scanned.setdefault(segment, start)
+
+    def _scan(self, segment: int, start: int):
+        pos = start
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # ajout en cours ou interrompu
+                tab = line.find(b"\t")
+                if tab > 0:
+                    self._offsets[line[:tab].decode("utf-8")] = (segment, pos, len(line))
+                pos += len(line)
+        self._scanned[segment] = pos
+
+    def _fd(self, segment: int) -> int:
+        fd = self._fds.get(segment)
+        if fd is None:
+            fd = self._fds[segment] = os.open(self._segment_path(segment), os.O_RDONLY)
+        return fd
+
+    def _exists(self, patient_code: str, pending) -> bool:
+        return (
+            patient_code in self._offsets
+            or patient_code in pending
+            or os.path.exists(self._path(patient_code))
+            or os.path.exists(self._flat_path(patient_code))
+        )
+
+    def _write(self, items):
+        """
+        Ajoute un lot de (code, contenu, exclusif) en un seul write et une
+        seule synchronisation. Renvoie une erreur (ou None) par élément.
+        """
+        import fcntl
+
+        errors = [None] * len(items)
+        with self._lock, open(os.path.join(self.packs_dir, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._refresh()
+            segment = max(self._scanned, default=1)
+            end = self._scanned.get(segment, 0)
+            if end >= self.segment_bytes:
+                segment, end = segment + 1, 0
+            pending = {}
+            lines = []
+            pos = end
+            for n, (patient_code, data, exclusive) in enumerate(items):
+                if exclusive and self._exists(patient_code, pending):
+                    errors[n] = CodeExistsError(patient_code)
+                    continue
+                line = patient_code.encode("utf-8") + b"\t" + data + b"\n"
+                pending[patient_code] = (segment, pos, len(line))
+                lines.append(line)
+                pos += len(line)
+            if not lines:
+                return errors
+
+            path = self._segment_path(segment)
+            created = not os.path.exists(path)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                # Sous le verrou, tout ce qui dépasse la dernière ligne
+                # complète vient d'un ajout interrompu.
+                os.ftruncate(fd, end)
+                os.lseek(fd, end, os.SEEK_SET)
+                view = memoryview(b"".join(lines))
+                while view:
+                    view = view[os.write(fd, view):]
+                if self.fsync:
+                    os.fsync(fd)
+            except OSError as exc:
+                return [error or exc for error in errors]
+            finally:
+                os.close(fd)
+            if created and self.fsync:
+                fsync_dir(self.packs_dir)
+            self._offsets.update(pending)
+            self._scanned[segment] = pos
+        return errors
+
+    def load(self, patient_code: str):
+        if not valid_code(patient_code):
+            return None
+        with self._lock:
+            self._refresh()
+            location = self._offsets.get(patient_code)
+            fd = self._fd(location[0]) if location is not None else None
+        if location is None:
+            return super().load(patient_code)
+        _, offset, length = location
+        line = os.pread(fd, length, offset)
+        return decode_json(json.loads(line[line.index(b"\t") + 1:]))
+
+    def version(self, patient_code: str):
+        """Version : position de la dernière écriture dans les segments."""
+        if not valid_code(patient_code):
+            return None
+        with self._lock:
+            self._refresh()
+            location = self._offsets.get(patient_code)
+        return location if location is not None else super().version(patient_code)
+
+    def codes(self):
+        """Codes des segments, puis ceux des fichiers JSON non encore réécrits."""
+        with self._lock:
+            self._refresh()
+            packed = list(self._offsets)
+        yield from packed
+        packed = set(packed)
+        for code in super().codes():
+            if code not in packed:
+                yield code
+
+    def change_mark(self) -> int:
+        """Marque de modification courante : fin du dernier segment."""
+        with self._lock:
+            self._refresh()
+            segment = max(self._scanned, default=0)
+            return (segment << _SEGMENT_SHIFT) + self._scanned.get(segment, 0)
+
+    def codes_changed(self, since=None, until=None):
+        """
+        Codes écrits après la marque `since` (tous si None), jusqu'à
+        `until`, dans l'ordre d'écriture. Les fichiers JSON, antérieurs au
+        journal, ne sont repris que par un export complet.
+        """
+        with self._lock:
+            self._refresh()
+            marks = {
+                code: (segment << _SEGMENT_SHIFT) + offset + length
+                for code, (segment, offset, length) in self._offsets.items()
+            }
+        if since is None:
+            for code in super().codes():
+                if code not in marks:
+                    yield code
+        for code in sorted(marks, key=marks.get):
+            mark = marks[code]
+            if (since is None or mark > since) and (until is None or mark <= until):
+                yield code
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+        super().close()
+
+
+# =========================================================
+# STOCKAGE SQLITE
+# =========================================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    patient_code      TEXT PRIMARY KEY,
+    practitioner_code TEXT NOT NULL DEFAULT '',
+    test_date         TEXT NOT NULL DEFAULT '',
+    sex               TEXT NOT NULL DEFAULT '',
+    payload           TEXT NOT NULL,
+    answers           BLOB,
+    seq               INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_practitioner
+    ON responses (practitioner_code, test_date);
+CREATE INDEX IF NOT EXISTS idx_responses_test_date
+    ON responses (test_date);
+CREATE TABLE IF NOT EXISTS draft_deltas (
+    seq   INTEGER PRIMARY KEY AUTOINCREMENT,
+    token TEXT NOT NULL,
+    delta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_draft_deltas_token
+    ON draft_deltas (token, seq);
+"""
+
+# `seq` : numéro de séquence croissant à chaque écriture (exports
+# incrémentaux). Les écrivains SQLite étant sérialisés, il est attribué
+# dans l'ordre des commits.
+_NEXT_SEQ = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM responses)"
+
+_UPSERT = f"""
+INSERT INTO responses (patient_code, practitioner_code, test_date, sex, payload, answers, seq)
+VALUES (?, ?, ?, ?, ?, ?, {_NEXT_SEQ})
+ON CONFLICT (patient_code) DO UPDATE SET
+    practitioner_code = excluded.practitioner_code,
+    test_date         = excluded.test_date,
+    sex               = excluded.sex,
+    payload           = excluded.payload,
+    answers           = excluded.answers,
+    seq               = excluded.seq
+"""
+
+_INSERT = f"""
+INSERT INTO responses (patient_code, practitioner_code, test_date, sex, payload, answers, seq)
+VALUES (?, ?, ?, ?, ?, ?, {_NEXT_SEQ})
+"""
+
+_SELECT_ONE = "SELECT payload, answers FROM responses WHERE patient_code = ?"
+
+
+def _row(patient_code: str, payload: dict):
+    """Ligne de `responses` ; les réponses compactes vont dans la colonne BLOB."""
+    payload = compact_payload(payload)
+    answers = payload.get("answers_packed")
+    if answers is not None:
+        payload = {k: v for k, v in payload.items() if k != "answers_packed"}
+    return (
+        patient_code,
+        payload.get("practitioner_code", "") or "",
+        payload.get("test_date", "") or "",
+        payload.get("sex", "") or "",
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+        answers,
+    )
+
+
+def _from_row(payload: str, answers) -> dict:
+    data = json.loads(payload)
+    if answers is not None:
+        data["answers_packed"] = bytes(answers)
+    return data
+
+
+class SQLiteStore:
+    """
+    Base SQLite en mode WAL (voir `LocalSQLite`), index des résumés dans
+    le même fichier et sur les mêmes connexions : une réponse et son
+    résumé sont écrits dans une seule transaction. Avec `group_commit`,
+    les écritures concurrentes partagent une transaction.
+    """
+
+    def __init__(self, path: str, group_commit: bool = False):
+        self.path = path
+        self._group = GroupCommit(self._write) if group_commit else None
+        self._db = LocalSQLite(path, _SCHEMA)
+        self._conn = self._db.conn
+        columns = {row[1] for row in self._conn().execute("PRAGMA table_info(responses)")}
+        if "answers" not in columns:
+            # Base créée avant l'encodage compact des réponses.
+            self._conn().execute("ALTER TABLE responses ADD COLUMN answers BLOB")
+        if "seq" not in columns:
+            # Base créée avant les exports incrémentaux : séquence 0.
+            self._conn().execute("ALTER TABLE responses ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS idx_responses_seq ON responses (seq)")
+        self.index = SummaryIndex(path, self._db)
+        self.norms = NormsIndex(path, self._db)
+        self.timeline = TimelineIndex(path, self._db)
+
+    def __repr__(self):
+        return f"SQLiteStore({self.path!r})"
+
+    def _write(self, items):
+        """
+        Écrit un lot de (code, ligne, exclusif, résumé ou None) en une
+        transaction : réponses puis résumés (index, normes, timeline) de
+        celles qui ont été écrites.
+        """
+        errors = []
+        summaries = []
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for patient_code, row, exclusive, summary in items:
+                try:
+                    conn.execute(_INSERT if exclusive else _UPSERT, row)
+                    errors.append(None)
+                except sqlite3.IntegrityError:
+                    errors.append(CodeExistsError(patient_code))
+                    continue
+                if summary is not None:
+                    summaries.append(summary)
+            if summaries:
+                self._index_in(conn, summaries)
+        return errors
+
+    def _index_in(self, conn, summaries):
+        self.index.upsert_in(conn, summaries)
+        self.norms.record_in(conn, summaries)
+        self.timeline.record_in(conn, summaries)
+
+    def save(self, patient_code: str, payload: dict, summary: dict = None, exclusive: bool = False):
+        """
+        Écrit la réponse ; `summary` (optionnel) met à jour l'index. Avec
+        `exclusive`, lève CodeExistsError si le code existe déjà.
+        """
+        if not valid_code(patient_code):
+            raise ValueError(f"Code patient invalide : {patient_code!r}")
+        item = (patient_code, _row(patient_code, payload), exclusive, summary)
+        if self._group is not None:
+            self._group.submit(item)
+        else:
+            error = self._write([item])[0]
+            if error is not None:
+                raise error
+
+    def save_many(self, items, batch_size: int = 1000, with_summaries: bool = False):
+        """
+        Insertion par lots (une transaction par lot). Avec `with_summaries`,
+        les résumés du lot (cotés par lot) sont écrits dans la même
+        transaction que ses réponses.
+        """
+        n = 0
+        batch, payloads = [], []
+        for patient_code, payload in items:
+            if not valid_code(patient_code):
+                raise ValueError(f"Code patient invalide : {patient_code!r}")
+            batch.append(_row(patient_code, payload))
+            payloads.append(payload)
+            if len(batch) >= batch_size:
+                n += self._write_batch(batch, payloads if with_summaries else None)
+                batch, payloads = [], []
+        if batch:
+            n += self._write_batch(batch, payloads if with_summaries else None)
+        return n
+
+    def _write_batch(self, batch, payloads=None) -> int:
+        summaries = _batch_summaries(batch, payloads) if payloads else []
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(_UPSERT, batch)
+            if summaries:
+                self._index_in(conn, summaries)
+        return len(batch)
+
+    def load(self, patient_code: str):
+        row = self._conn().execute(_SELECT_ONE, (patient_code,)).fetchone()
+        if row is None:
+            return None
+        return _from_row(*row)
+
+    def version(self, patient_code: str):
+        """Version de l'enregistrement (numéro de séquence) sans le lire, ou None."""
+        row = self._conn().execute("SELECT seq FROM responses WHERE patient_code = ?", (patient_code,)).fetchone()
+        return None if row is None else row[0]
+
+    def codes(self):
+        for (code,) in self._conn().execute("SELECT patient_code FROM responses ORDER BY patient_code"):
+            yield code
+
+    def change_mark(self) -> int:
+        """Marque de modification courante (dernier numéro de séquence)."""
+        return self._conn().execute("SELECT COALESCE(MAX(seq), 0) FROM responses").fetchone()[0]
+
+    def codes_changed(self, since=None, until=None):
+        """Codes écrits après la marque `since` (tous si None), jusqu'à `until`, dans l'ordre d'écriture."""
+        sql = "SELECT patient_code FROM responses WHERE seq > ?"
+        params = [-1 if since is None else since]
+        if until is not None:
+            sql += " AND seq <= ?"
+            params.append(until)
+        for (code,) in self._conn().execute(sql + " ORDER BY seq", params):
+            yield code
+
+    def query(self, practitioner_code=None, sex=None, date_from=None, date_to=None):
+        """Itère sur les payloads correspondant aux filtres (via les index)."""
+        clauses, params = [], []
+        if practitioner_code is not None:
+            clauses.append("practitioner_code = ?")
+            params.append(practitioner_code)
+        if sex is not None:
+            clauses.append("sex = ?")
+            params.append(sex)
+        if date_from is not None:
+            clauses.append("test_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("test_date <= ?")
+            params.append(date_to)
+        sql = "SELECT payload, answers FROM responses"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY test_date, patient_code"
+        for payload, answers in self._conn().execute(sql, params):
+            yield _from_row(payload, answers)
+
+    def index_summaries(self, summaries):
+        """Met à jour l'index des résumés, les normes et la timeline (une transaction)."""
+        summaries = list(summaries)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._index_in(conn, summaries)
+
+    def unindex(self, codes):
+        """Retire des index (résumés, normes, timeline) des codes qui ne sont plus enregistrés."""
+        codes = list(codes)
+        self.index.remove_many(codes)
+        self.norms.remove_many(codes)
+        self.timeline.remove_many(codes)
+
+    # -- brouillons (questionnaires en cours) ---------------------------
+
+    def append_draft(self, token: str, delta: dict):
+        """Ajoute une ligne (le delta seul) au journal du brouillon."""
+        if not valid_code(token):
+            raise ValueError(f"Code de reprise invalide : {token!r}")
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO draft_deltas (token, delta) VALUES (?, ?)",
+                (token, json.dumps(delta, ensure_ascii=False, separators=(",", ":"))),
+            )
+
+    def load_draft(self, token: str):
+        rows = self._conn().execute(
+            "SELECT delta FROM draft_deltas WHERE token = ? ORDER BY seq", (token,)
+        ).fetchall()
+        if not rows:
+            return None
+        return merge_draft(json.loads(delta) for (delta,) in rows)
+
+    def delete_draft(self, token: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM draft_deltas WHERE token = ?", (token,))
+
+    def close(self):
+        # Index, normes et timeline partagent les connexions du store.
+        self._db.close()
+
+
+# =========================================================
+# SÉLECTION + MIGRATION
+# =========================================================
+
+def open_store(url: str, group_commit: bool = False):
+    """
+    "sqlite:<chemin>" → SQLiteStore ; "pack:<répertoire>" → PackStore ;
+    "file:<répertoire>" ou un simple chemin de répertoire → FileStore.
+    """
+    if url.startswith("sqlite:"):
+        return SQLiteStore(url[len("sqlite:"):], group_commit=group_commit)
+    if url.startswith("pack:"):
+        return PackStore(url[len("pack:"):], group_commit=group_commit)
+    if url.startswith("file:"):
+        url = url[len("file:"):]
+    return FileStore(url, group_commit=group_commit)
+
+
+def save_new(store, payload: dict, attempts: int = 5, n_chars: int = 8) -> dict:
+    """
+    Enregistre une nouvelle réponse (et son résumé) sous un code tiré au
+    hasard, sans jamais écraser celle d'un autre répondant : en cas de
+    collision, on tire un autre code. Renvoie le payload enregistré.
+    """
+    from aqeq.scoring import response_summary
+
+    for _ in range(attempts):
+        patient_code = secrets.token_hex(n_chars // 2).upper()
+        stored = {"patient_code": patient_code, **payload}
+        try:
+            store.save(patient_code, stored, summary=response_summary(stored), exclusive=True)
+            return stored
+        except CodeExistsError:
+            continue
+    raise RuntimeError("Impossible d'attribuer un code patient libre.")
+
+
+def _batch_summaries(batch, payloads) -> list:
+    """Résumés (voir aqeq.index) d'un lot de `save_many`, le code de chaque ligne en tête."""
+    from aqeq.scoring import summarize_responses
+
+    return summarize_responses([{**p, "patient_code": row[0]} for row, p in zip(batch, payloads)])
+
+
+def migrate(src_dir: str, dst, batch_size: int = 1000) -> int:
+    """
+    Importe toutes les réponses JSON de `src_dir` (les deux dispositions)
+    dans le store `dst`, avec leurs résumés : le tableau de bord, les normes
+    et la timeline du store cible sont complets dès la fin de la migration.
+    """
+    src = FileStore(src_dir)
+
+    def records():
+        for code in src.codes():
+            payload = src.load(code)
+            if payload is not None:
+                yield code, payload
+
+    return dst.save_many(records(), batch_size=batch_size, with_summaries=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m aqeq.storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("migrate", help="importer les fichiers JSON dans un autre store")
+    p.add_argument("src", help="répertoire contenant les <CODE>.json")
+    p.add_argument("dst", help="store cible, ex. sqlite:data_aq_eq.db")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p = sub.add_parser("fanout", help="répartir les <CODE>.json à plat dans les sous-répertoires AB/CD/")
+    p.add_argument("directory", help="répertoire du FileStore")
+    args = parser.parse_args(argv)
+
+    if args.command == "fanout":
+        store = FileStore(args.directory)
+        n = store.migrate_layout()
+        store.close()
+        print(f"{n} fichiers déplacés dans {store!r}")
+        return
+
+    dst = open_store(args.dst)
+    n = migrate(args.src, dst, batch_size=args.batch_size)
+    dst.close()
+    print(f"{n} réponses importées dans {dst!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Suivi longitudinal : passations successives d'un même répondant.
+
+Chaque passation reçoit un code patient neuf ; les passations d'une même
+personne sont reliées par la clé (code praticien, identifiant saisi), ce
+dernier normalisé (espaces, casse) par `patient_key`.
+
+La table `timeline` garde, pour chaque code, ses réponses compactes (voir
+aqeq.packed), ses scores et l'écart avec la passation précédente du même
+répondant (`delta`). Les écarts sont calculés à l'enregistrement : relire
+l'historique complet d'un répondant est une seule lecture indexée, sans
+ouvrir ni recoter les réponses. Une passation insérée entre deux autres
+(date antérieure) ou déplacée (identifiant corrigé) fait recalculer les
+écarts de son groupe, qui ne compte que quelques lignes.
+
+Écart d'une passation (JSON) :
+
+    previous      code de la passation précédente
+    days          jours écoulés (None si une date est illisible)
+    aq_score, eq_score, class_total        différences
+    aq_subscales, class_counts             différences par sous-échelle / section
+    aq_items, eq_items                     [[item, avant, après], ...]
+    aq_points     {"gained": [...], "lost": [...]}  items AQ cotés / plus cotés
+"""
+
+import json
+from datetime import date
+
+from aqeq.db import LocalSQLite
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timeline (
+    patient_code      TEXT PRIMARY KEY,
+    practitioner_code TEXT NOT NULL,
+    patient_key       TEXT NOT NULL,
+    test_date         TEXT NOT NULL,
+    answers           BLOB,
+    scores            TEXT,
+    delta             TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_timeline_respondent
+    ON timeline (practitioner_code, patient_key, test_date, patient_code);
+"""
+
+_SELECT_GROUP = (
+    "SELECT patient_code, test_date, answers, scores, delta FROM timeline "
+    "WHERE practitioner_code = ? AND patient_key = ? "
+    "ORDER BY test_date, patient_code"
+)
+
+
+def patient_key(patient_id: str) -> str:
+    """Identifiant saisi, normalisé pour relier les passations."""
+    return " ".join((patient_id or "").split()).casefold()
+
+
+def sitting_scores(blob: bytes) -> dict:
+    """Scores d'une passation à partir des réponses compactes."""
+    from aqeq.items import AQ_SUBSCALES, CLASS_SECTIONS
+    from aqeq.packed import score_packed
+
+    s = score_packed(blob)
+    return {
+        "aq_score": s["aq_score"],
+        "eq_score": s["eq_score"],
+        "class_total": s["class_total"],
+        "aq_subscales": dict(zip(AQ_SUBSCALES, s["aq_subscales"])),
+        "class_counts": dict(zip(CLASS_SECTIONS, s["class_counts"])),
+    }
+
+
+def _days(before: str, after: str):
+    try:
+        return (date.fromisoformat(after) - date.fromisoformat(before)).days
+    except (TypeError, ValueError):
+        return None
+
+
+def sitting_delta(previous: tuple, current: tuple) -> dict:
+    """
+    Écart entre deux passations, chacune (code, date, réponses compactes,
+    scores). Voir le module pour le format.
+    """
+    from aqeq.items import AQ
+    from aqeq.packed import unpack_answers
+
+    prev_code, prev_date, prev_blob, prev_scores = previous
+    _, cur_date, cur_blob, cur_scores = current
+    prev_aq, prev_eq = unpack_answers(prev_blob)
+    cur_aq, cur_eq = unpack_answers(cur_blob)
+
+    gained, lost = [], []
+    for i in sorted(cur_aq):
+        before = AQ.item_points(i, prev_aq[i])
+        after = AQ.item_points(i, cur_aq[i])
+        if after > before:
+            gained.append(i)
+        elif after < before:
+            lost.append(i)
+
+    return {
+        "previous": prev_code,
+        "days": _days(prev_date, cur_date),
+        **{k: cur_scores[k] - prev_scores[k] for k in ("aq_score", "eq_score", "class_total")},
+        **{
+            group: {name: cur_scores[group][name] - prev_scores[group][name] for name in cur_scores[group]}
+            for group in ("aq_subscales", "class_counts")
+        },
+        "aq_items": [[i, prev_aq[i], cur_aq[i]] for i in sorted(cur_aq) if prev_aq[i] != cur_aq[i]],
+        "eq_items": [[i, prev_eq[i], cur_eq[i]] for i in sorted(cur_eq) if prev_eq[i] != cur_eq[i]],
+        "aq_points": {"gained": gained, "lost": lost},
+    }
+
+
+class TimelineIndex:
+    """Table `timeline` dans un fichier SQLite (voir module)."""
+
+    def __init__(self, path: str, db: LocalSQLite = None):
+        self.path = path
+        self._db = db or LocalSQLite(path)
+        self._db.conn().executescript(_SCHEMA)
+
+    def record_many(self, summaries):
+        """
+        Ajoute (ou déplace) la passation de chaque résumé et recalcule les
+        écarts des groupes touchés. Les résumés doivent porter patient_code,
+        practitioner_code, patient_id, test_date et answers_packed (None si
+        les réponses sont incomplètes).
+        """
+        conn = self._db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self.record_in(conn, summaries)
+
+    def record_in(self, conn, summaries):
+        """Comme `record_many`, dans la transaction en cours de `conn`."""
+        touched = set()
+        for s in summaries:
+            old = conn.execute(
+                "SELECT practitioner_code, patient_key FROM timeline WHERE patient_code = ?",
+                (s["patient_code"],),
+            ).fetchone()
+            if old is not None:
+                touched.add(old)
+            blob = s.get("answers_packed")
+            scores = json.dumps(sitting_scores(blob)) if blob is not None else None
+            group = (s["practitioner_code"] or "", patient_key(s["patient_id"]))
+            conn.execute(
+                "INSERT OR REPLACE INTO timeline VALUES (?, ?, ?, ?, ?, ?, NULL)",
+                (s["patient_code"], group[0], group[1], s["test_date"] or "", blob, scores),
+            )
+            touched.add(group)
+        for group in touched:
+            if all(group):
+                self._update_deltas(conn, group)
+
+    def record(self, summary: dict):
+        self.record_many([summary])
+
+    def remove_many(self, codes):
+        """Retire des passations et recalcule les écarts de leurs groupes."""
+        conn = self._db.conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            touched = set()
+            for code in codes:
+                old = conn.execute(
+                    "SELECT practitioner_code, patient_key FROM timeline WHERE patient_code = ?",
+                    (code,),
+                ).fetchone()
+                if old is not None:
+                    conn.execute("DELETE FROM timeline WHERE patient_code = ?", (code,))
+                    touched.add(old)
+            for group in touched:
+                if all(group):
+                    self._update_deltas(conn, group)
+
+    def _update_deltas(self, conn, group):
+        previous = None
+        for code, test_date, blob, scores, delta in conn.execute(_SELECT_GROUP, group).fetchall():
+            current = (code, test_date, blob, json.loads(scores)) if blob is not None else None
+            fresh = None
+            if previous is not None and current is not None:
+                fresh = json.dumps(sitting_delta(previous, current))
+            if fresh != delta:
+                conn.execute("UPDATE timeline SET delta = ? WHERE patient_code = ?", (fresh, code))
+            if current is not None:
+                previous = current
+
+    def codes(self) -> set:
+        return {code for (code,) in self._db.conn().execute("SELECT patient_code FROM timeline")}
+
+    def history(self, practitioner_code: str, patient_id: str) -> list:
+        """
+        Passations du répondant, de la plus ancienne à la plus récente :
+        [{patient_code, test_date, scores, delta}, ...]. Vide sans code
+        praticien ou sans identifiant.
+        """
+        group = (practitioner_code or "", patient_key(patient_id))
+        if not all(group):
+            return []
+        return [
+            {
+                "patient_code": code,
+                "test_date": test_date,
+                "scores": json.loads(scores) if scores else None,
+                "delta": json.loads(delta) if delta else None,
+            }
+            for code, test_date, _, scores, delta in self._db.conn().execute(_SELECT_GROUP, group)
+        ]
+
+    def close(self):
+        self._db.close()
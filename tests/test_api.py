@@ -0,0 +1,91 @@
+"""API HTTP (aqeq.api) en mémoire, via le client de test de FastAPI."""
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from aqeq.api import create_app  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    with TestClient(create_app(f"sqlite:{tmp_path / 'api.db'}")) as c:
+        yield c
+
+
+def _body(**extra):
+    body = {
+        "aq_answers": {str(i): 1 + i % 4 for i in range(1, 51)},
+        "eq_answers": {str(i): 1 + i % 4 for i in range(1, 61)},
+        "prereq": {"E": True, "F": True},
+    }
+    body.update(extra)
+    return body
+
+
+def test_post_then_get(client):
+    r = client.post("/responses", json=_body(sex="Féminin", dob="1990-05-02", test_date="2026-01-15"))
+    assert r.status_code == 201
+    created = r.json()
+    assert created["dob"] == "1990-05-02" and created["test_date"] == "2026-01-15"
+    assert set(created["class_counts"]) == {"A", "B", "C", "D", "TOTAL"}
+
+    r = client.get(f"/responses/{created['patient_code'].lower()}")
+    assert r.status_code == 200
+    fetched = r.json()
+    for key in ("aq_score", "eq_score", "aq_subscales", "dsm_blocks", "class_summary"):
+        assert fetched[key] == created[key]
+
+
+def test_test_date_defaults_to_today(client):
+    r = client.post("/responses", json=_body())
+    assert r.status_code == 201
+    assert len(r.json()["test_date"]) == 10 and r.json()["dob"] == ""
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [
+        {"sex": "F"},
+        {"dob": "02/05/1990"},
+        {"test_date": "2026-02-30"},
+        {"dob": "2026-02-01", "test_date": "2026-01-01"},
+        {"prereq": {"Z": True}},
+    ],
+)
+def test_post_rejects_invalid_fields(client, extra):
+    assert client.post("/responses", json=_body(**extra)).status_code == 422
+
+
+def test_post_rejects_incomplete_answers(client):
+    body = _body()
+    del body["aq_answers"]["7"]
+    r = client.post("/responses", json=body)
+    assert r.status_code == 422
+    body = _body()
+    body["eq_answers"]["3"] = 5
+    assert client.post("/responses", json=body).status_code == 422
+
+
+@pytest.mark.parametrize("code", ["ZZZZZZZZ", "not-a-code"])
+def test_get_unknown_code(client, code):
+    assert client.get(f"/responses/{code}").status_code == 404
+
+
+def test_score_batch(client):
+    bodies = [_body(), _body(aq_answers={str(i): 4 for i in range(1, 51)})]
+    r = client.post("/score:batch", json={"responses": bodies})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert len(results) == 2
+    assert results[0]["aq_score"] == client.post("/responses", json=bodies[0]).json()["aq_score"]
+
+
+def test_metrics(client):
+    client.post("/responses", json=_body())
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert "submissions_total" in r.text
@@ -0,0 +1,126 @@
+"""Écritures atomiques, création exclusive et écriture groupée (aqeq.atomic)."""
+
+import os
+import threading
+
+import pytest
+
+from aqeq.atomic import GroupCommit, atomic_write
+from aqeq.storage import CodeExistsError, FileStore
+
+
+def _leftovers(directory) -> list:
+    return [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+def test_atomic_write_replaces_content_without_temporaries(tmp_path):
+    path = tmp_path / "r.json"
+    atomic_write(str(path), b"avant")
+    atomic_write(str(path), b"apres")
+    assert path.read_bytes() == b"apres"
+    assert _leftovers(tmp_path) == []
+
+
+def test_exclusive_create_keeps_existing_file(tmp_path):
+    path = tmp_path / "r.json"
+    atomic_write(str(path), b"premier", exclusive=True)
+    with pytest.raises(FileExistsError):
+        atomic_write(str(path), b"second", exclusive=True)
+    assert path.read_bytes() == b"premier"
+    assert _leftovers(tmp_path) == []
+
+
+def test_exclusive_create_race_has_one_winner(tmp_path):
+    path = str(tmp_path / "r.json")
+    start = threading.Barrier(8)
+    won, lost = [], []
+
+    def writer(k):
+        start.wait()
+        try:
+            atomic_write(path, f"{k}".encode(), exclusive=True, fsync=False)
+            won.append(k)
+        except FileExistsError:
+            lost.append(k)
+
+    threads = [threading.Thread(target=writer, args=(k,)) for k in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(won) == 1 and len(lost) == 7
+    with open(path, "rb") as f:
+        assert f.read() == f"{won[0]}".encode()
+
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_file_store_exclusive_save_loses_the_race(tmp_path, group_commit):
+    store = FileStore(str(tmp_path / "store"), fsync=False, group_commit=group_commit)
+    start = threading.Barrier(6)
+    errors = []
+
+    def save(k):
+        start.wait()
+        try:
+            store.save("RACE0001", {"patient_code": "RACE0001", "patient_id": f"P{k}"}, exclusive=True)
+        except CodeExistsError:
+            errors.append(k)
+
+    threads = [threading.Thread(target=save, args=(k,)) for k in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 5
+    winner = ({f"P{k}" for k in range(6)} - {f"P{k}" for k in errors}).pop()
+    assert store.load("RACE0001")["patient_id"] == winner
+    store.close()
+
+
+def test_group_commit_batches_concurrent_submissions():
+    flushed = []
+    release = threading.Event()
+
+    def flush(items):
+        if not flushed:
+            # Premier lot bloqué : les soumissions suivantes s'accumulent.
+            release.wait(5)
+        flushed.append(list(items))
+        return [ValueError(item) if item == "refusé" else None for item in items]
+
+    group = GroupCommit(flush)
+    results = {}
+
+    def submit(item):
+        try:
+            group.submit(item)
+            results[item] = None
+        except ValueError as exc:
+            results[item] = exc
+
+    first = threading.Thread(target=submit, args=("a",))
+    first.start()
+    while group.batches == 0 and not group._flushing:
+        threading.Event().wait(0.01)
+    others = [threading.Thread(target=submit, args=(item,)) for item in ("b", "c", "refusé")]
+    for t in others:
+        t.start()
+    while len(group._pending) < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in [first] + others:
+        t.join()
+
+    assert flushed[0] == ["a"] and sorted(flushed[1]) == ["b", "c", "refusé"]
+    assert group.batches == 2 and group.items == 4
+    assert results["b"] is None and isinstance(results["refusé"], ValueError)
+
+
+def test_group_commit_reports_flush_failure_to_every_item():
+    def flush(items):
+        raise OSError("disque plein")
+
+    group = GroupCommit(flush)
+    with pytest.raises(OSError, match="disque plein"):
+        group.submit("x")
+    assert group.batches == 1
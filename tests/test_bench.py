@@ -0,0 +1,26 @@
+"""Fusion et comparaison des résultats du banc (aqeq.bench)."""
+
+from aqeq.bench import best_of, compare
+
+
+def _measure(ops):
+    return {"ops_per_s": ops, "p50_ms": 1.0}
+
+
+def test_best_of_keeps_fastest_measure_per_leaf():
+    runs = [
+        {"single": {"a": _measure(10), "b": _measure(7)}, "rerun": {"page": _measure(2)}},
+        {"single": {"a": _measure(12), "b": _measure(5)}, "rerun": {"page": _measure(1)}},
+    ]
+    assert best_of(runs) == {
+        "single": {"a": _measure(12), "b": _measure(7)},
+        "rerun": {"page": _measure(2)},
+    }
+
+
+def test_compare_reports_drops_beyond_threshold():
+    before = {"results": {"single": {"a": _measure(100), "b": _measure(100)}}}
+    after = {"results": {"single": {"a": _measure(45), "b": _measure(60)}}}
+    regressions = compare(before, after, threshold=0.5)
+    assert [r["name"] for r in regressions] == ["single.a"]
+    assert regressions[0]["ratio"] == 0.45
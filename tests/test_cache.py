@@ -0,0 +1,106 @@
+"""Cache des enregistrements relus (aqeq.cache), validé par version."""
+
+import itertools
+
+import pytest
+
+from aqeq import cache as cache_module
+from aqeq.cache import RecordCache, SharedCache
+from aqeq.storage import open_store
+
+
+@pytest.fixture(params=["file", "pack", "sqlite"])
+def store_url(request, tmp_path):
+    path = tmp_path / ("s.db" if request.param == "sqlite" else "store")
+    return f"{request.param}:{path}"
+
+
+@pytest.fixture
+def shared(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.db"), maxsize=3)
+    yield cache
+    cache.close()
+
+
+def test_stale_version_is_a_miss_and_is_dropped():
+    cache = RecordCache(maxsize=4)
+    cache.put("A", (1, 10), {"v": 1})
+    assert cache.get("A", (1, 10)) == {"v": 1}
+    assert cache.get("A", (2, 10)) is None
+    assert len(cache) == 0
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 0, "maxsize": 4}
+
+
+def test_invalidate_and_lru_eviction():
+    cache = RecordCache(maxsize=2)
+    cache.put("A", 1, "a")
+    cache.put("B", 1, "b")
+    cache.get("A", 1)              # A devient le plus récent
+    cache.put("C", 1, "c")         # B est évincé
+    assert cache.get("B", 1) is None
+    assert cache.get("A", 1) == "a" and cache.get("C", 1) == "c"
+    assert cache.stats()["evictions"] == 1
+
+    cache.invalidate("A")
+    assert cache.get("A", 1) is None
+
+
+def test_zero_maxsize_disables_the_cache():
+    cache = RecordCache(maxsize=0)
+    cache.put("A", 1, "a")
+    assert cache.get("A", 1) is None and len(cache) == 0
+
+
+def test_store_write_changes_version(store_url):
+    store = open_store(store_url)
+    cache = RecordCache()
+    store.save("CODE0001", {"patient_code": "CODE0001", "patient_id": "P1"})
+    before = store.version("CODE0001")
+    cache.put("CODE0001", before, store.load("CODE0001"))
+
+    # Réécriture (par ce processus ou un autre) : l'entrée n'est plus servie.
+    store.save("CODE0001", {"patient_code": "CODE0001", "patient_id": "P2"})
+    after = store.version("CODE0001")
+    assert after != before
+    assert cache.get("CODE0001", after) is None
+    store.close()
+
+
+def test_shared_cache_is_validated_by_version(shared):
+    shared.put("A", [3, "x"], {"v": 1})
+    assert shared.get("A", [3, "x"]) == {"v": 1}
+    assert shared.get("A", [4, "x"]) is None
+    shared.invalidate("A")
+    assert shared.get("A", [3, "x"]) is None
+
+
+def test_shared_cache_fills_other_processes(shared):
+    first = RecordCache(shared=shared)
+    first.put("A", 1, {"v": 1})
+
+    # Autre processus : même fichier, cache mémoire vide.
+    other_shared = SharedCache(shared.path)
+    other = RecordCache(shared=other_shared)
+    assert other.get("A", 1) == {"v": 1}
+    assert len(other) == 1
+
+    # Invalidation : les deux niveaux sont vidés.
+    other.invalidate("A")
+    assert first.get("A", 1) == {"v": 1}   # encore en mémoire dans le premier
+    first.clear()
+    assert first.get("A", 1) is None
+    other_shared.close()
+
+
+def test_shared_cache_prune_keeps_most_recent(shared, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(cache_module.time, "time", lambda: next(clock))
+    for key in "ABCDE":
+        shared.put(key, 1, key)
+    assert shared.prune() == 2
+    assert [shared.get(key, 1) for key in "ABCDE"] == [None, None, "C", "D", "E"]
+
+
+def test_shared_cache_rejects_bad_table_name(tmp_path):
+    with pytest.raises(ValueError):
+        SharedCache(str(tmp_path / "cache.db"), table="x; DROP TABLE y")
@@ -0,0 +1,44 @@
+"""Commandes de aqeq.cli qui réécrivent un store."""
+
+from aqeq.cli import main as cli_main
+from aqeq.scoring import SCORING_RULES_VERSION, answers_from_payload, compute_derived, response_summary
+from aqeq.storage import open_store
+
+
+def _payload(k: int = 0) -> dict:
+    return {
+        "patient_code": f"RESC{k:04d}",
+        "aq_answers": {i: 1 + (i + k) % 4 for i in range(1, 51)},
+        "eq_answers": {i: 1 + (i * (k + 1)) % 4 for i in range(1, 61)},
+        "prereq": {"E": True},
+        "patient_id": f"P{k}",
+        "test_date": "2026-04-01",
+        "practitioner_code": "DR1",
+    }
+
+
+def test_rescore_rewrites_only_stale_derived_sections(tmp_path):
+    url = f"sqlite:{tmp_path / 's.db'}"
+    store = open_store(url)
+    stale = {**_payload(0), "derived": {"rules_version": "0/ancienne", "aq_score": -1}}
+    store.save("RESC0000", stale)
+    current = _payload(1)
+    current["derived"] = compute_derived(*answers_from_payload(current))
+    store.save("RESC0001", current, summary=response_summary(current))
+    versions = {code: store.version(code) for code in ("RESC0000", "RESC0001")}
+    store.close()
+
+    assert cli_main(["rescore", "--store", url]) == 0
+    store = open_store(url)
+    derived = store.load("RESC0000")["derived"]
+    assert derived == compute_derived(*answers_from_payload(stale))
+    assert derived["rules_version"] == SCORING_RULES_VERSION
+    assert store.version("RESC0000") != versions["RESC0000"]
+    assert store.version("RESC0001") == versions["RESC0001"]
+    assert store.index.codes() == {"RESC0000", "RESC0001"}
+
+    # Deuxième passage : tout est à jour, rien n'est réécrit.
+    versions = {code: store.version(code) for code in versions}
+    assert cli_main(["rescore", "--store", url]) == 0
+    assert {code: store.version(code) for code in versions} == versions
+    store.close()
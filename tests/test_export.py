@@ -0,0 +1,75 @@
+"""Export désidentifié (aqeq.export) et écriture des lignes (aqeq.pipeline)."""
+
+import csv
+
+import pytest
+
+from aqeq.export import EXPORT_FIELDS, export
+from aqeq.pipeline import write_rows
+from aqeq.storage import open_store, save_new
+
+SALT = b"sel-de-test"
+
+
+def _payload(k: int) -> dict:
+    return {
+        "aq_answers": {i: 1 + (i + k) % 4 for i in range(1, 51)},
+        "eq_answers": {i: 1 + (i * k) % 4 for i in range(1, 61)},
+        "prereq": {"E": True},
+        "patient_id": f"P{k}",
+        "sex": "Féminin",
+        "dob": "1990-01-01",
+        "test_date": "2026-03-04",
+        "practitioner_code": "DR1",
+    }
+
+
+@pytest.fixture
+def store_url(tmp_path):
+    url = f"sqlite:{tmp_path / 'store.db'}"
+    store = open_store(url)
+    for k in range(3):
+        save_new(store, _payload(k))
+    store.close()
+    return url
+
+
+def test_export_csv_is_pseudonymized(tmp_path, store_url):
+    out = tmp_path / "export.csv"
+    assert export(store_url, str(out), SALT) == 3
+    with open(out, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == EXPORT_FIELDS
+    assert {r["test_month"] for r in rows} == {"2026-03"}
+    assert all("P0" not in r.values() and len(r["pseudonym"]) == 16 for r in rows)
+
+
+def test_incremental_export_only_writes_changes(tmp_path, store_url):
+    state = str(tmp_path / "state.json")
+    assert export(store_url, str(tmp_path / "a.jsonl"), SALT, state) == 3
+    assert export(store_url, str(tmp_path / "b.jsonl"), SALT, state) == 0
+    store = open_store(store_url)
+    save_new(store, _payload(7))
+    store.close()
+    assert export(store_url, str(tmp_path / "c.jsonl"), SALT, state) == 1
+
+
+def test_empty_delta_writes_parquet_with_schema(tmp_path, store_url):
+    pq = pytest.importorskip("pyarrow.parquet")
+    state = str(tmp_path / "state.json")
+    export(store_url, str(tmp_path / "full.parquet"), SALT, state)
+    assert export(store_url, str(tmp_path / "delta.parquet"), SALT, state) == 0
+
+    full = pq.read_table(tmp_path / "full.parquet")
+    delta = pq.read_table(tmp_path / "delta.parquet")
+    assert delta.num_rows == 0
+    assert delta.schema == full.schema
+    assert delta.schema.names == EXPORT_FIELDS
+
+
+def test_parquet_types_do_not_depend_on_first_chunk(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [{"patient_code": "A", "aq_1": None}, {"patient_code": "B", "aq_1": 3}]
+    path = tmp_path / "rows.parquet"
+    assert write_rows(rows, str(path), ["patient_code", "aq_1"], chunk_size=1) == 2
+    assert pq.read_table(path).column("aq_1").to_pylist() == [None, 3]
@@ -0,0 +1,104 @@
+"""Chargement des instruments déclaratifs (aqeq.instrument)."""
+
+import json
+
+import pytest
+
+from aqeq import instrument
+from aqeq.instrument import available_instruments, load_instrument
+
+
+def _spec(version="1", agree=(1, 1, 0, 0)) -> dict:
+    return {
+        "id": "MINI",
+        "version": version,
+        "language": "fr",
+        "title": "Mini questionnaire",
+        "answers": {"1": "Oui", "2": "Plutôt oui", "3": "Plutôt non", "4": "Non"},
+        "items": {"1": "Premier", "2": "Deuxième", "3": "Troisième"},
+        "keys": {"agree": list(agree), "disagree": [0, 0, 1, 1]},
+        "scoring": {"agree": [1, 3], "disagree": [2]},
+        "subscales": {"S": [1, 2]},
+        "sections": {"A": {"label": "Section A", "items": [1, 2], "required": 2}},
+    }
+
+
+@pytest.fixture
+def instruments_dir(tmp_path, monkeypatch):
+    """Catalogue vide dans un répertoire temporaire, caches vidés avant et après."""
+    monkeypatch.setattr(instrument, "INSTRUMENTS_DIR", str(tmp_path))
+    instrument._catalog.cache_clear()
+    instrument._compiled.cache_clear()
+    yield tmp_path
+    instrument._catalog.cache_clear()
+    instrument._compiled.cache_clear()
+
+
+def _write(directory, name, spec):
+    (directory / name).write_text(json.dumps(spec, ensure_ascii=False), encoding="utf-8")
+
+
+def test_shipped_instruments_compile():
+    aq = load_instrument("AQ-50")
+    assert aq.n_items == 50 and set(aq.sections) == {"A", "B", "C", "D"}
+    assert load_instrument("AQ-50") is aq
+    assert load_instrument("EQ-60", version="1").n_items == 60
+
+
+def test_compiled_points_and_masks(instruments_dir):
+    _write(instruments_dir, "mini.fr.json", _spec())
+    mini = load_instrument("MINI")
+    assert [mini.item_points(1, r) for r in (None, 1, 2, 3, 4)] == [0, 1, 1, 0, 0]
+    assert [mini.item_points(2, r) for r in (1, 4)] == [0, 1]
+    assert mini.item_points(4, 1) == 0
+    assert mini.point_masks[(1, 1)] == 0b101
+    assert mini.subscale_masks == {"S": 0b011}
+    assert mini.section_masks == {"A": 0b011}
+
+
+def test_latest_version_is_default(instruments_dir):
+    _write(instruments_dir, "mini-2.fr.json", _spec(version="2"))
+    _write(instruments_dir, "mini-10.fr.json", _spec(version="10"))
+    assert available_instruments() == [("MINI", "10", "fr"), ("MINI", "2", "fr")]
+    assert load_instrument("MINI").version == "10"
+    assert load_instrument("MINI", version=2).version == "2"
+    with pytest.raises(KeyError):
+        load_instrument("MINI", version="3")
+    with pytest.raises(KeyError):
+        load_instrument("MINI", language="en")
+
+
+def test_digest_follows_content_not_only_version(instruments_dir):
+    _write(instruments_dir, "mini.fr.json", _spec())
+    before = load_instrument("MINI")
+
+    # Même `version`, barème modifié : l'empreinte (et donc la version des
+    # règles de cotation) change après relecture du catalogue.
+    _write(instruments_dir, "mini.fr.json", _spec(agree=(2, 1, 0, 0)))
+    instrument._catalog.cache_clear()
+    instrument._compiled.cache_clear()
+    after = load_instrument("MINI")
+
+    assert after.version == before.version
+    assert after.digest != before.digest
+    assert after.item_points(1, 1) == 2
+
+    _write(instruments_dir, "mini.fr.json", _spec())
+    instrument._catalog.cache_clear()
+    instrument._compiled.cache_clear()
+    assert load_instrument("MINI").digest == before.digest
+
+
+def test_invalid_definitions_are_rejected(instruments_dir):
+    spec = _spec()
+    spec["items"] = {"1": "Premier", "3": "Troisième"}
+    _write(instruments_dir, "trou.fr.json", spec)
+    with pytest.raises(ValueError, match="numérotés"):
+        load_instrument("MINI")
+
+    spec = _spec()
+    spec["keys"]["agree"] = [1, 0]
+    _write(instruments_dir, "trou.fr.json", spec)
+    instrument._catalog.cache_clear()
+    with pytest.raises(ValueError, match="barème"):
+        load_instrument("MINI")
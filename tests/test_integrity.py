@@ -0,0 +1,194 @@
+"""Enregistrements mal formés : contrôle d'intégrité (aqeq.integrity) et import (aqeq.cli)."""
+
+import json
+import os
+import re
+
+import pytest
+
+from aqeq.cli import main as cli_main
+from aqeq.integrity import check_store, validate_payload
+from aqeq.scoring import response_summary
+from aqeq.storage import FileStore, fanout_dirs, open_store
+
+
+def _payload(k: int = 0, **extra) -> dict:
+    payload = {
+        "aq_answers": {str(i): 1 + (i + k) % 4 for i in range(1, 51)},
+        "eq_answers": {str(i): 1 + (i * (k + 1)) % 4 for i in range(1, 61)},
+        "prereq": {"E": True, "F": False},
+        "patient_id": f"P{k}",
+        "sex": "Féminin",
+        "dob": "1990-01-01",
+        "test_date": "2026-02-01",
+        "practitioner_code": "DR1",
+    }
+    payload.update(extra)
+    return payload
+
+
+def _write_raw(store: FileStore, code: str, text: str):
+    """Fichier écrit hors du store, comme après une copie ou une édition à la main."""
+    directory = os.path.join(store.directory, *fanout_dirs(code))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{code}.json"), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+# =========================================================
+# VALIDATION D'UN PAYLOAD
+# =========================================================
+
+def test_valid_payload_has_no_problem():
+    assert validate_payload({"patient_code": "GOOD0001", **_payload()}, "GOOD0001") == []
+
+
+@pytest.mark.parametrize(
+    "change, expected",
+    [
+        ({"aq_answers": None}, "aq_answers absent ou mal formé"),
+        ({"aq_answers": {**_payload()["aq_answers"], "x": 1}}, "clé(s) non numérique(s)"),
+        ({"aq_answers": {**_payload()["aq_answers"], "51": 1}}, "hors instrument 1–50"),
+        ({"eq_answers": {**_payload()["eq_answers"], "3": 5}}, "réponse(s) hors plage"),
+        ({"eq_answers": {**_payload()["eq_answers"], "3": [1]}}, "réponse(s) hors plage"),
+        ({"eq_answers": {**_payload()["eq_answers"], "3": True}}, "réponse(s) hors plage"),
+        ({"eq_answers": {"1": 1}}, "59 item(s) manquant(s)"),
+        ({"answers_packed": "pas du base64!"}, "base64 invalide"),
+        ({"answers_packed": "AAAA"}, "3 octets"),
+        ({"prereq": ["E"]}, "prereq : objet attendu"),
+        ({"prereq": {"E": "oui"}}, "valeur non booléenne pour E"),
+        ({"derived": 3}, "derived : objet attendu"),
+        ({"patient_code": "AUTRE001"}, "différent du nom de fichier"),
+    ],
+)
+def test_malformed_payload_problems(change, expected):
+    payload = {"patient_code": "GOOD0001", **_payload(), **change}
+    problems = validate_payload(payload, "GOOD0001")
+    assert any(expected in p for p in problems), problems
+
+
+def test_non_object_payload():
+    assert validate_payload([1, 2]) == ["le contenu n'est pas un objet JSON"]
+
+
+# =========================================================
+# CONTRÔLE D'UN STORE
+# =========================================================
+
+@pytest.fixture
+def file_store(tmp_path):
+    store = FileStore(str(tmp_path / "store"), fsync=False)
+    good = {"patient_code": "GOOD0001", **_payload()}
+    store.save("GOOD0001", good, summary=response_summary(good))
+    bad = {"patient_code": "BADA0001", **_payload(1)}
+    store.save("BADA0001", bad, summary=response_summary(bad))
+    _write_raw(store, "BADA0001", json.dumps({**bad, "eq_answers": {"1": 9}}))
+    _write_raw(store, "TRNC0001", '{"patient_code": "TRNC0001", "aq_ans')
+    yield store
+    store.close()
+
+
+def test_check_store_reports_malformed_files(file_store):
+    report = check_store(file_store.directory, workers=1)
+    assert report["records"] == 3
+    problems = {bad["code"]: bad["problems"] for bad in report["invalid"]}
+    assert set(problems) == {"BADA0001", "TRNC0001"}
+    assert problems["TRNC0001"][0].startswith("JSON illisible")
+
+    # Deuxième passage : rien n'a changé, rien n'est relu.
+    again = check_store(file_store.directory, workers=1)
+    assert again["checked"] == 0 and again["invalid"] == report["invalid"]
+
+
+def test_quarantine_moves_files_and_unindexes_codes(file_store):
+    report = check_store(file_store.directory, quarantine=True, workers=1)
+    assert len(report["quarantined"]) == 2
+    assert os.path.isdir(os.path.join(file_store.directory, "_quarantine"))
+    store = open_store(file_store.directory)
+    assert set(store.codes()) == {"GOOD0001"}
+    assert store.index.codes() == {"GOOD0001"}
+    assert store.norms.codes() == {"GOOD0001"}
+    store.close()
+    assert check_store(file_store.directory, workers=1)["invalid"] == []
+
+
+def test_quarantine_requires_file_store(tmp_path):
+    with pytest.raises(ValueError, match="quarantaine"):
+        check_store(f"sqlite:{tmp_path / 's.db'}", quarantine=True)
+
+
+def test_check_store_reads_records_of_other_stores(tmp_path):
+    url = f"sqlite:{tmp_path / 's.db'}"
+    store = open_store(url)
+    partial = _payload(2)
+    del partial["aq_answers"]["4"]
+    stored = {"patient_code": "PART0001", **partial}
+    store.save("PART0001", stored, summary=response_summary(stored))
+    store.close()
+    report = check_store(url, workers=1)
+    assert [bad["code"] for bad in report["invalid"]] == ["PART0001"]
+    assert "1 item(s) manquant(s) (4)" in report["invalid"][0]["problems"][0]
+
+
+# =========================================================
+# IMPORT DE FICHIERS BRUTS
+# =========================================================
+
+def test_import_stops_at_malformed_line_with_its_number(tmp_path):
+    raw = tmp_path / "brut.jsonl"
+    raw.write_text(json.dumps(_payload()) + "\n\n" + '{"aq_answers": \n', encoding="utf-8")
+    url = f"sqlite:{tmp_path / 's.db'}"
+    with pytest.raises(SystemExit, match=r"ligne 3 : JSON invalide.*1 réponses importées"):
+        cli_main(["import", str(raw), "--store", url])
+    store = open_store(url)
+    assert len(list(store.codes())) == 1
+    store.close()
+
+
+def test_import_rejects_non_integer_answer_in_csv(tmp_path):
+    raw = tmp_path / "brut.csv"
+    header = ["patient_id"] + [f"aq_{i}" for i in range(1, 51)] + [f"eq_{i}" for i in range(1, 61)]
+    values = ["P1"] + ["2"] * 49 + ["beaucoup"] + ["3"] * 60
+    raw.write_text(",".join(header) + "\n" + ",".join(values) + "\n", encoding="utf-8")
+    with pytest.raises(SystemExit, match=r"ligne 2, colonne aq_50 : réponse non entière 'beaucoup'"):
+        cli_main(["import", str(raw), "--store", f"sqlite:{tmp_path / 's.db'}"])
+
+
+@pytest.mark.parametrize(
+    "cell, expected",
+    [("0", "aq_answers : 1 réponse(s) hors plage (50 : 0)"),
+     ("5", "aq_answers : 1 réponse(s) hors plage (50 : 5)"),
+     ("", "aq_answers : 1 item(s) manquant(s) (50)")],
+)
+def test_import_rejects_out_of_range_or_missing_csv_answers(tmp_path, cell, expected):
+    raw = tmp_path / "brut.csv"
+    header = ["patient_id"] + [f"aq_{i}" for i in range(1, 51)] + [f"eq_{i}" for i in range(1, 61)]
+    good = ["P0"] + ["2"] * 50 + ["3"] * 60
+    bad = ["P1"] + ["2"] * 49 + [cell] + ["3"] * 60
+    raw.write_text("\n".join(",".join(r) for r in (header, good, bad)) + "\n", encoding="utf-8")
+    url = f"sqlite:{tmp_path / 's.db'}"
+    with pytest.raises(SystemExit, match=rf"ligne 3, {re.escape(expected)}.*1 réponses importées"):
+        cli_main(["import", str(raw), "--store", url])
+
+
+def test_import_checks_app_format_payloads(tmp_path):
+    partial = _payload()
+    del partial["eq_answers"]["60"]
+    raw = tmp_path / "brut.jsonl"
+    raw.write_text(json.dumps(partial) + "\n", encoding="utf-8")
+    url = f"sqlite:{tmp_path / 's.db'}"
+    with pytest.raises(SystemExit, match=r"ligne 1, eq_answers : 1 item\(s\) manquant\(s\) \(60\)"):
+        cli_main(["import", str(raw), "--store", url])
+    store = open_store(url)
+    assert list(store.codes()) == []
+    store.close()
+
+
+def test_import_refuses_existing_code_without_overwrite(tmp_path):
+    raw = tmp_path / "brut.jsonl"
+    raw.write_text(json.dumps({"patient_code": "DUPL0001", **_payload()}) + "\n", encoding="utf-8")
+    url = f"sqlite:{tmp_path / 's.db'}"
+    assert cli_main(["import", str(raw), "--store", url]) == 0
+    with pytest.raises(SystemExit, match="--overwrite"):
+        cli_main(["import", str(raw), "--store", url])
+    assert cli_main(["import", str(raw), "--store", url, "--overwrite"]) == 0
@@ -0,0 +1,220 @@
+"""
+Outbox et thread d'envoi contre un serveur SMTP local minimal (socket),
+sans dépendance externe.
+"""
+
+import email
+import json
+import os
+import socketserver
+import threading
+
+import pytest
+
+from aqeq.outbox import DeliveryWorker, Outbox, SMTPConfig, parse_flag
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Juste assez de SMTP pour smtplib : EHLO, MAIL, RCPT, DATA, NOOP, QUIT."""
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode("ascii", "replace").strip().split(" ")[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 stub")
+            elif verb == "MAIL" and server.refuse:
+                self.reply("451 try again later")
+            elif verb in ("MAIL", "RCPT", "NOOP", "RSET"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    lines.append(data.decode("utf-8", "replace"))
+                server.messages.append(email.message_from_string("".join(lines)))
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+class _SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.messages = []
+        self.refuse = False
+
+
+@pytest.fixture
+def smtp_server():
+    server = _SMTPStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _worker(tmp_path, server, **kwargs) -> DeliveryWorker:
+    config = SMTPConfig(
+        sender="app@example.org",
+        password="",
+        recipient="praticien@example.org",
+        host="127.0.0.1",
+        port=server.server_address[1],
+        use_ssl=False,
+        timeout=5.0,
+    )
+    return DeliveryWorker(Outbox(str(tmp_path / "outbox")), config, **kwargs)
+
+
+def _pending(outbox: Outbox):
+    return sorted(name for name in os.listdir(outbox.directory) if name.endswith(".json"))
+
+
+def _failed(outbox: Outbox):
+    return sorted(os.listdir(outbox.failed_dir))
+
+
+def test_drain_sends_over_one_connection(tmp_path, smtp_server):
+    worker = _worker(tmp_path, smtp_server)
+    for n in range(3):
+        worker.outbox.put(f"Sujet {n}", f"Corps {n}")
+
+    assert worker.drain() == 3
+    assert len(smtp_server.messages) == 3
+    assert smtp_server.messages[0]["Subject"] == "Sujet 0"
+    assert _pending(worker.outbox) == []
+    worker._disconnect()
+
+
+def test_digest_groups_a_batch(tmp_path, smtp_server):
+    worker = _worker(tmp_path, smtp_server, digest=True)
+    worker.outbox.put("A", "premier")
+    worker.outbox.put("B", "second")
+
+    assert worker.drain() == 2
+    assert len(smtp_server.messages) == 1
+    body = smtp_server.messages[0].get_payload(decode=True).decode("utf-8")
+    assert "premier" in body and "second" in body
+    worker._disconnect()
+
+
+def test_refused_message_is_rescheduled_then_failed(tmp_path, smtp_server):
+    smtp_server.refuse = True
+    worker = _worker(tmp_path, smtp_server, base_delay=0.0, max_attempts=2)
+    worker.outbox.put("Sujet", "Corps")
+
+    assert worker.drain() == 0
+    [name] = _pending(worker.outbox)
+    with open(os.path.join(worker.outbox.directory, name), encoding="utf-8") as f:
+        assert json.load(f)["attempts"] == 1
+
+    assert worker.drain() == 0
+    assert _pending(worker.outbox) == []
+    assert _failed(worker.outbox) == [name]
+
+
+def test_unexpected_error_moves_message_to_failed_and_keeps_going(tmp_path, smtp_server, monkeypatch):
+    worker = _worker(tmp_path, smtp_server)
+    bad = worker.outbox.put("bad", "corps")
+    worker.outbox.put("good", "corps")
+
+    build = worker._build
+
+    def flaky_build(subject, body):
+        if subject == "bad":
+            raise RuntimeError("boom")
+        return build(subject, body)
+
+    monkeypatch.setattr(worker, "_build", flaky_build)
+
+    assert worker.drain() == 1
+    assert len(smtp_server.messages) == 1
+    assert _failed(worker.outbox) == [f"{bad}.json"]
+    assert _pending(worker.outbox) == []
+    worker._disconnect()
+
+
+def test_malformed_file_is_set_aside(tmp_path, smtp_server):
+    worker = _worker(tmp_path, smtp_server)
+    with open(os.path.join(worker.outbox.directory, "0-broken.json"), "w", encoding="utf-8") as f:
+        f.write("{not json")
+    with open(os.path.join(worker.outbox.directory, "1-nobody.json"), "w", encoding="utf-8") as f:
+        json.dump({"subject": "sans corps"}, f)
+    worker.outbox.put("ok", "corps")
+
+    assert worker.drain() == 1
+    assert _failed(worker.outbox) == ["0-broken.json", "1-nobody.json"]
+    worker._disconnect()
+
+
+def test_thread_recovers_stale_claims_while_running(tmp_path, smtp_server):
+    worker = _worker(tmp_path, smtp_server, poll_interval=0.05, recover_interval=0.05)
+    worker.start()
+    try:
+        # Réclamation abandonnée par un autre worker après le démarrage
+        # du thread : seule la reprise périodique peut la remettre en file.
+        threading.Event().wait(0.2)
+        path = os.path.join(worker.outbox.directory, "00000000000000000000-dead.json.sending")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"id": "dead", "subject": "Sujet", "body": "Corps", "attempts": 0}, f)
+        os.utime(path, (0, 0))
+        for _ in range(100):
+            if smtp_server.messages:
+                break
+            threading.Event().wait(0.05)
+    finally:
+        worker.stop(timeout=5)
+    assert len(smtp_server.messages) == 1
+    assert os.listdir(worker.outbox.directory) == ["failed"]
+
+
+def test_claim_of_old_message_is_not_stale(tmp_path):
+    # Message mis en file il y a une heure (nouvel essai après backoff) :
+    # un autre processus ne doit pas le reprendre pendant son envoi.
+    first = Outbox(str(tmp_path / "outbox"))
+    other = Outbox(first.directory)
+    msg_id = first.put("Sujet", "Corps")
+    queued = os.path.join(first.directory, f"{msg_id}.json")
+    os.utime(queued, (os.path.getmtime(queued) - 3600,) * 2)
+
+    [(claim_path, _)] = first.claim_due(10)
+    other.recover_stale()
+    assert os.path.exists(claim_path)
+    assert other.claim_due(10) == []
+
+    # Réclamation réellement abandonnée : elle est remise en file.
+    os.utime(claim_path, (0, 0))
+    other.recover_stale()
+    assert [m["id"] for _, m in other.claim_due(10)] == [msg_id]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(None, True), (True, True), (False, False), ("false", False), ("False", False),
+     ("0", False), ("non", False), ("true", True), ("1", True), (1, True), (0, False)],
+)
+def test_parse_flag(value, expected):
+    assert parse_flag(value, default=True) is expected
+
+
+def test_parse_flag_rejects_unknown_text():
+    with pytest.raises(ValueError):
+        parse_flag("peut-être")
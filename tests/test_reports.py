@@ -0,0 +1,80 @@
+"""Vue praticien et rapports (aqeq.reports)."""
+
+import pytest
+
+from aqeq import reports, scoring
+from aqeq.cache import RecordCache, SharedCache
+from aqeq.items import ANSWER_LABELS
+from aqeq.packed import compact_payload
+from aqeq.reports import VIEW_VERSION, render_html, result_view, view_key
+
+
+def _payload(**extra) -> dict:
+    payload = {
+        "patient_code": "VIEW0001",
+        "aq_answers": {str(i): 1 + i % 4 for i in range(1, 51)},
+        "eq_answers": {str(i): 1 + (i * 3) % 4 for i in range(1, 61)},
+        "prereq": {"E": True},
+        "patient_id": "P1",
+        "sex": "Féminin",
+        "dob": "1990-01-01",
+        "test_date": "2026-03-04",
+        "practitioner_code": "DR1",
+    }
+    payload.update(extra)
+    return payload
+
+
+def test_result_view_survives_out_of_range_answers():
+    payload = _payload()
+    payload["aq_answers"]["50"] = 7
+    payload["eq_answers"]["3"] = 0
+    view = result_view(payload)
+    assert view["aq_answers"]["Réponse"][49] == "7"
+    assert view["eq_answers"]["Réponse"][2] == "0"
+    assert view["aq_answers"]["Réponse"][0] == ANSWER_LABELS[2]
+    assert "VIEW0001" in render_html(payload)
+
+
+# =========================================================
+# CACHE DES VUES (ADRESSÉ PAR CONTENU)
+# =========================================================
+
+def test_view_key_follows_stored_content():
+    payload = _payload()
+    key = view_key(payload)
+    assert view_key(compact_payload(payload)) == key
+    assert view_key(_payload(derived={"rules_version": "ancienne"})) == key
+
+    changed = _payload()
+    changed["aq_answers"]["7"] = 1 + changed["aq_answers"]["7"] % 4
+    assert view_key(changed) != key
+    assert view_key(_payload(patient_id="P2")) != key
+
+
+@pytest.mark.parametrize(
+    "module, name, value",
+    [(scoring, "SCORING_RULES_VERSION", "99/autres-règles"), (reports, "VIEW_VERSION", VIEW_VERSION + 1)],
+)
+def test_view_key_changes_with_rules_and_view_version(monkeypatch, module, name, value):
+    payload = _payload()
+    before = view_key(payload)
+    monkeypatch.setattr(module, name, value)
+    assert view_key(payload) != before
+
+
+def test_cached_view_is_not_served_under_new_rules(tmp_path, monkeypatch):
+    shared = SharedCache(str(tmp_path / "cache.db"), name="views_shared", table="view_entries")
+    cache = RecordCache(name="views", shared=shared)
+    payload = _payload()
+    view = result_view(payload)
+    cache.put(view_key(payload), VIEW_VERSION, view)
+
+    # Autre processus : la vue relue du cache partagé est celle calculée.
+    other = RecordCache(name="views", shared=shared)
+    assert other.get(view_key(payload), VIEW_VERSION) == view
+
+    monkeypatch.setattr(scoring, "SCORING_RULES_VERSION", "99/autres-règles")
+    assert cache.get(view_key(payload), VIEW_VERSION) is None
+    assert other.get(view_key(payload), VIEW_VERSION) is None
+    shared.close()
@@ -0,0 +1,201 @@
+"""Cotation (aqeq.scoring, aqeq.packed) comparée aux règles item par item d'origine."""
+
+import random
+
+import pytest
+
+from aqeq.items import AQ_ITEMS, AQ_N_ITEMS, EQ_N_ITEMS, PREREQ_KEYS
+from aqeq.packed import pack_answers, score_packed, unpack_answers
+from aqeq.scoring import (
+    answers_matrix,
+    build_dsm_blocks,
+    compute_derived,
+    derived_texts,
+    score_aq_officiel,
+    score_aq_subscales,
+    score_batch,
+    score_eq_officiel,
+)
+
+# =========================================================
+# RÈGLES D'ORIGINE (app.py avant les fichiers d'instruments)
+# =========================================================
+
+AQ_AGREE_ITEMS = {
+    2, 4, 5, 6, 7, 9, 12, 13,
+    16, 18, 19, 20, 21, 22, 23,
+    26, 33, 35, 39, 41, 42, 43,
+    45, 46,
+}
+
+AQ_SUBSCALES = {
+    "A. Compétences sociales": [1, 11, 13, 15, 22, 36, 44, 45, 47, 48],
+    "B. Flexibilité / Attention switching": [2, 4, 10, 16, 25, 32, 34, 37, 43, 46],
+    "B’. Attention aux détails": [5, 6, 9, 12, 19, 23, 28, 29, 30, 49],
+    "C. Communication": [7, 17, 18, 26, 27, 31, 33, 35, 38, 39],
+    "D. Imagination": [3, 8, 14, 20, 21, 24, 40, 41, 42, 50],
+}
+
+CLASS_ITEMS = {
+    "A": AQ_SUBSCALES["A. Compétences sociales"],
+    "B": AQ_SUBSCALES["B. Flexibilité / Attention switching"] + AQ_SUBSCALES["B’. Attention aux détails"],
+    "C": AQ_SUBSCALES["C. Communication"],
+    "D": AQ_SUBSCALES["D. Imagination"],
+}
+CLASS_REQUIRED = {"A": 3, "B": 3, "C": 3, "D": 1}
+
+EQ_EMPATHY_ITEMS = {
+    1, 4, 6, 8, 10, 11, 12, 14, 15, 18,
+    19, 21, 22, 25, 26, 27, 28, 29, 32, 34,
+    35, 36, 37, 38, 39, 41, 42, 43, 44, 46,
+    48, 49, 50, 52, 54, 55, 57, 58, 59, 60,
+}
+
+EQ_POSITIVE_AGREE = {
+    1, 6, 19, 22, 25, 26,
+    35, 36, 37, 38,
+    41, 42, 43, 44,
+    52, 54, 55,
+    57, 58, 59, 60,
+}
+
+
+def ref_is_aq_autistic(item, resp):
+    if resp is None:
+        return False
+    if item in AQ_AGREE_ITEMS:
+        return resp in (1, 2)
+    return resp in (3, 4)
+
+
+def ref_aq(aq_answers):
+    return sum(1 for i, r in aq_answers.items() if ref_is_aq_autistic(i, r))
+
+
+def ref_subscales(aq_answers):
+    return {
+        name: sum(1 for i in items if ref_is_aq_autistic(i, aq_answers.get(i)))
+        for name, items in AQ_SUBSCALES.items()
+    }
+
+
+def ref_class_counts(aq_answers):
+    return {
+        key: sum(1 for i in items if ref_is_aq_autistic(i, aq_answers.get(i)))
+        for key, items in CLASS_ITEMS.items()
+    }
+
+
+def ref_eq(eq_answers):
+    score = 0
+    for item, resp in eq_answers.items():
+        if resp is None or item not in EQ_EMPATHY_ITEMS:
+            continue
+        if item in EQ_POSITIVE_AGREE:
+            score += {1: 2, 2: 1}.get(resp, 0)
+        else:
+            score += {4: 2, 3: 1}.get(resp, 0)
+    return score
+
+
+# =========================================================
+# JEUX DE RÉPONSES
+# =========================================================
+
+def _complete(rng):
+    aq = {i: rng.randint(1, 4) for i in range(1, AQ_N_ITEMS + 1)}
+    eq = {i: rng.randint(1, 4) for i in range(1, EQ_N_ITEMS + 1)}
+    return aq, eq
+
+
+def _partial(rng):
+    """Réponses incomplètes : items absents ou sans réponse (None)."""
+    aq, eq = _complete(rng)
+    for answers in (aq, eq):
+        for item in rng.sample(sorted(answers), rng.randint(0, 10)):
+            if rng.random() < 0.5:
+                del answers[item]
+            else:
+                answers[item] = None
+    return aq, eq
+
+
+@pytest.fixture(scope="module")
+def respondents():
+    rng = random.Random(20260117)
+    return [_complete(rng) for _ in range(150)] + [_partial(rng) for _ in range(150)]
+
+
+def test_score_batch_matches_original_rules(respondents):
+    aq_list = [aq for aq, _ in respondents]
+    eq_list = [eq for _, eq in respondents]
+    scores = score_batch(answers_matrix(aq_list, AQ_N_ITEMS), answers_matrix(eq_list, EQ_N_ITEMS))
+    for row, (aq, eq) in enumerate(respondents):
+        assert scores["aq_score"][row] == ref_aq(aq)
+        assert scores["eq_score"][row] == ref_eq(eq)
+        assert scores["aq_subscales"][row].tolist() == list(ref_subscales(aq).values())
+        assert scores["class_counts"][row].tolist() == list(ref_class_counts(aq).values())
+        assert scores["class_total"][row] == sum(ref_class_counts(aq).values())
+
+
+def test_per_respondent_wrappers_match_original_rules(respondents):
+    for aq, eq in respondents[::10]:
+        assert score_aq_officiel(aq) == ref_aq(aq)
+        assert score_eq_officiel(eq) == ref_eq(eq)
+        assert score_aq_subscales(aq) == ref_subscales(aq)
+
+
+def test_dsm_blocks_match_original_rules(respondents):
+    for aq, _ in respondents[::3]:
+        assert build_dsm_blocks(aq) == {
+            key: [f"{AQ_ITEMS[i]} (AQ{i})" for i in sorted(items) if ref_is_aq_autistic(i, aq.get(i))]
+            for key, items in CLASS_ITEMS.items()
+        }
+
+
+def test_score_packed_matches_original_rules(respondents):
+    for aq, eq in respondents[:150]:
+        blob = pack_answers(aq, eq)
+        assert unpack_answers(blob) == (aq, eq)
+        scores = score_packed(blob)
+        counts = list(ref_class_counts(aq).values())
+        assert scores == {
+            "aq_score": ref_aq(aq),
+            "eq_score": ref_eq(eq),
+            "aq_subscales": list(ref_subscales(aq).values()),
+            "class_counts": counts,
+            "class_total": sum(counts),
+        }
+
+
+def test_pack_answers_rejects_incomplete_answers():
+    aq, eq = _complete(random.Random(1))
+    del aq[12]
+    with pytest.raises(ValueError, match="item 12"):
+        pack_answers(aq, eq)
+
+
+def test_score_batch_rejects_wrong_matrix_shape():
+    with pytest.raises(ValueError):
+        score_batch(answers_matrix([{}], EQ_N_ITEMS))
+
+
+def test_derived_and_texts_match_original_rules(respondents):
+    rng = random.Random(7)
+    for aq, eq in respondents[::5]:
+        prereq = {k: rng.random() < 0.8 for k in PREREQ_KEYS}
+        derived = compute_derived(aq, eq, prereq)
+        counts = ref_class_counts(aq)
+        assert derived["aq_score"] == ref_aq(aq) and derived["eq_score"] == ref_eq(eq)
+        assert derived["class_counts"] == counts
+        assert derived["class_core_ok"] == int(all(counts[k] >= CLASS_REQUIRED[k] for k in counts))
+        assert derived["prereq_ok"] == int(all(prereq.values()))
+        assert derived["aq_flagged"] == [i for i in range(1, AQ_N_ITEMS + 1) if ref_is_aq_autistic(i, aq.get(i))]
+
+        texts = derived_texts(derived, prereq)
+        assert texts["dsm_blocks"] == {
+            key: [f"{AQ_ITEMS[i]} (AQ{i})" for i in sorted(items) if ref_is_aq_autistic(i, aq.get(i))]
+            for key, items in CLASS_ITEMS.items()
+        }
+        assert texts["class_counts"]["TOTAL"]["observed"] == sum(counts.values())
+        assert f"Total A+B+C+D : {sum(counts.values())} symptômes" in texts["class_summary"]
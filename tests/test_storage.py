@@ -0,0 +1,275 @@
+"""Stores de réponses (aqeq.storage), leurs index et connexions SQLite (aqeq.db)."""
+
+import sqlite3
+import statistics
+import threading
+
+import pytest
+
+from aqeq.db import LocalSQLite
+from aqeq.norms import ALL
+from aqeq.packed import expand_payload
+from aqeq.scoring import answers_from_payload, response_summary
+from aqeq.storage import CodeExistsError, FileStore, SQLiteStore, migrate, open_store, save_new
+
+STORE_KINDS = ["file", "pack", "sqlite"]
+
+
+def _payload(k: int = 0, **extra) -> dict:
+    payload = {
+        "aq_answers": {i: 1 + (i + k) % 4 for i in range(1, 51)},
+        "eq_answers": {i: 1 + (i * (k + 1)) % 4 for i in range(1, 61)},
+        "prereq": {"E": True, "F": False},
+        "patient_id": f"P{k}",
+        "sex": "Masculin",
+        "dob": "1985-06-01",
+        "test_date": f"2026-01-{k + 1:02d}",
+        "practitioner_code": "DR1",
+    }
+    payload.update(extra)
+    return payload
+
+
+@pytest.fixture(params=STORE_KINDS)
+def store_url(request, tmp_path):
+    path = tmp_path / ("s.db" if request.param == "sqlite" else "store")
+    return f"{request.param}:{path}"
+
+
+def _save(store, code: str, payload: dict):
+    stored = {"patient_code": code, **payload}
+    store.save(code, stored, summary=response_summary(stored))
+    return stored
+
+
+# =========================================================
+# ENREGISTREMENT / RELECTURE / VERSION
+# =========================================================
+
+def test_store_round_trip_and_version(store_url):
+    store = open_store(store_url)
+    assert store.load("ABCD0001") is None and store.version("ABCD0001") is None
+    first = _save(store, "ABCD0001", _payload(1))
+    v1 = store.version("ABCD0001")
+    assert v1 is not None and store.version("ABCD0001") == v1
+    assert expand_payload(store.load("ABCD0001")) == first
+
+    second = _save(store, "ABCD0001", _payload(1, patient_id="P1-bis"))
+    assert store.version("ABCD0001") != v1
+    store.close()
+
+    reopened = open_store(store_url)
+    assert expand_payload(reopened.load("ABCD0001")) == second
+    assert list(reopened.codes()) == ["ABCD0001"]
+    reopened.close()
+
+
+def test_store_keeps_incomplete_answers_as_is(store_url):
+    store = open_store(store_url)
+    payload = _payload(2)
+    del payload["aq_answers"][10]
+    stored = _save(store, "ABCD0002", payload)
+    loaded = store.load("ABCD0002")
+    assert "answers_packed" not in loaded
+    assert answers_from_payload(loaded) == answers_from_payload(stored)
+    store.close()
+
+
+@pytest.mark.parametrize("code", ["../ABCD0001", "abc", ""])
+def test_store_ignores_invalid_codes(store_url, code):
+    store = open_store(store_url)
+    _save(store, "ABCD0001", _payload())
+    assert store.load(code) is None and store.version(code) is None
+    store.close()
+
+
+def test_migrate_indexes_summaries(store_url, tmp_path):
+    src = FileStore(str(tmp_path / "src"), fsync=False)
+    for k in range(5):
+        src.save(f"MIGR{k:04d}", {"patient_code": f"MIGR{k:04d}", **_payload(k)})
+    src.close()
+
+    dst = open_store(store_url)
+    assert migrate(src.directory, dst, batch_size=2) == 5
+    codes = {f"MIGR{k:04d}" for k in range(5)}
+    assert set(dst.codes()) == codes
+    assert dst.index.codes() == dst.norms.codes() == dst.timeline.codes() == codes
+    assert dst.index.count("DR1") == 5 and dst.norms.stats("aq")["n"] == 5
+    dst.close()
+
+
+# =========================================================
+# INDEX DES RÉSUMÉS (PAGINATION) + NORMES
+# =========================================================
+
+def test_index_pages_follow_practitioner_order(store_url):
+    store = open_store(store_url)
+    dates = ["2026-01-03", "2026-01-01", "2026-01-03", "2026-01-02", "2026-01-03", "2026-01-05", "2026-01-04"]
+    for k, date in enumerate(dates):
+        _save(store, f"CODE{k:04d}", _payload(k, test_date=date))
+    _save(store, "AUTRE001", _payload(9, practitioner_code="DR2"))
+
+    expected = store.index.practitioner_codes("DR1")
+    assert len(expected) == store.index.count("DR1") == len(dates)
+    assert [store.load(c)["test_date"] for c in expected] == sorted(dates, reverse=True)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = store.index.page("DR1", after=cursor, limit=3)
+        seen += [r["patient_code"] for r in rows]
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == expected and pages == 3
+    assert store.index.page("DR1", limit=len(dates))[1] is None
+    assert store.index.page("inconnu") == ([], None)
+    store.close()
+
+
+def test_norms_follow_saves_replacements_and_removals(store_url):
+    store = open_store(store_url)
+    saved = [_save(store, f"NORM{k:04d}", _payload(k, sex="Féminin" if k % 2 else "Masculin")) for k in range(6)]
+    scores = {s["patient_code"]: response_summary(s)["aq_score"] for s in saved}
+
+    def check():
+        values = list(scores.values())
+        stats = store.norms.stats("aq")
+        assert stats["n"] == len(values)
+        assert stats["mean"] == pytest.approx(statistics.mean(values))
+        assert stats["sd"] == pytest.approx(statistics.stdev(values))
+        assert store.norms.histogram("aq") == {v: values.count(v) for v in sorted(set(values))}
+        top = max(values)
+        below = sum(v < top for v in values)
+        assert store.norms.percentile("aq", top) == pytest.approx(100 * (below + 0.5 * values.count(top)) / len(values))
+
+    check()
+    women = store.norms.stats("aq", sex="Féminin")
+    assert women["n"] == 3 and store.norms.stats("aq", sex="Féminin", band=ALL) == women
+
+    # Une réécriture remplace la contribution précédente au lieu de l'ajouter.
+    replaced = _save(store, "NORM0000", {**_payload(0), "aq_answers": {i: 4 for i in range(1, 51)}})
+    scores["NORM0000"] = response_summary(replaced)["aq_score"]
+    check()
+
+    store.unindex(["NORM0001"])
+    del scores["NORM0001"]
+    check()
+    assert store.norms.stats("aq", sex="Inconnu") is None
+    assert store.norms.percentile("aq", 10, sex="Inconnu") is None
+    store.close()
+
+
+# =========================================================
+# BROUILLONS (AUTOSAUVEGARDE + REPRISE)
+# =========================================================
+
+def test_draft_deltas_replay_in_order(store_url):
+    store = open_store(store_url)
+    assert store.load_draft("TOKEN001") is None
+    store.append_draft("TOKEN001", {"info": {"patient_id": "P1", "sex": "Féminin"}, "step": 1})
+    store.append_draft("TOKEN001", {"aq_answers": {"1": 2, "2": 3}, "step": 2})
+    store.append_draft("TOKEN001", {"aq_answers": {"2": 4}, "info": {"sex": "Masculin"}, "step": 1})
+    store.append_draft("TOKEN002", {"info": {"patient_id": "autre"}, "step": 1})
+    store.close()
+
+    # Reprise depuis un autre processus : seul le journal compte.
+    store = open_store(store_url)
+    assert store.load_draft("TOKEN001") == {
+        "info": {"patient_id": "P1", "sex": "Masculin"},
+        "aq_answers": {"1": 2, "2": 4},
+        "step": 1,
+    }
+    store.delete_draft("TOKEN001")
+    assert store.load_draft("TOKEN001") is None
+    assert store.load_draft("TOKEN002")["info"] == {"patient_id": "autre"}
+    store.close()
+
+
+def test_draft_rejects_invalid_token(store_url):
+    store = open_store(store_url)
+    with pytest.raises(ValueError):
+        store.append_draft("../x", {"step": 1})
+    assert store.load_draft("../x") is None
+    store.close()
+
+
+def test_sqlite_save_writes_response_and_summary_together(tmp_path):
+    store = SQLiteStore(str(tmp_path / "s.db"))
+    stored = save_new(store, _payload())
+    code = stored["patient_code"]
+    assert store.index.codes() == {code}
+    assert store.norms.codes() == {code}
+    assert store.timeline.codes() == {code}
+    store.close()
+
+
+def test_sqlite_save_rolls_back_response_when_indexing_fails(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / "s.db"))
+    payload = {"patient_code": "AAAA0001", **_payload()}
+    summary = response_summary(payload)
+
+    def broken(conn, summaries):
+        raise RuntimeError("index indisponible")
+
+    monkeypatch.setattr(store.timeline, "record_in", broken)
+    with pytest.raises(RuntimeError):
+        store.save("AAAA0001", payload, summary=summary)
+    assert store.load("AAAA0001") is None
+    assert store.index.codes() == set()
+    store.close()
+
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_sqlite_exclusive_save_keeps_first_response_and_index(tmp_path, group_commit):
+    store = SQLiteStore(str(tmp_path / "s.db"), group_commit=group_commit)
+    first = {"patient_code": "BBBB0001", **_payload(1)}
+    second = {"patient_code": "BBBB0001", **_payload(2, patient_id="autre")}
+    store.save("BBBB0001", first, summary=response_summary(first), exclusive=True)
+    with pytest.raises(CodeExistsError):
+        store.save("BBBB0001", second, summary=response_summary(second), exclusive=True)
+    assert store.load("BBBB0001")["patient_id"] == "P1"
+    rows, _ = store.index.page("DR1")
+    assert [r["patient_id"] for r in rows] == ["P1"]
+    store.close()
+
+
+def test_local_sqlite_close_closes_every_thread_connection(tmp_path):
+    db = LocalSQLite(str(tmp_path / "c.db"), "CREATE TABLE IF NOT EXISTS t (x INTEGER);")
+    conns = []
+
+    def worker():
+        conn = db.conn()
+        conn.execute("SELECT 1")
+        conns.append(conn)
+        ready.wait()
+
+    ready = threading.Event()
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while len(conns) < 3:
+        threading.Event().wait(0.01)
+    conns.append(db.conn())
+
+    db.close()
+    ready.set()
+    for t in threads:
+        t.join()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # Réouverture transparente après close().
+    assert db.conn().execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    db.close()
+
+
+def test_local_sqlite_reaps_connections_of_finished_threads(tmp_path):
+    db = LocalSQLite(str(tmp_path / "c.db"))
+    conns = []
+    t = threading.Thread(target=lambda: conns.append(db.conn()))
+    t.start()
+    t.join()
+    db.conn()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conns[0].execute("SELECT 1")
+    db.close()
@@ -0,0 +1,104 @@
+"""Suivi longitudinal (aqeq.timeline) : passations reliées et écarts."""
+
+import pytest
+
+from aqeq.items import AQ_N_ITEMS, EQ_N_ITEMS
+from aqeq.packed import pack_answers
+from aqeq.timeline import TimelineIndex, patient_key, sitting_scores
+
+
+def _sitting(code, test_date, patient_id="Dupont Jean", aq=None, eq=None, complete=True):
+    aq_answers = {i: 4 for i in range(1, AQ_N_ITEMS + 1)}
+    eq_answers = {i: 2 for i in range(1, EQ_N_ITEMS + 1)}
+    aq_answers.update(aq or {})
+    eq_answers.update(eq or {})
+    return {
+        "patient_code": code,
+        "practitioner_code": "DR1",
+        "patient_id": patient_id,
+        "test_date": test_date,
+        "answers_packed": pack_answers(aq_answers, eq_answers) if complete else None,
+    }
+
+
+@pytest.fixture
+def timeline(tmp_path):
+    index = TimelineIndex(str(tmp_path / "timeline.db"))
+    yield index
+    index.close()
+
+
+def test_patient_key_normalizes_spaces_and_case():
+    assert patient_key("  Dupont   JEAN ") == patient_key("dupont jean") == "dupont jean"
+    assert patient_key(None) == ""
+
+
+def test_retest_delta_shows_gained_and_lost_items(timeline):
+    first = _sitting("CODE0001", "2026-01-01")
+    # Réponse 4 → 1 pour les items 1 (coté sur 4, ne l'est plus) et 2
+    # (coté sur 1, l'est désormais) : score AQ inchangé, items différents.
+    second = _sitting("CODE0002", "2026-03-01", patient_id=" dupont  JEAN", aq={1: 1, 2: 1}, eq={5: 3})
+    timeline.record_many([first, second])
+
+    history = timeline.history("DR1", "Dupont Jean")
+    assert [h["patient_code"] for h in history] == ["CODE0001", "CODE0002"]
+    assert history[0]["delta"] is None
+
+    delta = history[1]["delta"]
+    before = sitting_scores(first["answers_packed"])
+    after = sitting_scores(second["answers_packed"])
+    assert delta["previous"] == "CODE0001"
+    assert delta["days"] == 59
+    assert delta["aq_points"] == {"gained": [2], "lost": [1]}
+    assert delta["aq_items"] == [[1, 4, 1], [2, 4, 1]]
+    assert delta["eq_items"] == [[5, 2, 3]]
+    assert delta["aq_score"] == after["aq_score"] - before["aq_score"] == 0
+    assert delta["eq_score"] == after["eq_score"] - before["eq_score"]
+    assert delta["aq_subscales"] == {
+        name: after["aq_subscales"][name] - before["aq_subscales"][name] for name in after["aq_subscales"]
+    }
+
+
+def test_earlier_sitting_recomputes_the_group(timeline):
+    timeline.record(_sitting("CODE0002", "2026-03-01", aq={2: 1}))
+    timeline.record(_sitting("CODE0001", "2026-01-01"))
+
+    history = timeline.history("DR1", "dupont jean")
+    assert [h["patient_code"] for h in history] == ["CODE0001", "CODE0002"]
+    assert history[1]["delta"]["previous"] == "CODE0001"
+    assert history[1]["delta"]["aq_points"] == {"gained": [2], "lost": []}
+
+    timeline.remove_many(["CODE0001"])
+    assert [h["delta"] for h in timeline.history("DR1", "dupont jean")] == [None]
+
+
+def test_incomplete_sitting_is_skipped_by_deltas(timeline):
+    timeline.record_many([
+        _sitting("CODE0001", "2026-01-01"),
+        _sitting("CODE0002", "2026-02-01", complete=False),
+        _sitting("CODE0003", "2026-03-01", aq={1: 1}),
+    ])
+    history = timeline.history("DR1", "Dupont Jean")
+    assert history[1]["scores"] is None and history[1]["delta"] is None
+    assert history[2]["delta"]["previous"] == "CODE0001"
+    assert history[2]["delta"]["aq_points"] == {"gained": [], "lost": [1]}
+
+
+def test_corrected_identifier_moves_the_sitting(timeline):
+    timeline.record_many([
+        _sitting("CODE0001", "2026-01-01"),
+        _sitting("CODE0002", "2026-03-01", aq={2: 1}),
+    ])
+    timeline.record(_sitting("CODE0002", "2026-03-01", patient_id="Martin Paul", aq={2: 1}))
+
+    assert [h["patient_code"] for h in timeline.history("DR1", "Dupont Jean")] == ["CODE0001"]
+    moved = timeline.history("DR1", "Martin Paul")
+    assert [h["patient_code"] for h in moved] == ["CODE0002"]
+    assert moved[0]["delta"] is None
+
+
+def test_history_needs_practitioner_and_identifier(timeline):
+    timeline.record(_sitting("CODE0001", "2026-01-01"))
+    assert timeline.history("", "Dupont Jean") == []
+    assert timeline.history("DR1", "   ") == []
+    assert timeline.codes() == {"CODE0001"}